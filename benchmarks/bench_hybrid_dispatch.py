@@ -0,0 +1,75 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""
+Measures HybridContents dispatch overhead.
+
+Usage: python benchmarks/bench_hybrid_dispatch.py
+"""
+from __future__ import print_function
+
+import copy
+import timeit
+
+from notebook.services.contents.manager import ContentsManager
+
+from dwcontents import HybridContents
+from dwcontents.hybridcontents import _apply_prefix
+
+
+class NoopContents(ContentsManager):
+    def dir_exists(self, path):
+        return True
+
+
+def listing(size):
+    return {
+        'type': 'directory',
+        'path': '',
+        'content': [{'type': 'file', 'path': 'file{}.csv'.format(i)}
+                    for i in range(size)]
+    }
+
+
+def main():
+    cm = HybridContents(managers={
+        '': NoopContents(),
+        'local': NoopContents(),
+        'shared/team/data': NoopContents(),
+    })
+    paths = ['', 'owner/dataset/file.csv', 'local/notebooks/a.ipynb',
+             'shared/team/data/x/y/z.csv']
+
+    number = 100000
+    for path in paths:
+        elapsed = timeit.timeit(lambda: cm.dir_exists(path), number=number)
+        print('dispatch {:<30} {:8.3f} us/call'.format(
+            repr(path), elapsed / number * 1e6))
+
+    for size in [100, 10000]:
+        models = [listing(size) for _ in range(10)]
+        copies = iter([copy.deepcopy(m) for m in models * 3])
+        elapsed = timeit.timeit(
+            lambda: _apply_prefix('shared/team/data', next(copies)),
+            number=30)
+        print('prefix listing of {:<6} files {:8.3f} ms/listing'.format(
+            size, elapsed / 30 * 1e3))
+
+
+if __name__ == '__main__':
+    main()
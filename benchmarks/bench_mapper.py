@@ -0,0 +1,76 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""
+Measures per-file cost of path handling while listing large datasets.
+
+Usage: python benchmarks/bench_mapper.py
+"""
+from __future__ import print_function
+
+import timeit
+
+from dwcontents.models import DwMapper
+from dwcontents.utils import to_dw_path, split_parent
+
+
+def dataset(size, name='dir{}/sub/file{}.csv'):
+    return {
+        'owner': 'owner',
+        'id': 'dataset',
+        'accessLevel': 'WRITE',
+        'created': '2018-01-01T00:00:00.000Z',
+        'updated': '2018-01-01T00:00:00.000Z',
+        'files': [{'name': name.format(i % 10, i),
+                   'created': '2018-01-01T00:00:00.000Z',
+                   'updated': '2018-01-01T00:00:00.000Z'}
+                  for i in range(size)]
+    }
+
+
+def main():
+    for root_dir in ['', 'owner/dataset']:
+        mapper = DwMapper(root_dir=root_dir)
+        for size in [1000, 20000]:
+            ds = dataset(size)
+            elapsed = timeit.timeit(
+                lambda: mapper.map_subdir('sub', 'dir1', ds,
+                                          include_content=True),
+                number=10)
+            print('root={:<15} list dir of {:<6} files {:8.3f} us/file'.format(
+                repr(root_dir), size, elapsed / 10 / size * 1e6))
+
+            ds = dataset(size, name='file{1}.csv')
+            elapsed = timeit.timeit(
+                lambda: mapper.map_dataset(ds, include_content=True),
+                number=10)
+            print('root={:<15} map {:<6} files {:14.3f} us/file'.format(
+                repr(root_dir), size, elapsed / 10 / size * 1e6))
+
+    paths = ['owner/dataset/dir{}/sub/file{}.csv'.format(i % 10, i % 100)
+             for i in range(1000)]
+    number = 100
+    elapsed = timeit.timeit(
+        lambda: [(to_dw_path(p, 'owner'), split_parent(p)) for p in paths],
+        number=number)
+    print('parse path {:8.3f} us/path'.format(
+        elapsed / number / len(paths) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""
+Measures IO loop responsiveness while large notebooks are opened and saved
+through DwContents, with and without notebook workers.
+
+Notebooks are opened and saved on the IO loop, the way Jupyter's handlers
+do, and on a thread pool, the way the dwcontents server extension does,
+which is where notebook workers help.
+
+Usage: python benchmarks/bench_workers.py
+"""
+from __future__ import print_function
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nbformat.sign import NotebookNotary, MemorySignatureStore
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+from tornado import gen
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from dwcontents.api import DwContentsApi, decode_content
+from dwcontents.contents import DwContents
+from dwcontents.handlers import OffLoopContents
+
+TICK = 0.01  # seconds
+ROUNDS = 3
+
+
+class MemoryApi(DwContentsApi):
+    """Just enough of DwContentsApi to open and save files"""
+
+    def __init__(self):
+        self.files = {}
+
+    def get_dataset(self, owner, dataset_id):
+        return {'owner': owner, 'id': dataset_id, 'accessLevel': 'WRITE',
+                'created': '2018-01-01T00:00:00.000Z',
+                'updated': '2018-01-01T00:00:00.000Z',
+                'files': [{'name': name, 'sizeInBytes': len(data),
+                           'created': '2018-01-01T00:00:00.000Z',
+                           'updated': '2018-01-01T00:00:00.000Z'}
+                          for name, data in self.files.items()]}
+
+    def get_file(self, owner, dataset_id, file_name, format='json'):
+        return decode_content(self.files[file_name], format)
+
+    def download_file(self, owner, dataset_id, file_name):
+        return self.files[file_name]
+
+    def upload_file(self, owner, dataset_id, file_name, data):
+        self.files[file_name] = data
+        return self.get_dataset(owner, dataset_id)
+
+
+def notebook(cells):
+    return new_notebook(cells=[new_code_cell('x = {}'.format(i), outputs=[
+        new_output('execute_result', execution_count=1, data={
+            'text/plain': 'y' * 2000, 'image/png': 'A' * 20000})])
+        for i in range(cells)])
+
+
+def contents(workers):
+    cm = DwContents(root_dir='owner/dataset', api=MemoryApi(),
+                    notebook_workers=workers, notebook_worker_threshold=0)
+    cm.notary = NotebookNotary(secret=b'secret',
+                               store_factory=MemorySignatureStore)
+    return cm
+
+
+@gen.coroutine
+def on_loop(cm, nb):
+    # As notebook.services.contents.handlers.ContentsHandler does
+    yield gen.maybe_future(cm.save({'type': 'notebook', 'content': nb},
+                                   'nb.ipynb'))
+    yield gen.maybe_future(cm.get('nb.ipynb'))
+
+
+EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+
+@gen.coroutine
+def off_loop(cm, nb):
+    # As dwcontents.handlers.ThreadedContentsHandler does
+    cm = OffLoopContents(cm, EXECUTOR)
+    yield gen.maybe_future(cm.save({'type': 'notebook', 'content': nb},
+                                   'nb.ipynb'))
+    yield gen.maybe_future(cm.get('nb.ipynb'))
+
+
+def measure(cm, nb, caller):
+    """Returns IO loop lags and elapsed time, opening and saving nb"""
+    loop = IOLoop()
+    lags = []
+    last = [time.time()]
+
+    def tick():
+        now = time.time()
+        lags.append(max(0.0, now - last[0] - TICK))
+        last[0] = now
+
+    @gen.coroutine
+    def load():
+        start = time.time()
+        for _ in range(ROUNDS):
+            yield caller(cm, nb)
+        elapsed = time.time() - start
+        yield gen.sleep(TICK * 2)  # Let the last lag be measured
+        raise gen.Return(elapsed)
+
+    timer = PeriodicCallback(tick, TICK * 1000)
+    loop.add_callback(timer.start)
+    try:
+        elapsed = loop.run_sync(load)
+    finally:
+        timer.stop()
+        loop.close()
+    lags.sort()
+    return lags, elapsed
+
+
+def main():
+    managers = [('in process', contents(0)), ('in workers', contents(2))]
+    warm_up = notebook(1)
+    for _, cm in managers:
+        in_thread_sync(cm, warm_up)
+
+    for cells in [500, 3000]:
+        nb = notebook(cells)
+        size = len(json.dumps(nb))
+        for caller in [on_loop, off_loop]:
+            for name, cm in managers:
+                lags, elapsed = measure(cm, nb, caller)
+                print('{:6.1f}MB {:<9} {:<10} {:7.3f}s  loop lag p50 '
+                      '{:6.1f}ms p99 {:6.1f}ms max {:6.1f}ms'.format(
+                          size / 1e6, caller.__name__, name,
+                          elapsed / ROUNDS, lags[len(lags) // 2] * 1e3,
+                          lags[int(len(lags) * 0.99)] * 1e3,
+                          lags[-1] * 1e3))
+
+    for _, cm in managers:
+        if cm.workers is not None:
+            cm.workers.shutdown()
+
+
+def in_thread_sync(cm, nb):
+    # Starts worker processes, if any, before measuring
+    thread = threading.Thread(target=lambda: (
+        cm.save({'type': 'notebook', 'content': nb}, 'nb.ipynb'),
+        cm.get('nb.ipynb')))
+    thread.start()
+    thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -20,3 +20,8 @@
 __version__ = '1.0.0b5'
 from dwcontents.contents import DwContents  # noqa: F401
 from dwcontents.hybridcontents import HybridContents  # noqa: F401
+from dwcontents.handlers import load_jupyter_server_extension  # noqa: F401
+
+
+def _jupyter_server_extension_paths():
+    return [{'module': 'dwcontents'}]
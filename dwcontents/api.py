@@ -19,7 +19,9 @@
 from __future__ import unicode_literals
 
 import base64
+import json
 from builtins import str
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
 from time import sleep
 
@@ -30,17 +32,30 @@ from requests import Request, Session
 from requests.adapters import BaseAdapter, HTTPAdapter
 from tornado.web import HTTPError
 
-from dwcontents import __version__
-from dwcontents.utils import unique_justseen, directory_path, to_nb_json, MWT
+from dwcontents import __version__, deadline
+from dwcontents.catalog import Catalog
+from dwcontents.deadline import DeadlineExceeded
+from dwcontents.parsing import load_dataset
+from dwcontents.ratelimit import RateLimiter, RateLimitAdapter
+from dwcontents.tracing import span, traced
+from dwcontents.utils import directory_path, to_nb_json, MWT, token_key
 
 str('Use str() once to force PyCharm to keep import')
 
+API_URL = 'https://api.data.world/v0'
 MAX_TRIES = 10  # necessary to configure backoff decorator
 CACHE_TIMEOUT = 30
+CACHE_GRACE = 30  # seconds expired results may be used while refreshed
+DELETE_BATCH_SIZE = 50
+UPLOAD_BATCH_SIZE = 50  # files per multipart upload
+UPLOAD_BATCH_BYTES = 32 * 1024 * 1024  # larger files are uploaded alone
+UPLOAD_WORKERS = 4
+STREAM_CHUNK_SIZE = 1024 * 1024
+TIMEOUT = (10, 60)  # seconds to connect and between bytes received
 
 
-def to_endpoint_url(endpoint):
-    return 'https://api.data.world/v0{}'.format(endpoint)
+def to_endpoint_url(endpoint, base_url=API_URL):
+    return '{}{}'.format(base_url, endpoint)
 
 
 def is_dataset_ready(d):
@@ -56,6 +71,20 @@ def is_dataset_ready(d):
                   files, True)
 
 
+def decode_content(data, format):
+    """Decode the raw bytes of a file into a content model's content"""
+    with span('decode', format=format, bytes=len(data)):
+        if format == 'json':
+            content = json.loads(data.decode('utf-8'))
+            nb = to_nb_json(content, version_specific=True)
+            # TODO Harden and deal with version migrations
+            return nb
+        elif format == 'base64':
+            return base64.b64encode(data).decode('ascii')
+        else:
+            return data.decode('utf-8')
+
+
 def map_exceptions(fn):
     def decorated(*args, **kwargs):
         try:
@@ -74,13 +103,41 @@ def map_exceptions(fn):
                     reason=e.response.reason)
         except UnicodeDecodeError:
             raise HTTPError(400, log_message='Bad format', reason='Bad format')
+        except (DeadlineExceeded, requests.Timeout) as e:
+            raise HTTPError(504, log_message=str(e),
+                            reason='Timed out waiting for data.world')
+        except requests.ConnectionError as e:
+            raise HTTPError(503, log_message=str(e),
+                            reason='Unable to reach data.world')
 
     decorated.__doc__ = fn.__doc__
     return decorated
 
 
 class DwContentsApi(object):
-    def __init__(self, api_token):
+    def __init__(self, api_token, adapter=None, cache_quota=None,
+                 rate_limiter=None, base_url=None):
+        """Client for data.world's API
+
+        :param api_token: data.world API token
+        :type api_token: str
+        :param adapter: Adapter to send requests with (e.g. a shared pool)
+        :type adapter: requests.adapters.BaseAdapter
+        :param cache_quota: Maximum size of this client's cached responses
+        :type cache_quota: int
+        :param rate_limiter: Limiter pacing requests (defaults to one shared
+            by all clients using the same token)
+        :type rate_limiter: dwcontents.ratelimit.RateLimiter
+        :param base_url: URL of the API (e.g. of a stand-in server)
+        :type base_url: str
+        """
+        self.base_url = (base_url if base_url is not None
+                         else API_URL).rstrip('/')
+        self.cache_quota = cache_quota
+        self.cache_timeout = None
+        self.cache_grace = None
+        self.rate_limiter = (rate_limiter if rate_limiter is not None
+                             else RateLimiter.shared(token_key(api_token)))
         self._session = Session()
         default_headers = {
             'Accept': 'application/json',
@@ -89,23 +146,28 @@ class DwContentsApi(object):
             'User-Agent': 'dw-jupyter-contents - {}'.format(__version__)
         }
         self._session.headers.update(default_headers)
-        self._session.mount('https://api.data.world/v0',
-                            BackoffAdapter(HTTPAdapter()))
-
-    @MWT(timeout=CACHE_TIMEOUT)
+        self._session.mount(self.base_url,
+                            BackoffAdapter(RateLimitAdapter(
+                                adapter if adapter is not None
+                                else HTTPAdapter(),
+                                self.rate_limiter)))
+
+    @MWT(timeout=CACHE_TIMEOUT, grace=CACHE_GRACE)
+    @traced('api.get_me')
     @map_exceptions
     def get_me(self):
         resp = self._session.get(
-            to_endpoint_url('/user')
+            self._url('/user')
         )
         resp.raise_for_status()
         return resp.json()
 
-    @MWT(timeout=CACHE_TIMEOUT)
+    @MWT(timeout=CACHE_TIMEOUT, grace=CACHE_GRACE)
+    @traced('api.get_user')
     @map_exceptions
     def get_user(self, user):
         resp = self._session.get(
-            to_endpoint_url('/users/{}'.format(user))
+            self._url('/users/{}'.format(user))
         )
         if resp.status_code in [400, 404]:
             return None
@@ -113,101 +175,269 @@ class DwContentsApi(object):
             resp.raise_for_status()
             return resp.json()
 
-    @MWT(timeout=CACHE_TIMEOUT)
+    @MWT(timeout=CACHE_TIMEOUT, grace=CACHE_GRACE)
     @map_exceptions
     @backoff.on_predicate(
         backoff.expo,
         predicate=lambda d: not (is_dataset_ready(d)),
         max_tries=lambda: MAX_TRIES,
+        max_time=deadline.remaining,
         factor=0.1)
     def get_dataset(self, owner, dataset_id):
         resp = self._session.get(
-            to_endpoint_url('/datasets/{}/{}'.format(owner, dataset_id)),
+            self._url('/datasets/{}/{}'.format(owner, dataset_id)),
+            stream=True
         )
-        if resp.status_code in [400, 404]:
-            return None
-        else:
-            resp.raise_for_status()
-            return resp.json()
+        try:
+            if resp.status_code in [400, 404]:
+                return None
+            else:
+                resp.raise_for_status()
+                with span('parse_dataset'):
+                    return load_dataset(resp)
+        finally:
+            resp.close()
 
-    @MWT(timeout=CACHE_TIMEOUT)
-    @map_exceptions
+    @MWT(timeout=CACHE_TIMEOUT, grace=CACHE_GRACE)
     def get_datasets(self):
-        def get(scope):
+        return self.list_datasets()
+
+    def cached_datasets(self):
+        """Datasets returned by ``get_datasets``, if still cached, or None
+
+        :rtype: dwcontents.catalog.Catalog
+        """
+        return DwContentsApi.get_datasets.peek(self)
+
+    @traced('api.list_datasets')
+    @map_exceptions
+    def list_datasets(self):
+        """Datasets owned, contributed to or liked by the user (uncached)
+
+        :rtype: dwcontents.catalog.Catalog
+        """
+        return Catalog(self._iter_datasets())
+
+    def _iter_datasets(self):
+        for scope in ['own', 'contributing', 'liked']:
             req = Request(
                 method='GET',
-                url=to_endpoint_url('/user/datasets/{}'.format(scope)),
+                url=self._url('/user/datasets/{}'.format(scope)),
                 params={'limit': 100, 'fields': 'id,owner,title,accessLevel,'
                                                 'created,updated'}
             )
+            for page in self._paginate(req):
+                for dataset in page:
+                    yield dataset
 
-            dataset_pages = [page for page in self._paginate(req)]
+    @traced('api.get_file')
+    @map_exceptions
+    def get_file(self, owner, dataset_id, file_name, format='json'):
+        resp = self._download(owner, dataset_id, file_name)
+        return self._decode_response(resp, format)
 
-            return dataset_pages
+    @traced('api.download_file')
+    @map_exceptions
+    def download_file(self, owner, dataset_id, file_name):
+        return self._download(owner, dataset_id, file_name).content
 
-        pages = get('own') + get('contributing') + get('liked')
-        datasets = [d for page in pages for d in page]
+    @traced('api.stream_file')
+    @map_exceptions
+    def stream_file(self, owner, dataset_id, file_name,
+                    chunk_size=STREAM_CHUNK_SIZE):
+        """Download a file as an iterator of chunks of bytes"""
+        resp = self._download(owner, dataset_id, file_name, stream=True)
+        return self._iter_chunks(resp, chunk_size)
 
-        return list(unique_justseen(
-            datasets,
-            key=lambda d: (d['owner'], d['id'])))
+    @traced('api.get_file_head')
+    @map_exceptions
+    def get_file_head(self, owner, dataset_id, file_name, max_bytes):
+        """Download up to max_bytes from the beginning of a file"""
+        resp = self._download(
+            owner, dataset_id, file_name, stream=True,
+            headers={'Range': 'bytes=0-{}'.format(max_bytes - 1)})
+        chunks = []
+        size = 0
+        try:
+            # Servers may ignore the range and send the whole file
+            for chunk in resp.iter_content(
+                    min(max_bytes, STREAM_CHUNK_SIZE)):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    break
+        finally:
+            resp.close()
+        return b''.join(chunks)[:max_bytes]
+
+    @traced('api.upload_file')
+    @map_exceptions
+    def upload_file(self, owner, dataset_id, file_name, data):
+        self.put_file(owner, dataset_id, file_name, data)
+        return self.sync_dataset(owner, dataset_id)
 
+    @traced('api.upload_files')
     @map_exceptions
-    def get_file(self, owner, dataset_id, file_name, format='json'):
-        resp = self._session.get(
-            to_endpoint_url('/file_download/{}/{}/{}'.format(
-                owner, dataset_id, quote(file_name, safe='')
-            ))
-        )
-        resp.raise_for_status()
-        return self._decode_response(resp, format)
+    def upload_files(self, owner, dataset_id, files,
+                     max_workers=UPLOAD_WORKERS):
+        """Upload many files, then refresh caches and wait for the dataset
+        to be ready once
+
+        :param files: ``{file_name: data}`` or ``(file_name, data)`` pairs
+        :type files: dict or iterable
+        :param max_workers: Maximum number of requests in progress at once
+        :type max_workers: int
+        :returns: The updated dataset
+        :rtype: dict
+        """
+        try:
+            self.put_files(owner, dataset_id, files, max_workers=max_workers)
+        finally:
+            # Files may have been uploaded before a request failed
+            MWT().invalidate(self)
+        return self.get_dataset(owner, dataset_id)
 
+    @traced('api.put_files')
     @map_exceptions
-    def upload_file(self, owner, dataset_id, file_name, data):
+    def put_files(self, owner, dataset_id, files,
+                  max_workers=UPLOAD_WORKERS):
+        """Upload many files without refreshing caches or waiting for the
+        dataset to be ready (see ``sync_dataset``)
+
+        Files are sent in multipart requests of up to ``UPLOAD_BATCH_SIZE``
+        files and ``UPLOAD_BATCH_BYTES`` bytes, several at a time. Larger
+        files are uploaded on their own.
+        """
+        files = list(files.items() if isinstance(files, dict) else files)
+        batches, batch, batch_bytes = [], [], 0
+        for file_name, data in files:
+            if len(data) > UPLOAD_BATCH_BYTES:
+                batches.append([(file_name, data)])
+                continue
+            if (len(batch) == UPLOAD_BATCH_SIZE or
+                    batch_bytes + len(data) > UPLOAD_BATCH_BYTES):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append((file_name, data))
+            batch_bytes += len(data)
+        if len(batch) > 0:
+            batches.append(batch)
+
+        def send(batch):
+            if len(batch) == 1:
+                self.put_file(owner, dataset_id, *batch[0])
+            else:
+                self._post_files(owner, dataset_id, batch)
+
+        if len(batches) == 1:
+            send(batches[0])
+        elif len(batches) > 1:
+            # Workers share the caller's deadline
+            budget = deadline.remaining()
+
+            def send_within_budget(batch):
+                with deadline.Deadline(budget):
+                    send(batch)
+
+            with ThreadPoolExecutor(
+                    max_workers=max(1, min(max_workers,
+                                           len(batches)))) as pool:
+                for future in [pool.submit(send_within_budget, b)
+                               for b in batches]:
+                    future.result()
+
+    @traced('api.put_file')
+    @map_exceptions
+    def put_file(self, owner, dataset_id, file_name, data):
+        """Upload a file without refreshing caches or waiting for the
+        dataset to be ready (see ``sync_dataset``)"""
         # TODO Fix API (support for files in subdirectories)
         resp = self._session.put(
-            to_endpoint_url('/uploads/{}/{}/files/{}'.format(
+            self._url('/uploads/{}/{}/files/{}'.format(
                 owner, dataset_id, quote(file_name, safe='')
             )),
             data=data,
             headers={'Content-Type': 'application/octet-stream'})
         resp.raise_for_status()
-        MWT().invalidate()
+
+    @traced('api.sync_dataset')
+    def sync_dataset(self, owner, dataset_id):
+        """Invalidate caches and wait for a modified dataset to be ready"""
+        MWT().invalidate(self)
         return self.get_dataset(owner, dataset_id)
 
+    @traced('api.delete_subdirectory')
     @map_exceptions
     def delete_subdirectory(self, owner, dataset_id, directory_name):
         dataset = self.get_dataset(owner, dataset_id)
         for f in dataset.get('files', []):
             if f['name'].startswith(directory_path(directory_name)):
                 self.delete_file(owner, dataset_id, f['name'])
-        MWT().invalidate()
+        MWT().invalidate(self)
 
+    @traced('api.delete_file')
     @map_exceptions
     def delete_file(self, owner, dataset_id, file_name):
         self._session.delete(
-            to_endpoint_url('/datasets/{}/{}/files/{}'.format(
+            self._url('/datasets/{}/{}/files/{}'.format(
                 owner, dataset_id, quote(file_name, safe='')))
         ).raise_for_status()
-        MWT().invalidate()
+        MWT().invalidate(self)
 
+    @traced('api.delete_files')
+    @map_exceptions
+    def delete_files(self, owner, dataset_id, file_names):
+        """Delete multiple files, without refreshing caches"""
+        file_names = list(file_names)
+        for i in range(0, len(file_names), DELETE_BATCH_SIZE):
+            self._session.delete(
+                self._url('/datasets/{}/{}/files'.format(
+                    owner, dataset_id)),
+                params={'name': file_names[i:i + DELETE_BATCH_SIZE]}
+            ).raise_for_status()
+
+    @traced('api.delete_dataset')
     @map_exceptions
     def delete_dataset(self, owner, dataset_id):
         self._session.delete(
-            to_endpoint_url('/datasets/{}/{}'.format(owner, dataset_id))
+            self._url('/datasets/{}/{}'.format(owner, dataset_id))
         ).raise_for_status()
-        MWT().invalidate()
+        MWT().invalidate(self)
 
     def _decode_response(self, resp, format):
-        if format == 'json':
-            content = resp.json()
-            nb = to_nb_json(content, version_specific=True)
-            # TODO Harden and deal with version migrations
-            return nb
-        elif format == 'base64':
-            return base64.b64encode(resp.content).decode('ascii')
-        else:
-            return resp.content.decode('utf-8')
+        return decode_content(resp.content, format)
+
+    def _post_files(self, owner, dataset_id, batch):
+        resp = self._session.post(
+            self._url('/uploads/{}/{}/files'.format(owner, dataset_id)),
+            files=[('file', (file_name, data, 'application/octet-stream'))
+                   for file_name, data in batch],
+            # Let requests set the multipart content type
+            headers={'Content-Type': None})
+        resp.raise_for_status()
+
+    def _url(self, endpoint):
+        return to_endpoint_url(endpoint, self.base_url)
+
+    def _download(self, owner, dataset_id, file_name, stream=False,
+                  headers=None):
+        resp = self._session.get(
+            self._url('/file_download/{}/{}/{}'.format(
+                owner, dataset_id, quote(file_name, safe='')
+            )),
+            stream=stream,
+            headers=headers
+        )
+        resp.raise_for_status()
+        return resp
+
+    @staticmethod
+    def _iter_chunks(resp, chunk_size):
+        try:
+            for chunk in resp.iter_content(chunk_size):
+                yield chunk
+        finally:
+            resp.close()
 
     def _paginate(self, req):
         while True:
@@ -231,14 +461,29 @@ class BackoffAdapter(BaseAdapter):
         self._delegate = delegate
         super(BackoffAdapter, self).__init__()
 
-    @backoff.on_predicate(backoff.expo,
-                          predicate=lambda r: r.status_code == 429,
-                          max_tries=lambda: MAX_TRIES)
     def send(self, request, **kwargs):
-        resp = self._delegate.send(request, **kwargs)
-        if (resp.status_code == 429 and
-                resp.headers.get('Retry-After')):
-            sleep(int(resp.headers.get('Retry-After')))
+        default_timeout = kwargs.get('timeout') or TIMEOUT
+        # File bodies must be rewound before being sent again
+        body = getattr(request, 'body', None)
+        start = body.tell() if hasattr(body, 'seek') else None
+        for tries in range(1, MAX_TRIES + 1):
+            if start is not None and tries > 1:
+                body.seek(start)
+            kwargs['timeout'] = deadline.timeout(default_timeout)
+            resp = self._delegate.send(request, **kwargs)
+            if resp.status_code != 429 or tries == MAX_TRIES:
+                return resp
+
+            # Wait as instructed by the server, or back off exponentially
+            retry_after = resp.headers.get('Retry-After')
+            try:
+                wait = float(retry_after)
+            except (TypeError, ValueError):
+                wait = backoff.full_jitter(2 ** (tries - 1))
+            if not deadline.fits(wait):
+                return resp
+            resp.close()
+            sleep(wait)
 
         return resp
 
@@ -0,0 +1,93 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+from builtins import str
+
+str('Use str() once to force PyCharm to keep import')
+
+
+class Catalog(object):
+    """Datasets available to a user, grouped by owner as they are added
+
+    Datasets are indexed by owner and by ``(owner, dataset_id)``.
+    Duplicates (e.g. datasets both owned and liked) are only kept once.
+    Each account keeps the dates of its oldest and most recently updated
+    datasets, so that accounts can be listed without going through their
+    datasets again.
+
+    :param datasets: Datasets, in any order
+    :type datasets: iterable
+    """
+
+    def __init__(self, datasets=()):
+        self.datasets = []
+        self.accounts = {}
+        self.dates = {}
+        self._by_key = {}
+        self._owners = None
+        for dataset in datasets:
+            self.add(dataset)
+
+    def add(self, dataset):
+        """Fold a dataset into the catalog
+
+        :returns: False if the dataset was already included
+        :rtype: bool
+        """
+        owner = dataset['owner']
+        key = (owner, dataset['id'])
+        if key in self._by_key:
+            return False
+        self._by_key[key] = dataset
+        self.datasets.append(dataset)
+
+        account = self.accounts.get(owner)
+        if account is None:
+            account = self.accounts[owner] = []
+            self.dates[owner] = {'created': dataset['created'],
+                                 'last_modified': dataset['updated']}
+            self._owners = None
+        else:
+            dates = self.dates[owner]
+            dates['created'] = min(dates['created'], dataset['created'])
+            dates['last_modified'] = max(dates['last_modified'],
+                                         dataset['updated'])
+        account.append(dataset)
+        return True
+
+    def account(self, owner):
+        """Datasets of an owner, in the order they were added"""
+        return self.accounts.get(owner, [])
+
+    def dataset(self, owner, dataset_id):
+        """Dataset summary, or None if not in the catalog"""
+        return self._by_key.get((owner, dataset_id))
+
+    def owners(self):
+        """Owners of datasets in the catalog, sorted"""
+        if self._owners is None:
+            self._owners = sorted(self.accounts)
+        return self._owners
+
+    def __iter__(self):
+        return iter(self.datasets)
+
+    def __len__(self):
+        return len(self.datasets)
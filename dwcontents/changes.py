@@ -0,0 +1,117 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import logging
+import threading
+from builtins import str
+
+from dwcontents.api import CACHE_TIMEOUT
+from dwcontents.tracing import span
+from dwcontents.utils import MWT
+
+str('Use str() once to force PyCharm to keep import')
+
+
+class ChangePoller(object):
+    """Invalidates cached datasets when their ``updated`` stamp changes
+
+    The user's dataset listing is fetched every ``interval`` seconds. Only
+    datasets whose stamp moved, appeared or disappeared are evicted from
+    the API client's cache, so that cached entries can live longer.
+    Datasets outside the listing can't be watched and are still evicted
+    after ``CACHE_TIMEOUT`` seconds.
+
+    :param api: API client
+    :type api: dwcontents.api.DwContentsApi
+    :param interval: Number of seconds between polls
+    :type interval: float
+    :param listeners: Called with the list of ``(owner, dataset_id)``
+        that changed
+    :type listeners: list
+    """
+
+    def __init__(self, api, interval=30, listeners=None, logger=None):
+        self.api = api
+        self.interval = interval
+        self.listeners = list(listeners) if listeners is not None else []
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self.polls = 0
+        self.changes = 0
+        self._stamps = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='dwcontents-poller')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def poll(self):
+        """Check for changes once
+
+        :returns: ``(owner, dataset_id)`` of datasets that changed
+        :rtype: list
+        """
+        with span('poller.poll') as polling:
+            stamps = {(d['owner'], d['id']): d.get('updated')
+                      for d in self.api.list_datasets()}
+            polling.set('datasets', len(stamps))
+
+        previous = self._stamps
+        self._stamps = stamps
+        self.polls += 1
+        if previous is None:
+            return []
+
+        changed = [key for key in set(stamps) | set(previous)
+                   if stamps.get(key) != previous.get(key)]
+        mwt = MWT()
+        if len(changed) > 0:
+            changed_keys = set(changed)
+            mwt.invalidate(self.api,
+                           predicate=lambda args: tuple(args[:2]) in
+                           changed_keys)
+            mwt.invalidate(self.api, name='get_datasets')
+            self.changes += len(changed)
+            self.log.debug('[poller] %s datasets changed', len(changed))
+        mwt.invalidate(self.api, name='get_dataset',
+                       predicate=lambda args: tuple(args[:2]) not in stamps,
+                       older_than=CACHE_TIMEOUT)
+
+        if len(changed) > 0:
+            for listener in self.listeners:
+                listener(changed)
+        return changed
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.log.warning('[poller] Unable to check for changes: %s',
+                                 e)
+            self._stopped.wait(self.interval)
@@ -0,0 +1,291 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from builtins import str
+
+import nbformat
+from notebook._tz import utcfromtimestamp
+from notebook.services.contents.checkpoints import Checkpoints, \
+    GenericCheckpointsMixin
+from tornado.web import HTTPError
+from traitlets import Unicode, Integer
+
+from dwcontents.utils import normalize_path
+
+str('Use str() once to force PyCharm to keep import')
+
+CHECKPOINT_ID = 'checkpoint'
+
+
+def _replace(src, dst):
+    getattr(os, 'replace', os.rename)(src, dst)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DwCheckpoints(GenericCheckpointsMixin, Checkpoints):
+    """Local, content-addressed checkpoints for DwContents
+
+    Checkpoint contents are stored once per unique hash under a per-user
+    namespace and referenced from an index of checkpointed paths.
+    Checkpoints older than ``max_age`` are dropped and the oldest ones are
+    evicted whenever the namespace grows beyond ``max_bytes``.
+    """
+
+    root_dir = Unicode(
+        config=True,
+        help='Local directory where checkpoints are stored.'
+    )
+
+    user = Unicode(
+        config=True,
+        help='Namespace for checkpoints (defaults to the data.world user).'
+    )
+
+    max_age = Integer(
+        7 * 24 * 60 * 60,
+        config=True,
+        help='Seconds after which checkpoints are discarded (0 to disable).'
+    )
+
+    max_bytes = Integer(
+        256 * 1024 * 1024,
+        config=True,
+        help='Maximum disk space used by a namespace (0 to disable).'
+    )
+
+    def __init__(self, **kwargs):
+        super(DwCheckpoints, self).__init__(**kwargs)
+        self._lock = threading.RLock()
+        self._index = None
+
+    # noinspection PyMethodMayBeStatic
+    def _root_dir_default(self):
+        return os.path.join(tempfile.gettempdir(), 'dwcontents-checkpoints')
+
+    def _user_default(self):
+        api = getattr(self.parent, 'api', None)
+        if api is not None:
+            try:
+                return api.get_me()['id']
+            except (HTTPError, KeyError, TypeError):
+                self.log.warning('Unable to determine data.world user for '
+                                 'checkpoints namespace')
+        return 'default'
+
+    def create_checkpoint(self, contents_mgr, path):
+        held_content = getattr(contents_mgr, 'held_content', None)
+        held = held_content(path) if held_content is not None else None
+        if held is None:
+            return super(DwCheckpoints, self).create_checkpoint(
+                contents_mgr, path)
+
+        content_type, content_format, data = held
+        return self._store(path, content_type, content_format, data)
+
+    def create_file_checkpoint(self, content, format, path):
+        if format == 'base64':
+            data = base64.b64decode(content.encode('ascii'))
+        else:
+            data = content.encode('utf-8')
+        return self._store(path, 'file', format, data)
+
+    def create_notebook_checkpoint(self, nb, path):
+        data = nbformat.writes(nb, version=nbformat.NO_CONVERT)
+        return self._store(path, 'notebook', 'json', data.encode('utf-8'))
+
+    def get_file_checkpoint(self, checkpoint_id, path):
+        entry, data = self._load(checkpoint_id, path)
+        if entry['format'] == 'text':
+            return {
+                'type': 'file',
+                'content': data.decode('utf-8'),
+                'format': 'text'
+            }
+        else:
+            return {
+                'type': 'file',
+                'content': base64.b64encode(data).decode('ascii'),
+                'format': 'base64'
+            }
+
+    def get_notebook_checkpoint(self, checkpoint_id, path):
+        _, data = self._load(checkpoint_id, path)
+        return {
+            'type': 'notebook',
+            'content': nbformat.reads(data.decode('utf-8'), as_version=4)
+        }
+
+    def delete_checkpoint(self, checkpoint_id, path):
+        path = normalize_path(path)
+        with self._lock:
+            index = self._get_index()
+            if checkpoint_id != CHECKPOINT_ID or path not in index:
+                self.no_such_checkpoint(path, checkpoint_id)
+            entry = index.pop(path)
+            self._collect([entry['hash']])
+            self._save_index()
+
+    def list_checkpoints(self, path):
+        path = normalize_path(path)
+        with self._lock:
+            entry = self._get_index().get(path)
+            return [self._checkpoint_model(entry)] if entry else []
+
+    def rename_checkpoint(self, checkpoint_id, old_path, new_path):
+        old_path = normalize_path(old_path)
+        new_path = normalize_path(new_path)
+        with self._lock:
+            index = self._get_index()
+            if checkpoint_id != CHECKPOINT_ID or old_path not in index:
+                self.no_such_checkpoint(old_path, checkpoint_id)
+            replaced = index.get(new_path)
+            index[new_path] = index.pop(old_path)
+            if replaced is not None:
+                self._collect([replaced['hash']])
+            self._save_index()
+
+    def no_such_checkpoint(self, path, checkpoint_id):
+        raise HTTPError(
+            404,
+            'Checkpoint does not exist: {}@{}'.format(path, checkpoint_id))
+
+    @property
+    def namespace_dir(self):
+        user = re.sub(r'[^\w.-]', '_', self.user) or 'default'
+        return os.path.join(self.root_dir, user)
+
+    def _object_path(self, digest):
+        return os.path.join(self.namespace_dir, 'objects', digest[:2], digest)
+
+    def _store(self, path, content_type, content_format, data):
+        path = normalize_path(path)
+        digest = content_hash(data)
+        self.log.debug('[_store] p:%s h:%s s:%s', path, digest, len(data))
+
+        with self._lock:
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path):
+                self._write_atomic(object_path, data)
+
+            index = self._get_index()
+            previous = index.get(path)
+            index[path] = {
+                'hash': digest,
+                'type': content_type,
+                'format': content_format,
+                'size': len(data),
+                'last_modified': time.time()
+            }
+            self._prune(index,
+                        [previous['hash']] if previous is not None else [])
+            self._save_index()
+            return self._checkpoint_model(index.get(path))
+
+    def _load(self, checkpoint_id, path):
+        path = normalize_path(path)
+        with self._lock:
+            entry = self._get_index().get(path)
+            if checkpoint_id != CHECKPOINT_ID or entry is None:
+                self.no_such_checkpoint(path, checkpoint_id)
+            try:
+                with io.open(self._object_path(entry['hash']), 'rb') as f:
+                    return entry, f.read()
+            except (IOError, OSError):
+                self.no_such_checkpoint(path, checkpoint_id)
+
+    def _prune(self, index, candidates):
+        candidates = list(candidates)
+        now = time.time()
+        if self.max_age > 0:
+            for path, entry in list(index.items()):
+                if now - entry['last_modified'] > self.max_age:
+                    candidates.append(index.pop(path)['hash'])
+
+        if self.max_bytes > 0:
+            oldest_first = sorted(index.items(),
+                                  key=lambda e: e[1]['last_modified'])
+            sizes = {e['hash']: e['size'] for e in index.values()}
+            total = sum(sizes.values())
+            for path, entry in oldest_first:
+                if total <= self.max_bytes or len(index) <= 1:
+                    break
+                index.pop(path)
+                candidates.append(entry['hash'])
+                if not any(e['hash'] == entry['hash']
+                           for e in index.values()):
+                    total -= sizes[entry['hash']]
+
+        self._collect(candidates)
+
+    def _collect(self, candidates):
+        referenced = {e['hash'] for e in self._get_index().values()}
+        for digest in set(candidates) - referenced:
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+
+    def _get_index(self):
+        if self._index is None:
+            index_path = os.path.join(self.namespace_dir, 'index.json')
+            try:
+                with io.open(index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (IOError, OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        self._write_atomic(
+            os.path.join(self.namespace_dir, 'index.json'),
+            json.dumps(self._get_index()).encode('utf-8'))
+
+    @staticmethod
+    def _write_atomic(target, data):
+        target_dir = os.path.dirname(target)
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=target_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            _replace(tmp_path, target)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _checkpoint_model(entry):
+        return {
+            'id': CHECKPOINT_ID,
+            'last_modified': utcfromtimestamp(entry['last_modified'])
+        }
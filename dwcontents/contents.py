@@ -19,23 +19,59 @@
 from __future__ import unicode_literals
 
 import base64
+import codecs
+import datetime
+import itertools
 import json
 import os
-import tempfile
 from builtins import str
 
-from notebook.services.contents.filecheckpoints import GenericFileCheckpoints
 from notebook.services.contents.manager import ContentsManager
 from tornado.web import HTTPError
-from traitlets import Unicode
+from traitlets import Unicode, Integer, Bool, Float
 
-from dwcontents.api import DwContentsApi
-from dwcontents.models import guess_type, DwMapper, guess_format
+from dwcontents import deadline, tracing
+from dwcontents.api import DwContentsApi, STREAM_CHUNK_SIZE, decode_content
+from dwcontents.changes import ChangePoller
+from dwcontents.checkpoints import DwCheckpoints
+from dwcontents.deadline import with_deadline
+from dwcontents.index import DatasetIndex
+from dwcontents.lean import externalize, restore, references, \
+    is_sidecar, METADATA_KEY
+from dwcontents.models import guess_type, DwMapper, guess_format, \
+    create_model
+from dwcontents.prefetch import Prefetcher
+from dwcontents.ratelimit import RateLimiter
+from dwcontents.rename import plan_rename, BatchRename
+from dwcontents.tenants import TenantPool
+from dwcontents.tracing import span, traced
+from dwcontents.transfer import Chunks
+from dwcontents.uploads import ChunkedUploads, LAST_CHUNK
 from dwcontents.utils import to_dw_path, split_parent, normalize_path, \
-    directory_path, to_nb_json
+    directory_path, to_nb_json, LRUCache, token_key, approx_size
+from dwcontents.warmup import WarmUp
+from dwcontents.workers import NotebookWorkers
 
 str('Use str() once to force PyCharm to keep import')
 
+# Format requesting only the beginning of a file, in its usual format
+PREVIEW_FORMAT = 'preview'
+
+
+def file_bytes(model):
+    if model['format'] == 'base64':
+        return base64.b64decode(model['content'].encode('ascii'))
+    else:
+        return model['content'].encode('utf-8')
+
+
+def _timestamp(value):
+    # e.g. 2018-01-01T00:00:00.000Z, in UTC
+    try:
+        return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    except (TypeError, ValueError):
+        return datetime.datetime.min
+
 
 def http_400(msg):
     raise HTTPError(400, log_message=msg, reason=msg)
@@ -54,12 +90,225 @@ def http_409(msg):
 
 
 class DwContents(ContentsManager):
+    supports_chunked_save = True
+
     dw_auth_token = Unicode(
         allow_none=False,
         config=True,
         help="data.world API authentication token.",
     )
 
+    api_url = Unicode(
+        'https://api.data.world/v0',
+        config=True,
+        help="Base URL of data.world's API.",
+    )
+
+    held_content_bytes = Integer(
+        32 * 1024 * 1024,
+        config=True,
+        help="Maximum size of recently saved content kept in memory for "
+             "checkpoints.",
+    )
+
+    rename_workers = Integer(
+        8,
+        config=True,
+        help="Maximum number of files copied concurrently when renaming "
+             "directories in compatibility mode.",
+    )
+
+    tenant_mode = Bool(
+        False,
+        config=True,
+        help="Serve many users per process, sharing one connection pool "
+             "and keeping separate caches for each token.",
+    )
+
+    max_connections = Integer(
+        32,
+        config=True,
+        help="Size of the connection pool shared by all users in tenant "
+             "mode.",
+    )
+
+    max_concurrent_requests = Integer(
+        16,
+        config=True,
+        help="Maximum number of requests to data.world in progress at once "
+             "in tenant mode, scheduled fairly across users.",
+    )
+
+    tenant_cache_quota = Integer(
+        64 * 1024 * 1024,
+        config=True,
+        help="Approximate memory limit for each user's cached responses in "
+             "tenant mode.",
+    )
+
+    prefetch = Bool(
+        False,
+        config=True,
+        help="Download small notebooks and text files in the background "
+             "after their directory is listed.",
+    )
+
+    prefetch_workers = Integer(
+        2,
+        config=True,
+        help="Maximum number of files prefetched at the same time.",
+    )
+
+    prefetch_max_file_size = Integer(
+        1024 * 1024,
+        config=True,
+        help="Size of the largest files prefetched, in bytes.",
+    )
+
+    prefetch_cache_bytes = Integer(
+        32 * 1024 * 1024,
+        config=True,
+        help="Maximum size of prefetched content kept in memory.",
+    )
+
+    preview_threshold = Integer(
+        0,
+        config=True,
+        help="Files larger than this many bytes, opened in a given format "
+             "(as the file editor does), are opened as a preview of their "
+             "first preview_bytes (0 to always open files in full). "
+             "Downloads, copies and renames always read files in full.",
+    )
+
+    preview_bytes = Integer(
+        1024 * 1024,
+        config=True,
+        help="Number of bytes downloaded when previewing a file.",
+    )
+
+    metadata_ttl = Float(
+        30.0,
+        config=True,
+        help="Number of seconds dataset snapshots are used to answer "
+             "requests for models without content.",
+    )
+
+    trace_file = Unicode(
+        '',
+        config=True,
+        help="File to write tracing spans to, as JSON lines.",
+    )
+
+    trace_opentelemetry = Bool(
+        False,
+        config=True,
+        help="Report tracing spans to OpenTelemetry (requires the "
+             "opentelemetry-api package).",
+    )
+
+    cache_grace = Float(
+        30.0,
+        config=True,
+        help="Number of seconds cached datasets and listings may be used "
+             "after they expire, while they are refreshed in the background "
+             "(0 to always wait for fresh results).",
+    )
+
+    poll_interval = Float(
+        0.0,
+        config=True,
+        help="Number of seconds between checks for datasets changed outside "
+             "of Jupyter (0 to disable). When enabled, datasets are cached "
+             "for poll_cache_timeout seconds.",
+    )
+
+    poll_cache_timeout = Float(
+        300.0,
+        config=True,
+        help="Number of seconds datasets are cached when checking for "
+             "changes (see poll_interval).",
+    )
+
+    warm_up = Bool(
+        False,
+        config=True,
+        help="Fetch the user's datasets in the background as soon as the "
+             "server starts.",
+    )
+
+    warm_up_datasets = Integer(
+        5,
+        config=True,
+        help="Number of recently updated datasets fetched when warming up.",
+    )
+
+    notebook_workers = Integer(
+        0,
+        config=True,
+        help="Number of worker processes decoding, validating, signing and "
+             "encoding large notebooks opened or saved off the IO loop (with "
+             "the dwcontents server extension enabled), so that they don't "
+             "hold up other threads (0 to do this work in the server "
+             "process).",
+    )
+
+    notebook_worker_threshold = Integer(
+        8 * 1024 * 1024,
+        config=True,
+        help="Notebooks of at least this many bytes are handled by "
+             "notebook_workers.",
+    )
+
+    lean_notebooks = Bool(
+        False,
+        config=True,
+        help="Save large notebook outputs (see lean_output_bytes) as "
+             "separate files in the dataset, uploaded only when they "
+             "change. Notebooks are reassembled when opened.",
+    )
+
+    lean_output_bytes = Integer(
+        64 * 1024,
+        config=True,
+        help="Size of the smallest notebook outputs saved separately when "
+             "lean_notebooks is enabled.",
+    )
+
+    upload_spool_bytes = Integer(
+        16 * 1024 * 1024,
+        config=True,
+        help="Files uploaded in chunks are assembled in memory up to this "
+             "many bytes, and on disk beyond that.",
+    )
+
+    upload_timeout = Float(
+        3600.0,
+        config=True,
+        help="Number of seconds after which incomplete chunked uploads are "
+             "discarded.",
+    )
+
+    request_timeout = Float(
+        60.0,
+        config=True,
+        help="Maximum number of seconds spent on a single operation, "
+             "including retries (0 to wait indefinitely).",
+    )
+
+    rate_limit = Float(
+        0.0,
+        config=True,
+        help="Average number of requests per second sent to data.world for "
+             "each user, across all threads (0 to send requests unpaced).",
+    )
+
+    rate_limit_burst = Integer(
+        20,
+        config=True,
+        help="Number of requests that can be sent at once before being "
+             "paced by rate_limit.",
+    )
+
     def __init__(self, **kwargs):
         super(DwContents, self).__init__(**kwargs)
 
@@ -69,27 +318,91 @@ class DwContents(ContentsManager):
         logger = self.log
 
         # Testing options
-        self.api = kwargs.get('api', DwContentsApi(token))
+        self.api = kwargs.get('api')
         self.compatibility_mode = kwargs.get('compatibility_mode', False)
 
+        if self.api is None:
+            # Shared by every client using the same token
+            RateLimiter.shared(token_key(token), rate=self.rate_limit,
+                               burst=self.rate_limit_burst)
+            if self.tenant_mode:
+                self.api = TenantPool.instance(
+                    max_connections=self.max_connections,
+                    max_concurrency=self.max_concurrent_requests,
+                    cache_quota=self.tenant_cache_quota,
+                    base_url=self.api_url
+                ).client(token)
+            else:
+                self.api = DwContentsApi(token, base_url=self.api_url)
+
+        if self.trace_file:
+            tracing.add_sink(tracing.JsonSink(path=self.trace_file))
+        if self.trace_opentelemetry:
+            tracing.add_sink(tracing.OpenTelemetrySink())
+
+        self.api.cache_grace = self.cache_grace
+
         # Final setup
         self.root_dir = normalize_path(root_dir)
         self.mapper = DwMapper(root_dir=root_dir, logger=logger)
+        self._held = LRUCache(max_items=16,
+                              max_bytes=self.held_content_bytes,
+                              sizeof=lambda h: len(h[3]))
+        self._sidecars = LRUCache(max_items=256,
+                                  max_bytes=self.held_content_bytes)
+        self.index = DatasetIndex(ttl=self.metadata_ttl)
+        self.uploads = ChunkedUploads(spool_bytes=self.upload_spool_bytes,
+                                      max_age=self.upload_timeout,
+                                      interval=min(self.upload_timeout, 60),
+                                      logger=logger)
+        self.poller = None
+        if self.poll_interval > 0:
+            # Changes are detected, cached datasets can be kept longer
+            self.api.cache_timeout = self.poll_cache_timeout
+            self.index.ttl = max(self.metadata_ttl, self.poll_cache_timeout)
+            self.poller = ChangePoller(
+                self.api, interval=self.poll_interval,
+                listeners=[self._datasets_changed], logger=logger).start()
+        self.prefetcher = (Prefetcher(
+            self.api, max_workers=self.prefetch_workers,
+            max_bytes=self.prefetch_cache_bytes,
+            max_file_size=self.prefetch_max_file_size,
+            logger=logger) if self.prefetch else None)
+
+        self.warmer = (WarmUp(self.api, max_datasets=self.warm_up_datasets,
+                              on_dataset=self.index.put,
+                              logger=logger).start()
+                       if self.warm_up else None)
 
-        # Share token with datadotworld package
-        os.environ['DW_AUTH_TOKEN'] = token
+        self.workers = (NotebookWorkers(
+            max_workers=self.notebook_workers,
+            threshold=self.notebook_worker_threshold,
+            logger=logger) if self.notebook_workers > 0 else None)
 
+        if not self.tenant_mode:
+            # Share token with datadotworld package
+            os.environ['DW_AUTH_TOKEN'] = token
+
+    @traced('contents.dir_exists')
+    @with_deadline
     def dir_exists(self, path):
-        self.log.debug('[dir_exists] Checking {}'.format(path))
+        self.log.debug('[dir_exists] Checking %s', path)
         owner, dataset_id, dir_path = self._to_dw_path(path)
+        # Only worth it if listed already, otherwise a single request will do
+        catalog = self.api.cached_datasets()
         if dataset_id is None:
             if owner is None:
                 # Root always exists
                 return True
+            elif catalog is not None and owner in catalog.accounts:
+                return True
             else:
                 user = self.api.get_user(owner)
                 return user is not None
         else:
+            if (dir_path is None and catalog is not None and
+                    catalog.dataset(owner, dataset_id) is not None):
+                return True
             dataset = self.api.get_dataset(owner, dataset_id)
             if dataset is None:
                 return False
@@ -102,8 +415,10 @@ class DwContents(ContentsManager):
             else:
                 return True
 
+    @traced('contents.file_exists')
+    @with_deadline
     def file_exists(self, path=''):
-        self.log.debug('[file_exists] Checking {}'.format(path))
+        self.log.debug('[file_exists] Checking %s', path)
         owner, dataset_id, file_path = self._to_dw_path(path)
         if owner is None or dataset_id is None:
             return False
@@ -114,15 +429,21 @@ class DwContents(ContentsManager):
             else:
                 return self._get_file(dataset, file_path) is not None
 
+    @traced('contents.get')
+    @with_deadline
     def get(self, path, content=True, type=None, format=None):
-        self.log.debug('[get] Getting {}/{}/{}/{}'.format(
-            path, content, type, format))
+        self.log.debug('[get] Getting %s/%s/%s/%s',
+                       path, content, type, format)
 
         owner, dataset_id, file_path = self._to_dw_path(path)
+        if not content and file_path is not None:
+            model = self._get_metadata(owner, dataset_id, file_path, type)
+            if model is not None:
+                return model
+
         if type is None:
             type = guess_type(path, self.dir_exists)
-            self.log.debug('[guess_type] Guessed {} type for {}'.format(
-                type, path))
+            self.log.debug('[guess_type] Guessed %s type for %s', type, path)
 
         if type == 'directory':
             if not self.dir_exists(path):
@@ -136,13 +457,13 @@ class DwContents(ContentsManager):
             elif dataset_id is None:
                 # List account content
                 return self.mapper.map_account(
-                    owner,
-                    [d for d in self.api.get_datasets()
-                     if d['owner'] == owner],
+                    owner, self.api.get_datasets().account(owner),
                     include_content=content)
             else:
                 # List dataset content
                 dataset = self.api.get_dataset(owner, dataset_id)
+                if content and self.prefetcher is not None:
+                    self.prefetcher.schedule(dataset, file_path)
                 if file_path is not None:
                     dir_parent, dir_name = split_parent(file_path)
                     return self.mapper.map_subdir(
@@ -159,23 +480,53 @@ class DwContents(ContentsManager):
             if not self.file_exists(path):
                 http_404('File not found ({}).'.format(path))
 
+            dataset = self.api.get_dataset(owner, dataset_id)
+            file_obj = self._get_file(dataset, file_path)
+
+            preview = format == PREVIEW_FORMAT
+            if preview:
+                format = None
+            elif (type == 'file' and format is not None and
+                  self.preview_threshold > 0):
+                # Only editors ask for a format, not /files or copies
+                preview = (file_obj.get('sizeInBytes') or 0) > \
+                    self.preview_threshold
+            preview = preview and type == 'file'
+
+            def get_file(file_format):
+                if preview:
+                    return self._preview(owner, dataset_id, file_path,
+                                         file_format)
+                data = (self.prefetcher.take(owner, dataset_id, file_obj)
+                        if self.prefetcher is not None else None)
+                if data is not None:
+                    return decode_content(data, file_format)
+                return self.api.get_file(
+                    owner, dataset_id, file_path, file_format)
+
             content_func = None
+            validation = {}
+            missing = []
             if content:
                 if type == 'notebook':
                     def content_func():
-                        nb = self.api.get_file(
-                            owner, dataset_id, file_path, 'json')
+                        if (self.workers is not None and
+                                self.workers.handles(
+                                    file_obj.get('sizeInBytes'))):
+                            nb, validation['message'] = \
+                                self._decode_notebook(
+                                    owner, dataset_id, file_path, path,
+                                    missing)
+                            return nb
+                        nb = get_file('json')
+                        self._restore_outputs(owner, dataset_id, nb, missing)
                         self.mark_trusted_cells(nb, path)
                         return nb
                 else:
                     def content_func():
-                        return self.api.get_file(
-                            owner, dataset_id, file_path,
+                        return get_file(
                             guess_format(file_path, type)
                             if format is None else format)
-
-            dataset = self.api.get_dataset(owner, dataset_id)
-            file_obj = self._get_file(dataset, file_path)
             dir_parent, _ = split_parent(file_path)
 
             model = self.mapper.map_file(
@@ -184,14 +535,27 @@ class DwContents(ContentsManager):
                 content_format=format,
                 content_func=content_func)
 
+            if content and preview:
+                # Saving a preview would overwrite the rest of the file
+                model['truncated'] = True
+                model['writable'] = False
             if content and model['type'] == 'notebook':
-                self.validate_notebook_model(model)
+                if 'message' not in validation:
+                    self.validate_notebook_model(model)
+                elif validation['message'] is not None:
+                    model['message'] = validation['message']
+                if len(missing) > 0:
+                    msg = 'Unable to restore outputs saved in {}.'.format(
+                        ', '.join(sorted(set(missing))))
+                    model['message'] = ('{}\n{}'.format(model['message'], msg)
+                                        if model.get('message') else msg)
 
             return model
 
+    @traced('contents.rename_file')
+    @with_deadline
     def rename_file(self, old_path, new_path):
-        self.log.debug('[rename_file] Renaming {} to {}'.format(
-            old_path, new_path))
+        self.log.debug('[rename_file] Renaming %s to %s', old_path, new_path)
 
         if old_path == '':
             http_400('Cannot rename root.')
@@ -204,13 +568,8 @@ class DwContents(ContentsManager):
         if self.dir_exists(old_path):
             # This is an account, dataset/project or subdirectory
             if self.compatibility_mode:
-                dataset = self.api.get_dataset(owner, dataset_id)
-                for f in dataset.get('files', []):
-                    parent = directory_path(old_path)
-                    if f['name'].startswith(parent):
-                        self.rename_file(
-                            f['name'],
-                            normalize_path(new_path, f['name'][len(parent):]))
+                self._rename_directory(old_path, new_path)
+                return
             else:
                 http_400('Only files can be renamed.')
 
@@ -218,12 +577,54 @@ class DwContents(ContentsManager):
             http_400('Invalid path ({}). Files can only be created within '
                      'datasets or data projects.'.format(new_path))
 
-        old_file = self.get(old_path, content=True)
-        self.save(old_file, new_path)
-        self.delete_file(old_path)
+        old_owner, old_dataset_id, old_file_path = self._to_dw_path(old_path)
+        if (old_owner, old_dataset_id) == (owner, dataset_id):
+            # Copied as is, whatever its size
+            if not self.file_exists(old_path):
+                http_404('File not found ({}).'.format(old_path))
+            if self.prefetcher is not None:
+                self.prefetcher.discard(owner, dataset_id, file_path)
+            data = self.api.download_file(owner, dataset_id, old_file_path)
+            self.index.put(
+                self.api.upload_file(owner, dataset_id, file_path, data))
+        else:
+            old_file = self.get(old_path, content=True)
+            self.save(old_file, new_path)
+        # Not to leave both files behind, once copied
+        with deadline.suspended():
+            self.delete_file(old_path)
+
+    def _rename_directory(self, old_path, new_path):
+        old_owner, old_dataset_id, old_dir = self._to_dw_path(old_path)
+        owner, dataset_id, new_dir = self._to_dw_path(new_path)
+        if old_dir is None or new_dir is None:
+            http_400('Only files and subdirectories can be renamed.')
+
+        source_dataset = self.api.get_dataset(old_owner, old_dataset_id)
+        if (owner, dataset_id) == (old_owner, old_dataset_id):
+            target_dataset = source_dataset
+        else:
+            target_dataset = self.api.get_dataset(owner, dataset_id)
+        if source_dataset is None or target_dataset is None:
+            http_404('Dataset not found ({}).'.format(new_path))
+
+        moves = plan_rename(source_dataset, old_dir, new_dir,
+                            target_dataset=target_dataset)
+        deadline.check()
+        # Copies take as long as they take, sources must then be deleted
+        with deadline.suspended():
+            BatchRename(self.api,
+                        (old_owner, old_dataset_id), (owner, dataset_id),
+                        moves, source_dir=old_dir,
+                        max_workers=self.rename_workers,
+                        logger=self.log).execute()
+        self.index.invalidate(old_owner, old_dataset_id)
+        self.index.invalidate(owner, dataset_id)
 
+    @traced('contents.save')
+    @with_deadline
     def save(self, model, path):
-        self.log.debug('[save] Saving {} ({})'.format(path, model))
+        self.log.debug('[save] Saving %s (%s)', path, model)
         self.run_pre_save_hook(model, path)
 
         owner, dataset_id, file_path = self._to_dw_path(path)
@@ -233,6 +634,7 @@ class DwContents(ContentsManager):
                 self.api.upload_file(
                     owner, dataset_id,
                     normalize_path(file_path, 'dummy'), '')
+                self.index.invalidate(owner, dataset_id)
                 return self.mapper.map_subdir(
                     file_path, '', self.api.get_dataset(owner, dataset_id))
             else:
@@ -265,31 +667,97 @@ class DwContents(ContentsManager):
                 http_400('Invalid path ({}). Files can only be created '
                          'within datasets or data projects.'.format(path))
 
-            if model['type'] == 'notebook':
-                self.check_and_sign(to_nb_json(model['content']), path)
-                content = json.dumps(model['content']).encode('utf-8')
-            else:
-                model_format = model['format']
-                if model_format == 'base64':
-                    content = (base64
-                               .b64decode(model['content']
-                                          .encode('ascii')))
+            if model.get('truncated'):
+                http_400('Unable to save {}. Only a preview of it was '
+                         'opened.'.format(path))
+
+            chunk = model.get('chunk')
+            if chunk is not None:
+                return self._save_chunk(model, path, chunk)
+
+            with span('encode', type=model['type']) as encoding:
+                if model['type'] == 'notebook':
+                    # e.g. restored checkpoints of lean notebooks
+                    self._restore_outputs(owner, dataset_id,
+                                          model['content'])
+                    nb, sidecars = model['content'], {}
+                    if self.lean_notebooks:
+                        nb, sidecars = externalize(model['content'],
+                                                   self.lean_output_bytes)
+                    if (len(sidecars) == 0 and self.workers is not None and
+                            self.workers.handles(approx_size(nb))):
+                        content = self._encode_notebook(nb, path)
+                    else:
+                        self.check_and_sign(to_nb_json(model['content']),
+                                            path)
+                        content = json.dumps(nb).encode('utf-8')
                 else:
-                    content = model['content'].encode('utf-8')
+                    content = file_bytes(model)
+                encoding.set('bytes', len(content))
+
+            if model['type'] == 'notebook':
+                self._upload_sidecars(owner, dataset_id, sidecars)
+            return self._upload(model, path, content)
+
+    def _upload(self, model, path, content):
+        owner, dataset_id, file_path = self._to_dw_path(path)
+        if self.prefetcher is not None:
+            self.prefetcher.discard(owner, dataset_id, file_path)
+        updated_dataset = self.api.upload_file(
+            owner, dataset_id, file_path,
+            content)
+        self.index.put(updated_dataset)
+
+        file_dir, _ = split_parent(file_path)
+        saved_model = self.mapper.map_file(
+            self._get_file(updated_dataset, file_path),
+            file_dir, updated_dataset,
+            content_type=(model['type']),
+            content_format=model.get('format'))
+
+        if isinstance(content, bytes):
+            self._held.put(normalize_path(path), (
+                saved_model['last_modified'], model['type'],
+                'json' if model['type'] == 'notebook' else model['format'],
+                content))
+        else:
+            self._held.pop(normalize_path(path))
 
-            updated_dataset = self.api.upload_file(
-                owner, dataset_id, file_path,
-                content)
+        return saved_model
 
-            file_dir, _ = split_parent(file_path)
-            return self.mapper.map_file(
-                self._get_file(updated_dataset, file_path),
-                file_dir, updated_dataset,
-                content_type=(model['type']),
-                content_format=model.get('format'))
+    def _save_chunk(self, model, path, chunk):
+        if model['type'] != 'file':
+            http_400('File type "{}" is not supported for chunked '
+                     'uploads.'.format(model['type']))
 
+        received = self.uploads.append(normalize_path(path), chunk,
+                                       file_bytes(model))
+        if chunk != LAST_CHUNK:
+            now = datetime.datetime.utcnow().isoformat() + 'Z'
+            return create_model({
+                'type': 'file',
+                'name': split_parent(normalize_path(path))[1],
+                'path': normalize_path(path),
+                'writable': True,
+                'created': now,
+                'last_modified': now,
+                'size': received
+            })
+
+        staged = self.uploads.finish(normalize_path(path))
+        try:
+            self.log.debug('[save] Uploading %s bytes to %s', received, path)
+            # Large files can take longer than request_timeout to upload
+            with deadline.suspended():
+                return self._upload(model, path, staged)
+        finally:
+            staged.close()
+
+    @traced('contents.delete_file')
+    @with_deadline
     def delete_file(self, path):
-        self.log.debug('[delete_file] Deleting {}'.format(path))
+        self.log.debug('[delete_file] Deleting %s', path)
+        self._held.pop(normalize_path(path))
         if not self.exists(path):
             http_404('Not found ({}).'.format(path))
 
@@ -297,6 +765,7 @@ class DwContents(ContentsManager):
         if file_path is None:
             if dataset_id is not None:
                 self.api.delete_dataset(owner, dataset_id)
+                self.index.invalidate(owner, dataset_id)
                 return
 
             # This is an account
@@ -305,28 +774,272 @@ class DwContents(ContentsManager):
                      'can only be deleted via data.world\'s '
                      'website'.format(path))
 
-        if guess_type(path, self.dir_exists) != 'directory':
+        is_dir = guess_type(path, self.dir_exists) == 'directory'
+        if not is_dir:
+            if self.prefetcher is not None:
+                self.prefetcher.discard(owner, dataset_id, file_path)
             self.api.delete_file(owner, dataset_id, file_path)
         else:
             self.api.delete_subdirectory(owner, dataset_id, file_path)
+        self.index.remove_files(owner, dataset_id, file_path)
+
+    def open_stream(self, path, chunk_size=STREAM_CHUNK_SIZE):
+        """Iterate over the raw bytes of a file, one chunk at a time
+
+        Notebooks are reassembled first if their outputs were saved
+        separately, so that copies don't depend on this dataset.
+
+        :rtype: dwcontents.transfer.Chunks
+        """
+        owner, dataset_id, file_path = self._to_dw_path(path)
+        if file_path is None or not self.file_exists(path):
+            http_404('File not found ({}).'.format(path))
+        if file_path.endswith('.ipynb'):
+            data = self.api.download_file(owner, dataset_id, file_path)
+            if METADATA_KEY.encode('utf-8') in data:
+                nb = json.loads(data.decode('utf-8'))
+                if self._restore_outputs(owner, dataset_id, nb) > 0:
+                    data = json.dumps(nb).encode('utf-8')
+            return Chunks([data[i:i + chunk_size]
+                           for i in range(0, len(data), chunk_size)] or [b''],
+                          size=len(data))
+        file_obj = self._get_file(self.api.get_dataset(owner, dataset_id),
+                                  file_path)
+        return Chunks(self.api.stream_file(owner, dataset_id, file_path,
+                                           chunk_size=chunk_size),
+                      size=file_obj.get('sizeInBytes'))
+
+    def _datasets_changed(self, changed):
+        for owner, dataset_id in changed:
+            self.index.invalidate(owner, dataset_id)
+
+    def increment_filename(self, filename, path='', insert=''):
+        """Increment a filename until it is unique, checking candidates
+        against a single snapshot of the dataset"""
+        owner, dataset_id, dir_path = self._to_dw_path(path)
+        entry = (self._indexed_dataset(owner, dataset_id)
+                 if dataset_id is not None else None)
+        if entry is None:
+            return super(DwContents, self).increment_filename(
+                filename, path, insert=insert)
+
+        prefix = directory_path(dir_path)
+        taken = {name[len(prefix):].partition('/')[0]
+                 for name in entry.files if name.startswith(prefix)}
+        basename, dot, ext = filename.partition('.')
+        for i in itertools.count():
+            name = '{}{}{}'.format(
+                basename, '{}{}'.format(insert, i) if i else '', dot + ext)
+            if name not in taken:
+                return name
+
+    def _indexed_dataset(self, owner, dataset_id):
+        entry = self.index.get(owner, dataset_id)
+        if entry is None:
+            dataset = self.api.get_dataset(owner, dataset_id)
+            if dataset is None:
+                return None
+            entry = self.index.put(dataset)
+        return entry
+
+    def _get_metadata(self, owner, dataset_id, file_path, type):
+        """Model of a file or subdirectory without content, answered from
+        the dataset index (None if it can't be)"""
+        entry = self._indexed_dataset(owner, dataset_id)
+        if entry is None:
+            return None
+
+        if type is None:
+            type = guess_type(file_path, entry.is_dir)
+        dir_parent, name = split_parent(file_path)
+        if type == 'directory':
+            if entry.is_dir(file_path):
+                return self.mapper.map_subdir(
+                    name, dir_parent, entry.dataset, include_content=False)
+        else:
+            file_obj = entry.file(file_path)
+            if file_obj is not None:
+                return self.mapper.map_file(
+                    file_obj, dir_parent, entry.dataset, content_type=type)
+        return None
+
+    def _preview(self, owner, dataset_id, file_path, file_format):
+        data = self.api.get_file_head(owner, dataset_id, file_path,
+                                      self.preview_bytes)
+        if file_format == 'base64':
+            return base64.b64encode(data).decode('ascii')
+
+        # Cut at the last complete line, or character if there is none
+        end = data.rfind(b'\n')
+        if end >= 0:
+            data = data[:end + 1]
+        try:
+            return codecs.getincrementaldecoder('utf-8')().decode(data)
+        except UnicodeDecodeError:
+            raise HTTPError(400, log_message='Bad format', reason='Bad format')
+
+    def _decode_notebook(self, owner, dataset_id, file_path, path,
+                         missing=None):
+        data = self.api.download_file(owner, dataset_id, file_path)
+        try:
+            nb, message, signature = self.workers.decode(data, self.notary)
+        except UnicodeDecodeError:
+            raise HTTPError(400, log_message='Bad format', reason='Bad format')
+
+        if self._restore_outputs(owner, dataset_id, nb, missing) > 0:
+            # The signature is that of the complete notebook
+            self.mark_trusted_cells(nb, path)
+            return nb, message
+
+        store = getattr(self.notary, 'store', None)
+        if store is None:
+            self.mark_trusted_cells(nb, path)
+        else:
+            trusted = (signature is not None and
+                       store.check_signature(signature,
+                                             self.notary.algorithm))
+            if not trusted:
+                self.log.warning('Notebook %s is not trusted', path)
+            self.notary.mark_cells(nb, trusted)
+        return nb, message
+
+    def _encode_notebook(self, nb, path):
+        content, signature = self.workers.encode(nb, self.notary)
+
+        store = getattr(self.notary, 'store', None)
+        if store is None:
+            self.check_and_sign(to_nb_json(nb), path)
+        elif signature is not None:
+            store.store_signature(signature, self.notary.algorithm)
+        else:
+            self.log.warning('Notebook %s is not trusted', path)
+        return content
+
+    def _restore_outputs(self, owner, dataset_id, nb, missing=None):
+        def read(name):
+            key = (owner, dataset_id, name)
+            data = self._sidecars.get(key)
+            if data is None:
+                try:
+                    data = self.api.download_file(owner, dataset_id, name)
+                except HTTPError as e:
+                    if e.status_code != 404:
+                        raise
+                    self.log.warning('[lean] Missing output %s', name)
+                    return None
+                self._sidecars.put(key, data)
+            return data
+
+        with span('lean.restore') as restoring:
+            restored = restore(nb, read, missing)
+            restoring.set('outputs', restored)
+        return restored
+
+    def prune_sidecars(self, path, min_age=3600):
+        """Delete outputs saved separately that no notebook of the dataset
+        at path refers to anymore
+
+        Every notebook of the dataset is downloaded, so this is only done
+        when asked. Outputs updated less than ``min_age`` seconds ago are
+        kept, as notebooks being saved (e.g. by other servers) may not
+        refer to them yet.
+
+        :param min_age: Age in seconds of the newest outputs deleted
+        :type min_age: float
+        :returns: Number of outputs deleted
+        :rtype: int
+        """
+        owner, dataset_id, _ = self._to_dw_path(path)
+        dataset = (self.api.get_dataset(owner, dataset_id)
+                   if dataset_id is not None else None)
+        if dataset is None:
+            return 0
+        names = [f['name'] for f in dataset.get('files', [])]
+        newest = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=min_age)
+        sidecars = [f['name'] for f in dataset.get('files', [])
+                    if is_sidecar(f['name']) and
+                    _timestamp(f.get('updated')) <= newest]
+        if len(sidecars) == 0:
+            return 0
+
+        referenced = set()
+        for name in names:
+            if name.endswith('.ipynb') and not is_sidecar(name):
+                referenced.update(references(json.loads(
+                    self.api.download_file(owner, dataset_id,
+                                           name).decode('utf-8'))))
+        # Outputs just uploaded may belong to notebooks being saved
+        unused = [name for name in sidecars
+                  if name not in referenced and
+                  self._sidecars.get((owner, dataset_id, name)) is None]
+        if len(unused) > 0:
+            self.api.delete_files(owner, dataset_id, unused)
+            self.api.sync_dataset(owner, dataset_id)
+            self.index.invalidate(owner, dataset_id)
+        self.log.debug('[lean] Deleted %s unused outputs', len(unused))
+        return len(unused)
+
+    def _upload_sidecars(self, owner, dataset_id, sidecars):
+        if len(sidecars) == 0:
+            return
+        dataset = self.api.get_dataset(owner, dataset_id)
+        missing = [(name, data) for name, data in sidecars.items()
+                   if self._get_file(dataset, name) is None]
+        self.api.put_files(owner, dataset_id, missing)
+        for name, data in sidecars.items():
+            self._sidecars.put((owner, dataset_id, name), data)
+        self.log.debug('[save] Uploaded %s of %s outputs', len(missing),
+                       len(sidecars))
+
+    def held_content(self, path):
+        """Return the last content saved to path by this manager, if current
+
+        :returns: A ``(type, format, bytes)`` triple or None
+        """
+        path = normalize_path(path)
+        held = self._held.get(path)
+        if held is None:
+            return None
+
+        last_modified, content_type, content_format, data = held
+        try:
+            current = self.get(path, content=False)
+        except HTTPError:
+            current = None
+        if current is None or current['last_modified'] != last_modified:
+            self._held.pop(path)
+            return None
+
+        return content_type, content_format, data
+
+    def is_movable(self, path):
+        """Whether path can be moved to another manager (see HybridContents)
+
+        Accounts and datasets can't, since moving them would delete them.
+        """
+        owner, dataset_id, file_path = self._to_dw_path(path)
+        return file_path is not None
 
     def is_hidden(self, path):
-        self.log.debug('[is_hidden] Checking {}'.format(path))
-        return False  # Nothing is hidden
+        self.log.debug('[is_hidden] Checking %s', path)
+        # Only outputs of lean notebooks are hidden
+        _, _, file_path = self._to_dw_path(path)
+        return file_path is not None and is_sidecar(file_path)
 
     # noinspection PyMethodMayBeStatic
     def _checkpoints_class_default(self):
-        return GenericFileCheckpoints
+        return DwCheckpoints
 
-    # noinspection PyMethodMayBeStatic
     def _checkpoints_kwargs_default(self):
         kw = {
-            'root_dir': tempfile.gettempdir()
+            'parent': self,
+            'log': self.log
         }
         return kw
 
     def _to_dw_path(self, path):
-        self.log.debug('[_to_dw_path] p:{} r:{}'.format(path, self.root_dir))
+        self.log.debug('[_to_dw_path] p:%s r:%s', path, self.root_dir)
         return to_dw_path(path, self.root_dir)
 
     @staticmethod
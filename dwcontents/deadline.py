@@ -0,0 +1,124 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import threading
+import time
+from builtins import str
+from contextlib import contextmanager
+from functools import wraps
+
+str('Use str() once to force PyCharm to keep import')
+
+_local = threading.local()
+
+
+def _now():
+    return getattr(time, 'monotonic', time.time)()
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline(object):
+    """Time budget for everything done by the current thread within it
+
+    Deadlines can be nested, in which case the earliest one applies.
+    A budget of ``None`` or ``0`` means no deadline.
+    """
+
+    def __init__(self, seconds):
+        self.expires = _now() + seconds if seconds else None
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = getattr(_local, 'deadline', None)
+        if (self._outer is not None and self._outer.expires is not None and
+                (self.expires is None or self._outer.expires < self.expires)):
+            self.expires = self._outer.expires
+        _local.deadline = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.deadline = self._outer
+        return False
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - _now())
+
+
+@contextmanager
+def suspended():
+    """Run without a deadline, e.g. to transfer files of any size"""
+    outer = getattr(_local, 'deadline', None)
+    _local.deadline = None
+    try:
+        yield
+    finally:
+        _local.deadline = outer
+
+
+def remaining():
+    """Seconds left before the current deadline, or None if there is none"""
+    deadline = getattr(_local, 'deadline', None)
+    return deadline.remaining() if deadline is not None else None
+
+
+def check(what='data.world'):
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded('Timed out waiting for {}'.format(what))
+
+
+def fits(seconds):
+    """Whether waiting for a number of seconds fits the current deadline"""
+    left = remaining()
+    return left is None or seconds < left
+
+
+def timeout(default):
+    """Socket timeout for a request, capped by the current deadline
+
+    :param default: Timeout to use, as a number or ``(connect, read)`` tuple
+    :type default: float or tuple
+    :returns: Timeout in the same form, none of its values exceeding the
+        time left
+    """
+    check()
+    left = remaining()
+    if left is None:
+        return default
+    if isinstance(default, tuple):
+        return tuple(min(t, left) if t is not None else left
+                     for t in default)
+    return min(default, left) if default is not None else left
+
+
+def with_deadline(fn):
+    """Run a contents manager method within ``self.request_timeout``"""
+    @wraps(fn)
+    def decorated(self, *args, **kwargs):
+        with Deadline(self.request_timeout):
+            return fn(self, *args, **kwargs)
+
+    return decorated
@@ -0,0 +1,151 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import mimetypes
+from builtins import str
+from concurrent.futures import ThreadPoolExecutor
+
+from notebook.base.handlers import IPythonHandler, path_regex
+from notebook.services.contents.handlers import ContentsHandler, \
+    default_handlers
+from notebook.utils import url_path_join
+from tornado import gen, web
+
+from dwcontents.api import STREAM_CHUNK_SIZE
+from dwcontents.transfer import read_chunks
+
+str('Use str() once to force PyCharm to keep import')
+
+
+def content_type(name):
+    if name.endswith('.ipynb'):
+        return 'application/x-ipynb+json'
+    mimetype = mimetypes.guess_type(name)[0]
+    if mimetype is None:
+        return 'application/octet-stream'
+    elif mimetype.startswith('text/'):
+        return '{}; charset=UTF-8'.format(mimetype)
+    return mimetype
+
+
+class StreamingDownloadHandler(IPythonHandler):
+    """Serves the raw bytes of files, one chunk at a time
+
+    Unlike ``/files``, content isn't loaded into a base64 encoded model
+    first, so memory use doesn't grow with the size of the file. Chunks
+    are read on a thread pool, through the user's contents manager.
+    """
+    executor = ThreadPoolExecutor(max_workers=8)
+
+    @property
+    def content_security_policy(self):
+        # Same as /files: confine scripts of served HTML/SVG files
+        return super(StreamingDownloadHandler,
+                     self).content_security_policy + '; sandbox allow-scripts'
+
+    @web.authenticated
+    @gen.coroutine
+    def get(self, path):
+        self.check_xsrf_cookie()
+        cm = self.contents_manager
+        path = path.strip('/')
+        if cm.is_hidden(path) and not cm.allow_hidden:
+            raise web.HTTPError(404)
+
+        model = yield self.executor.submit(cm.get, path, content=False,
+                                           type='file')
+        if self.get_argument('download', False):
+            self.set_attachment_header(model['name'])
+        self.set_header('Content-Type', content_type(model['name']))
+
+        chunks = yield self.executor.submit(read_chunks, cm, path,
+                                            chunk_size=STREAM_CHUNK_SIZE)
+        # Not the model's size, e.g. notebooks may be reassembled
+        if getattr(chunks, 'size', None) is not None:
+            self.set_header('Content-Length', chunks.size)
+        try:
+            while True:
+                chunk = yield self.executor.submit(next, chunks, None)
+                if chunk is None:
+                    break
+                self.write(chunk)
+                yield self.flush()
+        finally:
+            chunks.close()
+
+
+class OffLoopContents(object):
+    """Contents manager running the operations of ``ContentsHandler`` on
+    an executor
+
+    :param cm: Contents manager
+    :type cm: notebook.services.contents.manager.ContentsManager
+    :param executor: Executor running the operations
+    :type executor: concurrent.futures.Executor
+    """
+    OPERATIONS = {'get', 'save', 'update', 'copy', 'new', 'new_untitled',
+                  'delete', 'file_exists'}
+
+    def __init__(self, cm, executor):
+        self._cm = cm
+        self._executor = executor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cm, name)
+        if name not in OffLoopContents.OPERATIONS:
+            return attr
+
+        def submit(*args, **kwargs):
+            return self._executor.submit(attr, *args, **kwargs)
+
+        return submit
+
+
+class ThreadedContentsHandler(ContentsHandler):
+    """Same as ``ContentsHandler``, calling the contents manager on a
+    thread pool
+
+    Operations on data.world wait for the network, and large notebooks
+    take a while to decode and encode, neither of which should hold up
+    the IO loop (and other users). Off the loop, notebooks can also be
+    handled by ``DwContents.notebook_workers``.
+    """
+    executor = ThreadPoolExecutor(max_workers=8)
+
+    @property
+    def contents_manager(self):
+        return OffLoopContents(
+            super(ThreadedContentsHandler, self).contents_manager,
+            self.executor)
+
+
+def load_jupyter_server_extension(nb_server_app):
+    """Serves files from ``/file_download/<path>`` and handles contents
+    requests off the IO loop"""
+    web_app = nb_server_app.web_app
+    base_url = web_app.settings['base_url']
+    route = url_path_join(base_url, r'/file_download{}'.format(path_regex))
+    # Handlers of extensions take precedence over Jupyter's own
+    web_app.add_handlers('.*$', [(route, StreamingDownloadHandler)] + [
+        (url_path_join(base_url, pattern),
+         ThreadedContentsHandler if handler is ContentsHandler else handler)
+        for pattern, handler in default_handlers])
+    nb_server_app.log.info('[dwcontents] Streaming downloads from %s',
+                           route)
@@ -22,14 +22,19 @@ Multi-backend ContentsManager.
 """
 from __future__ import unicode_literals
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import partial
 
 from notebook.services.contents.manager import ContentsManager
 from six import iteritems
 from tornado.web import HTTPError
-from traitlets import Dict
+from traitlets import Dict, Float, Integer
 
 from dwcontents.models import create_model
+from dwcontents.transfer import CrossManagerMove, read_chunks, \
+    CHUNK_SIZE, MAX_UNCHUNKED_BYTES
 from dwcontents.utils import normalize_path
 
 DUMMY_CREATED_DATE = datetime.fromtimestamp(0)
@@ -45,30 +50,89 @@ def base_directory_model(path):
     })
 
 
-def _resolve_path(path, manager_dict):
+class ManagerTrie(object):
     """
-    Resolve a path based on a dictionary of manager prefixes.
+    Prefix trie over manager mount points.
 
-    Returns a triple of (prefix, manager, manager_relative_path).
+    Mount points may span multiple path segments (e.g. ``a/b``). Resolved
+    paths are memoized, up to ``cache_size`` distinct paths.
     """
-    path = normalize_path(path)
-    parts = path.split('/')
-
-    # Try to find a sub-manager for the first subdirectory.
-    mgr = manager_dict.get(parts[0])
-    if mgr is not None:
-        return parts[0], mgr, '/'.join(parts[1:])
-
-    # Try to find use the root manager, if one was supplied.
-    mgr = manager_dict.get('')
-    if mgr is not None:
-        return '', mgr, path
-
-    raise HTTPError(
-        404,
-        'Couldn\'t resolve path [{path}] and '
-        'no root manager supplied!'.format(path=path)
-    )
+
+    def __init__(self, managers, cache_size=4096):
+        self._root = _TrieNode()
+        for key, mgr in iteritems(managers):
+            node = self._root
+            key = normalize_path(key)
+            for segment in (key.split('/') if key else []):
+                node = node.children.setdefault(segment, _TrieNode())
+            node.manager = mgr
+            node.prefix = key
+        self._cache = {}
+        self._cache_size = cache_size
+
+    def resolve(self, path):
+        """
+        Resolve a path to the manager mounted at its longest prefix.
+
+        Returns a triple of (prefix, manager, manager_relative_path).
+        """
+        resolved = self._lookup(path)
+        if resolved.manager is None:
+            raise HTTPError(
+                404,
+                'Couldn\'t resolve path [{path}] and '
+                'no root manager supplied!'.format(path=path)
+            )
+        return resolved.prefix, resolved.manager, resolved.manager_path
+
+    def children(self, path):
+        """
+        Names of mount points, or directories leading to them, directly
+        under path.
+        """
+        return self._lookup(path).children
+
+    def _lookup(self, path):
+        try:
+            return self._cache[path]
+        except KeyError:
+            pass
+
+        resolved = self._resolve(path)
+        if len(self._cache) >= self._cache_size:
+            self._cache.clear()
+        self._cache[path] = resolved
+        return resolved
+
+    def _resolve(self, path):
+        path = normalize_path(path)
+        segments = path.split('/') if path else []
+
+        node = self._root
+        match, depth = node, 0
+        for i, segment in enumerate(segments):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.manager is not None:
+                match, depth = node, i + 1
+
+        return _Resolution(
+            match.prefix, match.manager, '/'.join(segments[depth:]),
+            sorted(node.children) if node is not None else [])
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'manager', 'prefix')
+
+    def __init__(self):
+        self.children = {}
+        self.manager = None
+        self.prefix = ''
+
+
+_Resolution = namedtuple(
+    '_Resolution', ['prefix', 'manager', 'manager_path', 'children'])
 
 
 def _get_arg(argname, args, kwargs):
@@ -78,14 +142,11 @@ def _get_arg(argname, args, kwargs):
 
     Mutates kwargs in place if the value is found in kwargs.
     """
-    try:
+    if argname in kwargs:
         return kwargs.pop(argname), args
-    except KeyError:
-        pass
-    try:
+    if args:
         return args[0], args[1:]
-    except IndexError:
-        raise TypeError('No value passed for %s' % argname)
+    raise TypeError('No value passed for %s' % argname)
 
 
 def _apply_prefix(prefix, model):
@@ -97,19 +158,23 @@ def _apply_prefix(prefix, model):
 
     # We get unwanted leading/trailing slashes if prefix or model['path'] are
     # '', both of which are legal values.
-    model['path'] = '/'.join((prefix, model['path'])).strip('/')
-    if model['type'] in ('notebook', 'file'):
-        return model
+    prefix = prefix.strip('/')
+    _prefix_models('{}/'.format(prefix) if prefix else '', prefix, [model])
+    return model
 
-    if model['type'] != 'directory':
-        raise ValueError('Unknown model type %s.' % type(model))
 
-    content = model.get('content', None)
-    if content is not None:
-        for sub_model in content:
-            _apply_prefix(prefix, sub_model)
+def _prefix_models(head, prefix, models):
+    for model in models:
+        path = model['path'].strip('/')
+        model['path'] = head + path if path else prefix
 
-    return model
+        model_type = model['type']
+        if model_type == 'directory':
+            content = model.get('content', None)
+            if content is not None:
+                _prefix_models(head, prefix, content)
+        elif model_type != 'notebook' and model_type != 'file':
+            raise ValueError('Unknown model type %s.' % type(model))
 
 
 # Dispatch decorators.
@@ -120,7 +185,7 @@ def path_dispatch1(mname, returns_model):
 
     def _wrapper(self, *args, **kwargs):
         path, args = _get_arg('path', args, kwargs)
-        prefix, mgr, mgr_path = _resolve_path(path, self.managers)
+        prefix, mgr, mgr_path = self.manager_trie.resolve(path)
         result = getattr(mgr, mname)(mgr_path, *args, **kwargs)
         if returns_model and prefix:
             return _apply_prefix(prefix, result)
@@ -138,7 +203,7 @@ def path_dispatch2(mname, first_argname, returns_model):
     def _wrapper(self, *args, **kwargs):
         other, args = _get_arg(first_argname, args, kwargs)
         path, args = _get_arg('path', args, kwargs)
-        prefix, mgr, mgr_path = _resolve_path(path, self.managers)
+        prefix, mgr, mgr_path = self.manager_trie.resolve(path)
         result = getattr(mgr, mname)(other, mgr_path, *args, **kwargs)
         if returns_model and prefix:
             return _apply_prefix(prefix, result)
@@ -155,7 +220,7 @@ def path_dispatch_kwarg(mname, path_default, returns_model):
     """
 
     def _wrapper(self, path=path_default, **kwargs):
-        prefix, mgr, mgr_path = _resolve_path(path, self.managers)
+        prefix, mgr, mgr_path = self.manager_trie.resolve(path)
         result = getattr(mgr, mname)(path=mgr_path, **kwargs)
         if returns_model and prefix:
             return _apply_prefix(prefix, result)
@@ -171,21 +236,30 @@ def path_dispatch_old_new(mname, returns_model):
     """
 
     def _wrapper(self, old_path, new_path, *args, **kwargs):
-        old_prefix, old_mgr, old_mgr_path = _resolve_path(
-            old_path, self.managers
+        old_prefix, old_mgr, old_mgr_path = self.manager_trie.resolve(
+            old_path
         )
-        new_prefix, new_mgr, new_mgr_path = _resolve_path(
-            new_path, self.managers,
+        new_prefix, new_mgr, new_mgr_path = self.manager_trie.resolve(
+            new_path
         )
         if old_mgr is not new_mgr:
-            # TODO: Consider supporting this via get+delete+save.
-            raise HTTPError(
-                400,
-                reason='Can\'t move files between backends '
-                       '({old} -> {new})'.format(
-                        old=old_path,
-                        new=new_path)
-            )
+            if mname != 'rename':
+                raise HTTPError(
+                    400,
+                    reason='Can\'t {method} files between backends '
+                           '({old} -> {new})'.format(
+                            method=mname,
+                            old=old_path,
+                            new=new_path)
+                )
+            CrossManagerMove(
+                old_mgr, old_mgr_path, new_mgr, new_mgr_path,
+                max_workers=self.move_workers,
+                chunk_size=self.move_chunk_size,
+                max_bytes=self.move_max_unchunked_bytes,
+                logger=self.log
+            ).execute()
+            return None
         assert new_prefix == old_prefix
         result = getattr(new_mgr, mname)(
             old_mgr_path,
@@ -220,6 +294,40 @@ class HybridContents(ContentsManager):
 
     managers = Dict(help='Dict mapping root dir -> ContentsManager.')
 
+    manager_timeout = Float(
+        10.0,
+        config=True,
+        help='Seconds to wait for each manager when listing directories '
+             'that contain mount points.'
+    )
+
+    fan_out_workers = Integer(
+        8,
+        config=True,
+        help='Maximum number of managers queried concurrently.'
+    )
+
+    move_workers = Integer(
+        4,
+        config=True,
+        help='Maximum number of files copied concurrently when moving '
+             'directories between managers.'
+    )
+
+    move_chunk_size = Integer(
+        8 * 1024 * 1024,
+        config=True,
+        help='Number of bytes read at once when moving files between '
+             'managers.'
+    )
+
+    move_max_unchunked_bytes = Integer(
+        MAX_UNCHUNKED_BYTES,
+        config=True,
+        help='Maximum size of files moved to managers that only save whole '
+             'files, which are held in memory.'
+    )
+
     def _managers_default(self):
         return {
             key: mgr_cls(
@@ -234,63 +342,160 @@ class HybridContents(ContentsManager):
         """
         Strip slashes from directories before updating.
         """
-        for key in new:
-            if '/' in key:
-                raise ValueError(
-                    'Expected directory names w/o slashes.  Got [%s]' % key
-                )
-            self.managers = {k.strip('/'): v for k, v in new.items()}
+        normalized = {normalize_path(k): v for k, v in new.items()}
+        if set(normalized) != set(new):
+            self.managers = normalized
+        else:
+            self._manager_trie = None
+
+    @property
+    def manager_trie(self):
+        trie = getattr(self, '_manager_trie', None)
+        if trie is None:
+            trie = self._manager_trie = ManagerTrie(self.managers)
+        return trie
 
     @property
     def root_manager(self):
         return self.managers.get('')
 
-    def _extra_root_dirs(self):
+    @property
+    def executor(self):
+        executor = getattr(self, '_executor', None)
+        if executor is None:
+            executor = self._executor = ThreadPoolExecutor(
+                max_workers=self.fan_out_workers)
+        return executor
+
+    def _fan_out(self, primary, calls):
+        """
+        Call primary while running calls concurrently, waiting at most
+        ``manager_timeout`` seconds for the latter.
+
+        Returns primary's result, whose errors propagate, followed by each
+        call's result, or None for calls that failed or timed out.
+        """
+        futures = [self.executor.submit(call) for call in calls]
+        try:
+            results = [primary()]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        done, _ = wait(futures, timeout=self.manager_timeout)
+        for future in futures:
+            if future not in done:
+                self.log.warning('Timed out waiting for contents manager')
+                results.append(None)
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                self.log.warning('Contents manager failed: %s', e)
+                results.append(None)
+        return results
+
+    def _extra_dirs(self, path):
+        """
+        Names and paths of mount points directly under path.
+        """
         return [
-            base_directory_model(path)
-            for path in self.managers
-            if path
+            (name, normalize_path(path, name))
+            for name in self.manager_trie.children(path)
         ]
 
+    def _mount_model(self, mount_path, mgr_model):
+        """
+        Model for a mount point, using its manager's root model, if available.
+        """
+        model = base_directory_model(mount_path)
+        if mgr_model is not None:
+            for key in ('created', 'last_modified', 'writable'):
+                if key in mgr_model:
+                    model[key] = mgr_model[key]
+        return model
+
+    def _get_mount_root(self, mount_path):
+        prefix, mgr, mgr_path = self.manager_trie.resolve(mount_path)
+        if prefix != mount_path:
+            # Directory leading to a deeper mount point
+            return None
+        return mgr.get('', content=False)
+
     is_hidden = path_dispatch1('is_hidden', False)
-    dir_exists = path_dispatch1('dir_exists', False)
     file_exists = path_dispatch_kwarg('file_exists', '', False)
-    exists = path_dispatch1('exists', False)
+
+    __dir_exists = path_dispatch1('dir_exists', False)
+    __exists = path_dispatch1('exists', False)
 
     save = path_dispatch2('save', 'model', True)
+    increment_filename = path_dispatch2('increment_filename', 'filename',
+                                        False)
     rename = path_dispatch_old_new('rename', False)
 
     __get = path_dispatch1('get', True)
     __delete = path_dispatch1('delete', False)
 
+    def dir_exists(self, path):
+        """
+        Directories leading to mount points always exist.
+        """
+        if self.manager_trie.children(path):
+            return True
+        return self.__dir_exists(path)
+
+    def exists(self, path):
+        if self.manager_trie.children(path):
+            return True
+        return self.__exists(path)
+
     def get(self, path, content=True, type=None, format=None):
         """
-        Special case handling for listing root dir.
+        Special case handling for listing directories containing mount
+        points (e.g. the root dir).
+
+        The manager for the directory itself and the managers mounted
+        under it are queried concurrently.
         """
         path = normalize_path(path)
-        if path:
+        extra_dirs = self._extra_dirs(path)
+        if not extra_dirs:
             return self.__get(path, content=content, type=type, format=format)
         if not content:
-            return base_directory_model('')
-
-        extra_content = self._extra_root_dirs()
-        rm = self.root_manager
-        if rm is None:
-            root_model = base_directory_model('')
-            root_model.update(
-                format='json',
-                content=extra_content,
-            )
-        else:
-            root_model = rm.get(
-                path,
+            return base_directory_model(path)
+
+        def get_dir():
+            try:
+                prefix, mgr, mgr_path = self.manager_trie.resolve(path)
+            except HTTPError:
+                return None
+            if mgr_path and not mgr.dir_exists(mgr_path):
+                return None
+            dir_model = mgr.get(
+                mgr_path,
                 content=content,
                 type=type,
                 format=format,
             )
-            # Append the extra directories.
-            root_model['content'].extend(extra_content)
-        return root_model
+            return _apply_prefix(prefix, dir_model) if prefix else dir_model
+
+        results = self._fan_out(
+            get_dir,
+            [partial(self._get_mount_root, mount_path)
+             for _, mount_path in extra_dirs])
+
+        dir_model = results[0]
+        if dir_model is None:
+            dir_model = base_directory_model(path)
+            dir_model.update(
+                format='json',
+                content=[],
+            )
+        # Append the extra directories.
+        dir_model['content'].extend(
+            self._mount_model(mount_path, mgr_model)
+            for (_, mount_path), mgr_model in zip(extra_dirs, results[1:]))
+        return dir_model
 
     def delete(self, path):
         """
@@ -299,12 +504,17 @@ class HybridContents(ContentsManager):
         implementations might override this behavior.
         """
         path = normalize_path(path)
-        if path in self.managers:
+        if path in self.managers or self.manager_trie.children(path):
             raise HTTPError(
-                400, 'Can\'t delete root of %s' % self.managers[path]
+                400, 'Can\'t delete root of %s' % self.managers.get(path)
             )
         return self.__delete(path)
 
+    def open_stream(self, path, chunk_size=CHUNK_SIZE):
+        """Iterate over the raw bytes of a file, one chunk at a time"""
+        _, mgr, mgr_path = self.manager_trie.resolve(normalize_path(path))
+        return read_chunks(mgr, mgr_path, chunk_size=chunk_size)
+
     create_checkpoint = path_dispatch1('create_checkpoint', False)
     list_checkpoints = path_dispatch1('list_checkpoints', False)
     restore_checkpoint = path_dispatch2(
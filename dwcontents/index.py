@@ -0,0 +1,106 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import time
+from builtins import str
+
+from dwcontents.utils import LRUCache, directory_path, split_parent
+
+str('Use str() once to force PyCharm to keep import')
+
+
+class IndexedDataset(object):
+    __slots__ = ['dataset', 'files', 'dirs', 'loaded']
+
+    def __init__(self, dataset, loaded):
+        """Snapshot of a dataset, with its files indexed by name
+
+        :param dataset: Dataset, as returned by the API
+        :type dataset: dict
+        :param loaded: Time the snapshot was taken
+        :type loaded: float
+        """
+        self.dataset = dataset
+        self.files = {f['name']: f for f in dataset.get('files', [])}
+        self.dirs = set()
+        for name in self.files:
+            parent, _ = split_parent(name)
+            while parent != '' and parent not in self.dirs:
+                self.dirs.add(parent)
+                parent, _ = split_parent(parent)
+        self.loaded = loaded
+
+    def file(self, name):
+        return self.files.get(name)
+
+    def is_dir(self, name):
+        return directory_path(name) in self.dirs
+
+
+class DatasetIndex(object):
+    """Recent dataset snapshots, for answering metadata requests locally
+
+    Snapshots expire after ``ttl`` seconds and are patched, rather than
+    discarded, when files are changed through this process.
+
+    :param ttl: Number of seconds a snapshot remains valid
+    :type ttl: float
+    :param max_datasets: Maximum number of datasets kept
+    :type max_datasets: int
+    """
+
+    def __init__(self, ttl=30, max_datasets=256):
+        self.ttl = ttl
+        self._entries = LRUCache(max_items=max_datasets,
+                                 sizeof=lambda entry: len(entry.files))
+
+    def get(self, owner, dataset_id):
+        """Current snapshot of a dataset, or None if unknown or expired
+
+        :rtype: IndexedDataset
+        """
+        entry = self._entries.get((owner, dataset_id))
+        if entry is None or time.time() - entry.loaded > self.ttl:
+            return None
+        return entry
+
+    def put(self, dataset, loaded=None):
+        entry = IndexedDataset(
+            dataset, loaded if loaded is not None else time.time())
+        self._entries.put((dataset['owner'], dataset['id']), entry)
+        return entry
+
+    def remove_files(self, owner, dataset_id, name):
+        """Forget a file, or all files under a directory"""
+        entry = self._entries.get((owner, dataset_id))
+        if entry is None:
+            return
+        prefix = directory_path(name)
+        dataset = dict(entry.dataset)
+        dataset['files'] = [f for f in entry.dataset.get('files', [])
+                            if f['name'] != name and
+                            not f['name'].startswith(prefix)]
+        self.put(dataset, loaded=entry.loaded)
+
+    def invalidate(self, owner=None, dataset_id=None):
+        if owner is None:
+            self._entries.clear()
+        else:
+            self._entries.pop((owner, dataset_id))
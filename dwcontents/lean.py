@@ -0,0 +1,153 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import hashlib
+from builtins import str
+
+str('Use str() once to force PyCharm to keep import')
+
+# Directory of the dataset where large outputs are saved
+SIDECAR_DIR = '.ipynb_outputs'
+METADATA_KEY = 'dwcontents'
+
+
+def sidecar_name(digest):
+    return '{}/{}'.format(SIDECAR_DIR, digest)
+
+
+def is_sidecar(name):
+    return name == SIDECAR_DIR or name.startswith(SIDECAR_DIR + '/')
+
+
+def references(nb):
+    """Names of the sidecar files a notebook's outputs refer to"""
+    return {sidecar_name(digest)
+            for refs in _references(nb)
+            for digest in refs['sidecars'].values()}
+
+
+def externalize(nb, min_bytes):
+    """Move large outputs of a notebook to sidecar files
+
+    Output data of at least ``min_bytes`` is replaced by an empty string
+    and the name of its sidecar, named after a hash of its content, is
+    recorded in the output's metadata. The notebook itself is not modified.
+
+    :param nb: Notebook
+    :type nb: dict
+    :param min_bytes: Size of the smallest output data moved to a sidecar
+    :type min_bytes: int
+    :returns: ``(lean notebook, {sidecar name: bytes})``
+    :rtype: tuple
+    """
+    sidecars = {}
+    cells = []
+    for cell in nb.get('cells', []):
+        outputs = cell.get('outputs')
+        if outputs:
+            lean_outputs = [_externalize_output(o, min_bytes, sidecars)
+                            for o in outputs]
+            if any(lean is not o for lean, o in zip(lean_outputs, outputs)):
+                cell = dict(cell, outputs=lean_outputs)
+        cells.append(cell)
+
+    if len(sidecars) == 0:
+        return nb, sidecars
+    return dict(nb, cells=cells), sidecars
+
+
+def restore(nb, read, missing=None):
+    """Put back outputs moved to sidecar files, in place
+
+    Outputs whose sidecars are missing are left as they are, references
+    included.
+
+    :param nb: Notebook
+    :type nb: dict
+    :param read: Function returning the bytes of a sidecar, given its name,
+        or None if it is missing
+    :type read: callable
+    :param missing: List the names of missing sidecars are appended to
+    :type missing: list
+    :returns: Number of output data restored
+    :rtype: int
+    """
+    restored = 0
+    for output in _outputs(nb):
+        refs = output.get('metadata', {}).get(METADATA_KEY)
+        if not _is_reference(refs):
+            continue
+        found = {}
+        for mimetype, digest in refs['sidecars'].items():
+            data = read(sidecar_name(digest))
+            if data is None:
+                if missing is not None:
+                    missing.append(sidecar_name(digest))
+            else:
+                found[mimetype] = data.decode('utf-8')
+        if len(found) < len(refs['sidecars']):
+            continue
+        output['data'].update(found)
+        restored += len(found)
+        del output['metadata'][METADATA_KEY]
+    return restored
+
+
+def _outputs(nb):
+    for cell in nb.get('cells', []):
+        for output in cell.get('outputs', []):
+            yield output
+
+
+def _is_reference(refs):
+    return isinstance(refs, dict) and 'sidecars' in refs
+
+
+def _references(nb):
+    for output in _outputs(nb):
+        refs = output.get('metadata', {}).get(METADATA_KEY)
+        if _is_reference(refs):
+            yield refs
+
+
+def _externalize_output(output, min_bytes, sidecars):
+    data = output.get('data')
+    if not data:
+        return output
+
+    refs = {}
+    lean_data = dict(data)
+    for mimetype, value in data.items():
+        if isinstance(value, list) and all(isinstance(v, str)
+                                           for v in value):
+            value = ''.join(value)
+        if not isinstance(value, str) or len(value) < min_bytes:
+            continue
+        raw = value.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        sidecars[sidecar_name(digest)] = raw
+        refs[mimetype] = digest
+        lean_data[mimetype] = ''
+
+    if len(refs) == 0:
+        return output
+    metadata = dict(output.get('metadata', {}))
+    metadata[METADATA_KEY] = {'sidecars': refs}
+    return dict(output, data=lean_data, metadata=metadata)
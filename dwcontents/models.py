@@ -21,9 +21,12 @@ from __future__ import unicode_literals
 import logging
 from builtins import str
 from functools import reduce
-from itertools import groupby
 
-from dwcontents.utils import to_api_path, relative_path, normalize_path
+from dwcontents.catalog import Catalog
+from dwcontents.lean import is_sidecar
+from dwcontents.tracing import span
+from dwcontents.utils import to_api_path, relative_path, normalize_path, \
+    directory_path, PATH_CACHE_SIZE
 
 str('Use str() once to force PyCharm to keep import')
 
@@ -82,19 +85,20 @@ def reduce_dates(entities):
 
 
 def valid_file(file):
-    return {'created', 'updated'}.issubset(set(file.keys()))
+    return 'created' in file and 'updated' in file
 
 
 class DwMapper(object):
     def __init__(self, prefix='', root_dir='', logger=None):
         self.root_dir = normalize_path(root_dir)
         self.prefix = normalize_path(prefix)
+        self._dataset_paths = {}
         self.log = (logger
                     if logger is not None else logging.getLogger('dwcontents'))
 
     def map_root(self, me, datasets=None, include_content=False):
-        self.log.debug('[map_root] me:{} d(count):{} c:{}'.format(
-            me['id'], len(datasets), include_content))
+        self.log.debug('[map_root] me:%s d(count):%s c:%s',
+                       me['id'], len(datasets), include_content)
         root_model = create_model({
             'type': 'directory',
             'name': '',
@@ -113,26 +117,17 @@ class DwMapper(object):
         return root_model
 
     def map_accounts(self, datasets):
-        self.log.debug('[map_accounts] d(count):{}'.format(len(datasets)))
-        sorted_datasets = sorted(datasets, key=lambda d: d['owner'])
-        accounts = groupby(sorted_datasets, lambda d: d['owner'])
-        content = [self.map_account(a, datasets=list(ds))
-                   for a, ds in accounts]
-
-        return content
+        self.log.debug('[map_accounts] d(count):%s', len(datasets))
+        catalog = (datasets if isinstance(datasets, Catalog)
+                   else Catalog(datasets))
+        return [self._account_model(owner, catalog.dates[owner])
+                for owner in catalog.owners()]
 
     def map_account(self, account, datasets, include_content=False):
-        self.log.debug('[map_account] a:{} d(count):{} c:{}'.format(
-            account, len(datasets), include_content))
-        account_dir_model = create_model({
-            'type': 'directory',
-            'name': account,
-            'path': self._api_path(account),
-            'writable': False
-        })
-
+        self.log.debug('[map_account] a:%s d(count):%s c:%s',
+                       account, len(datasets), include_content)
         content = self.map_datasets(datasets)
-        account_dir_model.update(reduce_dates(content))
+        account_dir_model = self._account_model(account, reduce_dates(content))
 
         if include_content:
             account_dir_model['content'] = content
@@ -141,12 +136,12 @@ class DwMapper(object):
         return account_dir_model
 
     def map_datasets(self, datasets):
-        self.log.debug('[map_datasets] d(count):{}'.format(len(datasets)))
+        self.log.debug('[map_datasets] d(count):%s', len(datasets))
         return [self.map_dataset(d) for d in datasets]
 
     def map_dataset(self, dataset, include_content=False):
-        self.log.debug('[map_dataset] d:{} c:{}'.format(dataset['id'],
-                                                        include_content))
+        self.log.debug('[map_dataset] d:%s c:%s',
+                       dataset['id'], include_content)
         dataset_dir_model = create_model({
             'type': 'directory',
             'name': dataset['id'],
@@ -164,37 +159,40 @@ class DwMapper(object):
         return dataset_dir_model
 
     def map_items(self, dataset, parent=''):
-        self.log.debug('[map_items] d:{} s{}'.format(dataset['id'], parent))
-        sorted_files = sorted(
-            [f for f in dataset['files']
-             if valid_file(f) and f['name'].startswith(parent)],
-            key=lambda f: f['name'])
-
-        subdir_items = {k: list(g) for k, g in groupby(
-            sorted_files,
-            lambda f: relative_path(f['name'], parent).partition('/')[0])}
-
-        files = [children[0]
-                 for path, children in subdir_items.items()
-                 if len(children) == 1 and
-                 path == relative_path(children[0]['name'], parent)]
-
-        subdirs = [path for path, children in subdir_items.items()
-                   if not (len(children) == 1 and
-                           path == relative_path(children[0]['name'], parent))]
-
-        return (self.map_subdirs(subdirs, parent=parent, dataset_obj=dataset) +
-                self.map_files(files, parent=parent, dataset_obj=dataset))
+        self.log.debug('[map_items] d:%s s%s', dataset['id'], parent)
+        with span('mapper.map_items', dataset=dataset['id'],
+                  files=len(dataset['files'])) as mapping:
+            prefix = directory_path(parent)
+            files = []
+            subdirs = set()
+            for f in dataset['files']:
+                if (f['name'].startswith(prefix) and valid_file(f) and
+                        not is_sidecar(f['name'])):
+                    child, sep, _ = f['name'][len(prefix):].partition('/')
+                    if sep != '':
+                        subdirs.add(child)
+                    else:
+                        files.append(f)
+
+            # Directories take precedence over files of the same name
+            files = sorted([f for f in files
+                            if f['name'][len(prefix):] not in subdirs],
+                           key=lambda f: f['name'])
+            mapping.set('items', len(subdirs) + len(files))
+
+            return (self.map_subdirs(sorted(subdirs), parent=parent,
+                                     dataset_obj=dataset) +
+                    self.map_files(files, parent=parent, dataset_obj=dataset))
 
     def map_subdirs(self, subdirs, parent, dataset_obj):
-        self.log.debug('[map_subdirs] s(count):{} p:{} d:{}'.format(
-            len(subdirs), parent, dataset_obj['id']))
+        self.log.debug('[map_subdirs] s(count):%s p:%s d:%s',
+                       len(subdirs), parent, dataset_obj['id'])
         return [self.map_subdir(s, parent=parent, dataset_obj=dataset_obj)
                 for s in subdirs]
 
     def map_subdir(self, subdir, parent, dataset_obj, include_content=False):
-        self.log.debug('[map_subdir] s:{} p:{} d:{} c:{}'.format(
-            subdir, parent, dataset_obj['id'], include_content))
+        self.log.debug('[map_subdir] s:%s p:%s d:%s c:%s',
+                       subdir, parent, dataset_obj['id'], include_content)
         subdir_model = create_model({
             'type': 'directory',
             'name': subdir,
@@ -216,19 +214,22 @@ class DwMapper(object):
         return subdir_model
 
     def map_files(self, file_objs, parent, dataset_obj):
-        self.log.debug('[map_files] f(count):{} p:{} d:{}'.format(
-            len(file_objs), parent, dataset_obj['id']))
+        self.log.debug('[map_files] f(count):%s p:%s d:%s',
+                       len(file_objs), parent, dataset_obj['id'])
         return [self.map_file(file_obj, parent=parent, dataset_obj=dataset_obj)
                 for file_obj in file_objs]
 
     def map_file(self, file_obj, parent, dataset_obj,
                  content_type=None, content_format=None,
                  content_func=None):
-        self.log.debug('[map_file] f:{} p:{} d:{} t:{} c:{}'.format(
-            file_obj.get('name'), parent, dataset_obj.get('id'),
-            content_type, content_func is not None))
+        self.log.debug('[map_file] f:%s p:%s d:%s t:%s c:%s',
+                       file_obj.get('name'), parent, dataset_obj.get('id'),
+                       content_type, content_func is not None)
 
-        file_name = relative_path(file_obj['name'], parent)
+        prefix = directory_path(parent)
+        file_name = (file_obj['name'][len(prefix):]
+                     if file_obj['name'].startswith(prefix)
+                     else relative_path(file_obj['name'], parent))
 
         gtype = guess_type(file_obj['name'])
         content_type = content_type if content_type is not None else gtype
@@ -236,13 +237,14 @@ class DwMapper(object):
         file_model = create_model({
             'type': content_type,
             'name': file_name,
-            'path': self._api_path(
-                normalize_path(
-                    dataset_obj['owner'], dataset_obj['id'],
-                    file_obj['name'])),
+            'path': normalize_path(
+                self._dataset_api_path(dataset_obj['owner'],
+                                       dataset_obj['id']),
+                file_obj['name']),
             'writable': dataset_obj.get('accessLevel') in ['WRITE', 'ADMIN'],
             'created': file_obj['created'],
-            'last_modified': file_obj['updated']
+            'last_modified': file_obj['updated'],
+            'size': file_obj.get('sizeInBytes')
         })
 
         if content_func is not None:
@@ -262,5 +264,25 @@ class DwMapper(object):
 
         return file_model
 
+    def _account_model(self, account, dates):
+        account_dir_model = create_model({
+            'type': 'directory',
+            'name': account,
+            'path': self._api_path(account),
+            'writable': False
+        })
+        account_dir_model.update(dates)
+        return account_dir_model
+
     def _api_path(self, dw_path):
         return to_api_path(dw_path, self.root_dir)
+
+    def _dataset_api_path(self, owner, dataset_id):
+        key = (owner, dataset_id)
+        path = self._dataset_paths.get(key)
+        if path is None:
+            if len(self._dataset_paths) >= PATH_CACHE_SIZE:
+                self._dataset_paths.clear()
+            path = self._dataset_paths[key] = self._api_path(
+                normalize_path(owner, dataset_id))
+        return path
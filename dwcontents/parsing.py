@@ -0,0 +1,116 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+from builtins import str
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+str('Use str() once to force PyCharm to keep import')
+
+# Fields of dataset files used by dwcontents, everything else is dropped
+FILE_FIELDS = frozenset(['name', 'sizeInBytes', 'created', 'updated'])
+SOURCE_FIELDS = frozenset(['syncStatus'])
+
+_SCALARS = frozenset(['string', 'number', 'boolean', 'null'])
+_FILE_PREFIXES = {'files.item.' + f: f for f in FILE_FIELDS}
+_SOURCE_PREFIXES = {'files.item.source.' + f: f for f in SOURCE_FIELDS}
+
+
+def strip_file(file_obj):
+    stripped = {k: v for k, v in file_obj.items() if k in FILE_FIELDS}
+    source = file_obj.get('source')
+    if source is not None:
+        stripped['source'] = {k: v for k, v in source.items()
+                              if k in SOURCE_FIELDS}
+    return stripped
+
+
+def strip_dataset(dataset):
+    """Drop fields of dataset files that aren't used"""
+    if 'files' in dataset:
+        dataset['files'] = [strip_file(f) for f in dataset['files']]
+    return dataset
+
+
+def parse_dataset(stream):
+    """Parse a dataset document incrementally, keeping only the fields of
+    its files that are used (requires ``ijson``)
+
+    :param stream: Binary file-like object containing the dataset's JSON
+    :returns: The dataset, as ``strip_dataset`` would return it
+    :rtype: dict
+    """
+    dataset = {}
+    current = None
+    builder = None
+    depth = 0
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        field = _FILE_PREFIXES.get(prefix)
+        if field is not None:
+            if event in _SCALARS:
+                current[field] = value
+        elif _SOURCE_PREFIXES.get(prefix) is not None:
+            if event in _SCALARS:
+                current['source'][_SOURCE_PREFIXES[prefix]] = value
+        elif prefix.startswith('files.item'):
+            if event == 'start_map':
+                if prefix == 'files.item':
+                    current = {}
+                    dataset['files'].append(current)
+                elif prefix == 'files.item.source':
+                    current['source'] = {}
+        elif builder is not None:
+            # Nested top-level value, kept as is
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    dataset[prefix] = builder.value
+                    builder = None
+        elif prefix == 'files':
+            if event == 'start_array':
+                dataset['files'] = []
+        elif prefix != '':
+            if event in _SCALARS:
+                dataset[prefix] = value
+            else:
+                builder = ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+
+    return dataset
+
+
+def load_dataset(resp):
+    """Dataset from an API response, parsed incrementally if possible
+
+    :param resp: Streamed response
+    :type resp: requests.Response
+    """
+    if ijson is None:
+        return strip_dataset(resp.json())
+    resp.raw.decode_content = True
+    return parse_dataset(resp.raw)
@@ -0,0 +1,163 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import logging
+import threading
+from builtins import str
+from concurrent.futures import ThreadPoolExecutor
+
+from dwcontents import deadline
+from dwcontents.models import guess_type, guess_format
+from dwcontents.utils import LRUCache, directory_path, split_parent
+
+str('Use str() once to force PyCharm to keep import')
+
+
+def _version(file_obj):
+    return file_obj.get('updated'), file_obj.get('sizeInBytes')
+
+
+class Prefetcher(object):
+    """Downloads files likely to be opened next, in the background
+
+    After a directory is listed, its smallest notebooks and text files are
+    downloaded into a size-capped cache. Cached content is only used if
+    the file hasn't changed since, and only once.
+
+    :param api: API client
+    :type api: dwcontents.api.DwContentsApi
+    :param max_workers: Maximum number of concurrent downloads
+    :type max_workers: int
+    :param max_bytes: Maximum size of the cache
+    :type max_bytes: int
+    :param max_file_size: Largest file worth prefetching
+    :type max_file_size: int
+    :param max_files: Maximum number of files prefetched per listing
+    :type max_files: int
+    """
+
+    def __init__(self, api, max_workers=2, max_bytes=32 * 1024 * 1024,
+                 max_file_size=1024 * 1024, max_files=10, logger=None):
+        self.api = api
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.fetched_bytes = 0
+        self._cache = LRUCache(max_bytes=max_bytes,
+                               sizeof=lambda entry: len(entry[1]))
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def candidates(self, dataset, dir_path=None):
+        """Files of a directory worth prefetching, most likely first"""
+        parent = directory_path(dir_path)
+
+        def rank(file_obj):
+            content_type = guess_type(file_obj['name'])
+            return (0 if content_type == 'notebook' else 1,
+                    file_obj['sizeInBytes'])
+
+        files = [f for f in dataset.get('files', [])
+                 if split_parent(f['name'])[0] == parent and
+                 f.get('sizeInBytes') is not None and
+                 f['sizeInBytes'] <= self.max_file_size and
+                 (guess_type(f['name']) == 'notebook' or
+                  guess_format(f['name'], 'file') == 'text')]
+        return sorted(files, key=rank)[:self.max_files]
+
+    def schedule(self, dataset, dir_path=None):
+        """Start downloading files of a directory that was just listed"""
+        owner, dataset_id = dataset['owner'], dataset['id']
+        scheduled = 0
+        with self._lock:
+            for file_obj in self.candidates(dataset, dir_path):
+                key = (owner, dataset_id, file_obj['name'])
+                cached = self._cache.get(key)
+                if key in self._pending or (
+                        cached is not None and
+                        cached[0] == _version(file_obj)):
+                    continue
+                self._pending[key] = self._executor.submit(
+                    self._fetch, key, _version(file_obj))
+                scheduled += 1
+        if scheduled > 0:
+            self.log.debug('[prefetch] Scheduled %s files from %s/%s',
+                           scheduled, owner, dataset_id)
+
+    def take(self, owner, dataset_id, file_obj):
+        """Content prefetched for a file, waiting for it if in progress
+
+        :returns: Raw bytes, or None if the file wasn't prefetched or has
+            changed since
+        """
+        key = (owner, dataset_id, file_obj['name'])
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=deadline.remaining())
+            except Exception:
+                pass
+
+        entry = self._cache.pop(key)
+        with self._lock:
+            if entry is not None and entry[0] == _version(file_obj):
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def discard(self, owner, dataset_id, file_name):
+        self._cache.pop((owner, dataset_id, file_name))
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (float(self.hits) / requests
+                             if requests > 0 else 0.0),
+                'fetched': self.fetched,
+                'fetched_bytes': self.fetched_bytes,
+                'cached_bytes': self._cache.total_bytes
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _fetch(self, key, version):
+        try:
+            data = self.api.download_file(*key)
+            self._cache.put(key, (version, data))
+            with self._lock:
+                self.fetched += 1
+                self.fetched_bytes += len(data)
+        except Exception as e:
+            self.log.debug('[prefetch] Unable to prefetch %s: %s',
+                           '/'.join(key), e)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
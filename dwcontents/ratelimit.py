@@ -0,0 +1,195 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from builtins import str
+
+from requests.adapters import BaseAdapter
+
+from dwcontents import deadline
+from dwcontents.deadline import DeadlineExceeded
+
+str('Use str() once to force PyCharm to keep import')
+
+DEFAULT_RATE = 0.0  # off
+DEFAULT_BURST = 20
+
+logger = logging.getLogger('dwcontents')
+
+
+def _now():
+    return getattr(time, 'monotonic', time.time)()
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return None
+
+
+class RateLimiter(object):
+    """Token bucket pacing requests from all threads using it
+
+    Requests are allowed at ``rate`` per second on average, with bursts of
+    up to ``burst`` requests. The rate is adjusted to match rate-limit
+    headers sent by the server, when present. A rate of ``0`` disables
+    pacing.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.requests = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._tokens = float(burst)
+        self._updated = _now()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, key, **kwargs):
+        """Process-wide limiter for key, created with kwargs on first use"""
+        with cls._shared_lock:
+            limiter = cls._shared.get(key)
+            if limiter is None:
+                limiter = cls._shared[key] = cls(**kwargs)
+            return limiter
+
+    def acquire(self, timeout=None):
+        """Wait for a token
+
+        :param timeout: Maximum number of seconds to wait
+        :type timeout: float
+        :returns: Seconds spent waiting
+        :rtype: float
+        :raises DeadlineExceeded: If a token can't be had within timeout
+        """
+        if not self.max_rate:
+            with self._lock:
+                self.requests += 1
+            return 0.0
+
+        with self._lock:
+            now = self._refill()
+            self._tokens -= 1
+            wait = max(0.0,
+                       -self._tokens / self.rate,
+                       self._paused_until - now)
+            if timeout is not None and wait > timeout:
+                self._tokens += 1
+                raise DeadlineExceeded(
+                    'Rate limited for another {:.1f}s'.format(wait))
+            self.requests += 1
+            if wait > 0:
+                self.delayed += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+        if wait > 0:
+            logger.debug('[rate_limit] Waiting %.3fs', wait)
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold all requests for a number of seconds (e.g. Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, _now() + seconds)
+
+    def update(self, headers):
+        """Adjust to the quota reported in response headers"""
+        remaining = _header(headers, 'X-RateLimit-Remaining',
+                            'RateLimit-Remaining')
+        reset = _header(headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+        if not self.max_rate or remaining is None or reset is None:
+            return
+
+        # Reset is either a timestamp or a number of seconds
+        reset_in = reset - time.time() if reset > 1e9 else reset
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, remaining)
+            if reset_in > 0:
+                self.rate = min(self.max_rate,
+                                max(remaining, 1) / reset_in)
+                if remaining < 1:
+                    self._paused_until = max(self._paused_until,
+                                             _now() + reset_in)
+            else:
+                self.rate = self.max_rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'delayed': self.delayed,
+                'total_wait': self.total_wait,
+                'max_wait': self.max_wait,
+                'avg_wait': (self.total_wait / self.requests
+                             if self.requests > 0 else 0.0),
+                'rate': self.rate
+            }
+
+    def _refill(self):
+        now = _now()
+        self._tokens = min(float(self.burst),
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+
+class RateLimitAdapter(BaseAdapter):
+    def __init__(self, delegate, limiter):
+        """Requests adapter pacing requests with a RateLimiter
+        :param delegate: Adapter to delegate final request processing to
+        :type delegate: requests.adapters.BaseAdapter
+        :param limiter: Rate limiter, usually shared by many adapters
+        :type limiter: RateLimiter
+        """
+        self._delegate = delegate
+        self.limiter = limiter
+        super(RateLimitAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        wait = self.limiter.acquire(timeout=deadline.remaining())
+        resp = self._delegate.send(request, **kwargs)
+        resp.rate_limit_wait = wait
+        self.limiter.update(resp.headers)
+        if (resp.status_code == 429 and
+                resp.headers.get('Retry-After')):
+            try:
+                self.limiter.pause(float(resp.headers.get('Retry-After')))
+            except ValueError:
+                pass
+        return resp
+
+    def close(self):
+        self._delegate.close()
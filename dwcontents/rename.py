@@ -0,0 +1,223 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import json
+import logging
+import threading
+from builtins import str
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tornado.web import HTTPError
+
+from dwcontents.api import UPLOAD_BATCH_SIZE, UPLOAD_BATCH_BYTES
+from dwcontents.lean import references, METADATA_KEY
+from dwcontents.utils import directory_path, normalize_path, MWT
+
+str('Use str() once to force PyCharm to keep import')
+
+
+def plan_rename(source_dataset, old_dir, new_dir, target_dataset=None):
+    """Plan moving all files under a directory from one dataset snapshot
+
+    :param source_dataset: Dataset containing ``old_dir``
+    :type source_dataset: dict
+    :param old_dir: Directory to move (relative to the dataset)
+    :type old_dir: str
+    :param new_dir: New directory name (relative to the target dataset)
+    :type new_dir: str
+    :param target_dataset: Destination dataset, if not the source dataset
+    :type target_dataset: dict
+    :returns: List of ``(old_name, new_name)`` pairs
+    :rtype: list
+    """
+    target_dataset = (target_dataset
+                      if target_dataset is not None else source_dataset)
+    parent = directory_path(old_dir)
+    moves = [(f['name'], normalize_path(new_dir, f['name'][len(parent):]))
+             for f in source_dataset.get('files', [])
+             if f['name'].startswith(parent)]
+
+    existing = {f['name'] for f in target_dataset.get('files', [])}
+    conflicts = [new for _, new in moves if new in existing]
+    if len(conflicts) > 0:
+        msg = 'File already exists ({}).'.format(conflicts[0])
+        raise HTTPError(409, log_message=msg, reason=msg)
+
+    return moves
+
+
+class BatchRename(object):
+    """Copies files concurrently, then deletes the sources in bulk
+
+    Files are copied by groups, each downloaded file by file and uploaded
+    in as few requests as possible (see ``DwContentsApi.put_files``).
+    Caches are invalidated once, after all files are moved. Files that
+    could not be copied are left in place and reported at the end.
+
+    :param api: API client
+    :type api: dwcontents.api.DwContentsApi
+    :param source: ``(owner, dataset_id)`` of the files being moved
+    :type source: tuple
+    :param target: ``(owner, dataset_id)`` where files are moved to
+    :type target: tuple
+    :param moves: List of ``(old_name, new_name)`` pairs
+    :type moves: list
+    :param max_workers: Maximum number of concurrent copies
+    :type max_workers: int
+    :param source_dir: Directory removed once all files are moved
+    :type source_dir: str
+    :param progress: Called with ``(done, total, old_name)`` for each file
+        copied, once its group is uploaded
+    :type progress: callable
+    """
+
+    def __init__(self, api, source, target, moves, source_dir=None,
+                 max_workers=8, progress=None, logger=None):
+        self.api = api
+        self.source = source
+        self.target = target
+        self.moves = moves
+        self.source_dir = source_dir
+        self.max_workers = max_workers
+        self.progress = progress
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self.copied = []
+        self.failed = []
+        self._sidecars = set()
+        self._sidecars_lock = threading.Lock()
+
+    def execute(self):
+        total = len(self.moves)
+        self.log.info('[rename] Moving %s files from %s to %s',
+                      total, '/'.join(self.source), '/'.join(self.target))
+
+        if total > 0:
+            # Enough groups to keep all workers busy
+            size = max(1, min(UPLOAD_BATCH_SIZE,
+                              -(-total // max(1, self.max_workers))))
+            groups = [self.moves[i:i + size] for i in range(0, total, size)]
+            with ThreadPoolExecutor(
+                    max_workers=max(1, min(self.max_workers,
+                                           len(groups)))) as pool:
+                futures = [pool.submit(self._copy_group, group)
+                           for group in groups]
+                for future in as_completed(futures):
+                    for old, new, error in future.result():
+                        if error is None:
+                            self.copied.append((old, new))
+                        else:
+                            self.log.warning('[rename] Unable to copy %s: %s',
+                                             old, error)
+                            self.failed.append((old, error))
+                        self._report(old, total)
+
+        if len(self.copied) > 0:
+            try:
+                self.api.delete_files(self.source[0], self.source[1],
+                                      [old for old, _ in self.copied])
+                if len(self.failed) == 0 and self.source_dir is not None:
+                    self._delete_leftovers()
+            finally:
+                self.api.sync_dataset(*self.target)
+                if self.source != self.target:
+                    self.api.sync_dataset(*self.source)
+
+        if len(self.failed) > 0:
+            msg = 'Unable to move {} of {} files ({}).'.format(
+                len(self.failed), total,
+                ', '.join(old for old, _ in self.failed[:5]))
+            raise HTTPError(500, log_message=msg, reason=msg)
+
+        return self.copied
+
+    def _delete_leftovers(self):
+        # Clean up anything not included in the snapshot, from a fresh
+        # dataset that no longer lists the files just deleted
+        MWT().invalidate(self.api)
+        dataset = self.api.get_dataset(*self.source)
+        parent = directory_path(self.source_dir)
+        leftovers = [f['name'] for f in (dataset or {}).get('files', [])
+                     if f['name'].startswith(parent)]
+        if len(leftovers) > 0:
+            self.api.delete_files(self.source[0], self.source[1], leftovers)
+
+    def _copy_group(self, group):
+        results, pending, pending_bytes = [], [], 0
+        for old_name, new_name in group:
+            try:
+                files = self._download(old_name, new_name)
+            except Exception as e:
+                results.append((old_name, new_name, e))
+                continue
+            pending.append((old_name, new_name, files))
+            pending_bytes += sum(len(data) for _, data in files)
+            if pending_bytes >= UPLOAD_BATCH_BYTES:
+                results.extend(self._upload(pending))
+                pending, pending_bytes = [], 0
+        if len(pending) > 0:
+            results.extend(self._upload(pending))
+        return results
+
+    def _download(self, old_name, new_name):
+        data = self.api.download_file(self.source[0], self.source[1],
+                                      old_name)
+        files = [(new_name, data)]
+        if self.source != self.target and new_name.endswith('.ipynb'):
+            files.extend(self._copy_sidecars(data))
+        return files
+
+    def _upload(self, pending):
+        try:
+            self.api.put_files(self.target[0], self.target[1],
+                               [f for _, _, files in pending for f in files],
+                               max_workers=1)
+            error = None
+        except Exception as e:
+            error = e
+        return [(old_name, new_name, error)
+                for old_name, new_name, _ in pending]
+
+    def _copy_sidecars(self, data):
+        # Outputs of lean notebooks are saved separately, per dataset
+        sidecars = []
+        if METADATA_KEY.encode('utf-8') not in data:
+            return sidecars
+        for name in references(json.loads(data.decode('utf-8'))):
+            with self._sidecars_lock:
+                if name in self._sidecars:
+                    continue
+                self._sidecars.add(name)
+            try:
+                sidecar = self.api.download_file(self.source[0],
+                                                 self.source[1], name)
+            except HTTPError as e:
+                if e.status_code != 404:
+                    raise
+                self.log.warning('[rename] Missing output %s', name)
+                continue
+            sidecars.append((name, sidecar))
+        return sidecars
+
+    def _report(self, old_name, total):
+        done = len(self.copied) + len(self.failed)
+        self.log.debug('[rename] %s/%s %s', done, total, old_name)
+        if self.progress is not None:
+            self.progress(done, total, old_name)
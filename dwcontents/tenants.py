@@ -0,0 +1,173 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import threading
+import time
+from builtins import str
+from collections import deque
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from dwcontents import deadline
+from dwcontents.api import DwContentsApi
+from dwcontents.deadline import DeadlineExceeded
+from dwcontents.utils import token_key
+
+str('Use str() once to force PyCharm to keep import')
+
+
+def _now():
+    return getattr(time, 'monotonic', time.time)()
+
+
+class FairScheduler(object):
+    def __init__(self, max_concurrency):
+        """Limits concurrent requests, granting slots to tenants in turns
+
+        Tenants waiting for a slot are served round-robin, so that a
+        tenant sending many requests at once can't starve the others.
+
+        :param max_concurrency: Maximum number of requests in progress
+        :type max_concurrency: int
+        """
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._turns = deque()
+
+    def acquire(self, tenant, timeout=None):
+        """Wait for a slot
+
+        :param timeout: Maximum number of seconds to wait
+        :type timeout: float
+        :raises DeadlineExceeded: If no slot is granted within timeout
+        """
+        waiter = [False]
+        expires = _now() + timeout if timeout is not None else None
+        with self._cond:
+            queue = self._queues.get(tenant)
+            if queue is None:
+                queue = self._queues[tenant] = deque()
+                self._turns.append(tenant)
+            queue.append(waiter)
+            self._dispatch()
+            while not waiter[0]:
+                left = expires - _now() if expires is not None else None
+                if left is not None and left <= 0:
+                    self._withdraw(tenant, waiter)
+                    raise DeadlineExceeded(
+                        'Timed out waiting for a connection to data.world')
+                self._cond.wait(left)
+
+    def release(self, tenant):
+        with self._cond:
+            self.active -= 1
+            self._dispatch()
+
+    def _withdraw(self, tenant, waiter):
+        queue = self._queues[tenant]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[tenant]
+            self._turns.remove(tenant)
+
+    def _dispatch(self):
+        granted = False
+        while self.active < self.max_concurrency and self._turns:
+            tenant = self._turns.popleft()
+            queue = self._queues[tenant]
+            queue.popleft()[0] = True
+            self.active += 1
+            granted = True
+            if queue:
+                self._turns.append(tenant)
+            else:
+                del self._queues[tenant]
+        if granted:
+            self._cond.notify_all()
+
+
+class ScheduledAdapter(BaseAdapter):
+    def __init__(self, delegate, scheduler, tenant):
+        """Requests adapter sending requests through a FairScheduler
+        :param delegate: Adapter to delegate final request processing to
+        :type delegate: requests.adapters.BaseAdapter
+        :param scheduler: Scheduler shared by all tenants
+        :type scheduler: FairScheduler
+        :param tenant: Key identifying the tenant sending requests
+        :type tenant: str
+        """
+        self._delegate = delegate
+        self._scheduler = scheduler
+        self._tenant = tenant
+        super(ScheduledAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        self._scheduler.acquire(self._tenant, timeout=deadline.remaining())
+        try:
+            return self._delegate.send(request, **kwargs)
+        finally:
+            self._scheduler.release(self._tenant)
+
+    def close(self):
+        pass  # Delegate is shared with other tenants
+
+
+class TenantPool(object):
+    """API clients for many users, sharing one bounded connection pool
+
+    Each API token gets its own client, with its own cache limited to
+    ``cache_quota`` bytes.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_connections=32, max_concurrency=16,
+                 cache_quota=64 * 1024 * 1024, base_url=None):
+        self.cache_quota = cache_quota
+        self.base_url = base_url
+        self.adapter = HTTPAdapter(pool_connections=1,
+                                   pool_maxsize=max_connections,
+                                   pool_block=True)
+        self.scheduler = FairScheduler(max_concurrency)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, **kwargs):
+        """Process-wide pool, created with kwargs on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(**kwargs)
+            return cls._instance
+
+    def client(self, api_token):
+        key = token_key(api_token)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = DwContentsApi(
+                    api_token,
+                    adapter=ScheduledAdapter(
+                        self.adapter, self.scheduler, key),
+                    cache_quota=self.cache_quota,
+                    base_url=self.base_url)
+            return client
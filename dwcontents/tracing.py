@@ -0,0 +1,230 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import io
+import json
+import random
+import threading
+import time
+from builtins import str
+from functools import wraps
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+str('Use str() once to force PyCharm to keep import')
+
+_sinks = []
+_local = threading.local()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Span(object):
+    """Timed operation, nested within the span active when it starts"""
+    __slots__ = ['name', 'attributes', 'trace_id', 'span_id', 'parent_id',
+                 'start', 'end', 'error', 'handles', '_clock']
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = '{:016x}'.format(random.getrandbits(64))
+        self.trace_id = None
+        self.parent_id = None
+        self.start = None
+        self.end = None
+        self.error = None
+        self.handles = {}  # Sink specific state
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end is not None else None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration': self.duration,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+    def __enter__(self):
+        stack = _stack()
+        if stack:
+            self.trace_id = stack[-1].trace_id
+            self.parent_id = stack[-1].span_id
+        else:
+            self.trace_id = '{:032x}'.format(random.getrandbits(128))
+        stack.append(self)
+        self.start = time.time()
+        self._clock = time.perf_counter() if hasattr(
+            time, 'perf_counter') else time.time()
+        for sink in _sinks:
+            sink.start(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        clock = time.perf_counter() if hasattr(
+            time, 'perf_counter') else time.time()
+        self.end = self.start + (clock - self._clock)
+        if exc_value is not None:
+            self.error = repr(exc_value)
+        _stack().pop()
+        for sink in _sinks:
+            sink.end(self)
+        return False
+
+
+class _NoopSpan(object):
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enabled():
+    return len(_sinks) > 0
+
+
+def span(name, **attributes):
+    """Context manager timing a block of code
+
+    Does nothing unless a sink was added via ``add_sink``.
+    """
+    if not _sinks:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def traced(name):
+    """Decorator running a function within a span"""
+    def decorator(fn):
+        @wraps(fn)
+        def decorated(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+
+def add_sink(sink):
+    if sink not in _sinks:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+class JsonSink(object):
+    def __init__(self, path=None, stream=None):
+        """Writes finished spans as JSON, one per line
+
+        :param path: File to append spans to, opened once a span ends
+        :type path: str
+        :param stream: Text stream to write spans to, if no path is given
+        :type stream: io.TextIOBase
+        """
+        self.path = path
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def start(self, span):
+        pass
+
+    def end(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._stream is None:
+                self._stream = io.open(self.path, 'a', encoding='utf-8')
+            self._stream.write('{}\n'.format(line))
+            self._stream.flush()
+
+    def __eq__(self, other):
+        return (isinstance(other, JsonSink) and self.path is not None and
+                self.path == other.path)
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+class OpenTelemetrySink(object):
+    def __init__(self, tracer=None):
+        """Reports spans to OpenTelemetry (requires ``opentelemetry-api``)
+
+        :param tracer: Tracer to create spans with
+        :type tracer: opentelemetry.trace.Tracer
+        """
+        if otel_trace is None:
+            raise ImportError('OpenTelemetry tracing requires the '
+                              'opentelemetry-api package')
+        self.tracer = (tracer if tracer is not None
+                       else otel_trace.get_tracer('dwcontents'))
+
+    def start(self, span):
+        parent = next((s for s in reversed(_stack()[:-1])
+                       if self in s.handles), None)
+        context = (otel_trace.set_span_in_context(parent.handles[self])
+                   if parent is not None else None)
+        span.handles[self] = self.tracer.start_span(
+            span.name, context=context, start_time=int(span.start * 1e9))
+
+    def end(self, span):
+        otel_span = span.handles.pop(self, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(key, value)
+        if span.error is not None:
+            otel_span.set_attribute('error', span.error)
+        otel_span.end(end_time=int(span.end * 1e9))
+
+    def __eq__(self, other):
+        return isinstance(other, OpenTelemetrySink)
+
+    def __hash__(self):
+        return hash(OpenTelemetrySink)
@@ -0,0 +1,298 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import base64
+import io
+import logging
+import os
+from builtins import str
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from notebook.services.contents.largefilemanager import LargeFileManager
+from tornado.web import HTTPError
+
+from dwcontents.utils import normalize_path, relative_path
+
+str('Use str() once to force PyCharm to keep import')
+
+CHUNK_SIZE = 8 * 1024 * 1024
+# Files are held in memory when saved to managers that don't take chunks
+MAX_UNCHUNKED_BYTES = 256 * 1024 * 1024
+
+
+def supports_chunks(mgr):
+    """Whether a manager assembles uploads sent as numbered chunks"""
+    return (isinstance(mgr, LargeFileManager) or
+            getattr(mgr, 'supports_chunked_save', False))
+
+
+def is_movable(mgr, path):
+    """Whether a file or directory can be moved away from a manager"""
+    if hasattr(mgr, 'is_movable'):
+        return mgr.is_movable(path)
+    return path != ''
+
+
+class Chunks(object):
+    """Iterator over the chunks of bytes of a file
+
+    :param chunks: Chunks of bytes
+    :type chunks: iterable
+    :param size: Number of bytes iterated over in total, if known upfront
+    :type size: int
+    """
+
+    def __init__(self, chunks, size=None):
+        self._chunks = iter(chunks)
+        self.size = size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    next = __next__
+
+    def close(self):
+        if hasattr(self._chunks, 'close'):
+            self._chunks.close()
+
+
+def read_chunks(mgr, path, chunk_size=CHUNK_SIZE):
+    """Iterate over the raw bytes of a file, reading as little as possible
+    into memory at once
+
+    :rtype: Chunks
+    """
+    if hasattr(mgr, 'open_stream'):
+        return mgr.open_stream(path, chunk_size=chunk_size)
+    elif hasattr(mgr, '_get_os_path'):
+        os_path = mgr._get_os_path(path)
+        return Chunks(_read_file(os_path, chunk_size),
+                      size=os.path.getsize(os_path))
+    else:
+        model = mgr.get(path, content=True, type='file', format='base64')
+        data = base64.b64decode(model['content'].encode('ascii'))
+        return Chunks([data], size=len(data))
+
+
+def _read_file(os_path, chunk_size):
+    with io.open(os_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield chunk
+
+
+def join_chunks(chunks, max_bytes=MAX_UNCHUNKED_BYTES):
+    """Join chunks of bytes, refusing to hold more than max_bytes"""
+    joined = []
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            msg = 'File too large to copy at once ({} bytes max).'.format(
+                max_bytes)
+            raise HTTPError(413, log_message=msg, reason=msg)
+        joined.append(chunk)
+    return b''.join(joined)
+
+
+def write_chunks(mgr, path, chunks, max_bytes=MAX_UNCHUNKED_BYTES):
+    """Save a file from an iterator of chunks of bytes
+
+    Chunks are forwarded one at a time to managers that support chunked
+    uploads, otherwise they are joined and saved at once, up to max_bytes.
+    """
+    def file_model(data, chunk=None):
+        model = {
+            'type': 'file',
+            'format': 'base64',
+            'content': base64.b64encode(data).decode('ascii')
+        }
+        if chunk is not None:
+            model['chunk'] = chunk
+        return model
+
+    if not supports_chunks(mgr):
+        return mgr.save(file_model(join_chunks(chunks, max_bytes)), path)
+
+    chunks = iter(chunks)
+    current = next(chunks, b'')
+    number = 1
+    for following in chunks:
+        mgr.save(file_model(current, chunk=number), path)
+        current = following
+        number += 1
+
+    if number == 1:
+        return mgr.save(file_model(current), path)
+    else:
+        return mgr.save(file_model(current, chunk=-1), path)
+
+
+class CrossManagerMove(object):
+    """Moves a file or directory between two contents managers
+
+    Files are streamed from one manager to the other, several at a time.
+    The source is only deleted once everything was copied; if any copy
+    fails, files already copied are deleted instead.
+
+    :param old_mgr: Contents manager to move from
+    :type old_mgr: notebook.services.contents.manager.ContentsManager
+    :param old_path: Path of the file or directory in ``old_mgr``
+    :type old_path: str
+    :param new_mgr: Contents manager to move to
+    :type new_mgr: notebook.services.contents.manager.ContentsManager
+    :param new_path: Path of the file or directory in ``new_mgr``
+    :type new_path: str
+    :param max_workers: Maximum number of concurrent copies
+    :type max_workers: int
+    :param chunk_size: Maximum number of bytes read at once
+    :type chunk_size: int
+    :param max_bytes: Maximum size of files copied to managers that don't
+        take chunks
+    :type max_bytes: int
+    """
+
+    def __init__(self, old_mgr, old_path, new_mgr, new_path,
+                 max_workers=4, chunk_size=CHUNK_SIZE,
+                 max_bytes=MAX_UNCHUNKED_BYTES, logger=None):
+        self.old_mgr = old_mgr
+        self.old_path = normalize_path(old_path)
+        self.new_mgr = new_mgr
+        self.new_path = normalize_path(new_path)
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self.copied = []
+        self.failed = []
+        self.created_dirs = []
+
+    def execute(self):
+        if not is_movable(self.old_mgr, self.old_path):
+            msg = 'Only files and subdirectories can be moved ({}).'.format(
+                self.old_path)
+            raise HTTPError(400, log_message=msg, reason=msg)
+        if self.new_mgr.exists(self.new_path):
+            msg = 'File already exists ({}).'.format(self.new_path)
+            raise HTTPError(409, log_message=msg, reason=msg)
+
+        if self.old_mgr.dir_exists(self.old_path):
+            dirs, files = self._walk(self.old_path)
+        elif self.old_mgr.file_exists(self.old_path):
+            dirs, files = [], [self.old_path]
+        else:
+            msg = 'Not found ({}).'.format(self.old_path)
+            raise HTTPError(404, log_message=msg, reason=msg)
+
+        self.log.info('[move] Moving %s files and %s directories to %s',
+                      len(files), len(dirs), self.new_path)
+        try:
+            for d in dirs:
+                self._make_dir(self._target(d))
+            self._copy_files(files)
+        except Exception:
+            self._rollback()
+            raise
+
+        self._delete_sources(dirs, files)
+        return self.new_mgr.get(self.new_path, content=False)
+
+    def _walk(self, root):
+        dirs, files = [], []
+        pending = [root]
+        while pending:
+            current = pending.pop()
+            dirs.append(current)
+            model = self.old_mgr.get(current, content=True)
+            for item in model['content']:
+                if item['type'] == 'directory':
+                    pending.append(item['path'])
+                else:
+                    files.append(item['path'])
+        return dirs, files
+
+    def _target(self, path):
+        return normalize_path(self.new_path,
+                              relative_path(path, self.old_path))
+
+    def _make_dir(self, path):
+        if self.new_mgr.dir_exists(path):
+            return
+        try:
+            self.new_mgr.save({'type': 'directory'}, path)
+            self.created_dirs.append(path)
+        except HTTPError as e:
+            # Some managers (e.g. DwContents) create directories implicitly
+            self.log.debug('[move] Unable to create %s: %s', path, e)
+
+    def _copy_files(self, files):
+        if len(files) == 0:
+            return
+
+        with ThreadPoolExecutor(
+                max_workers=max(1, min(self.max_workers, len(files)))) as pool:
+            futures = {pool.submit(self._copy, f): f for f in files}
+            statuses = set()
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    self.copied.append(self._target(futures[future]))
+                except Exception as e:
+                    self.log.warning('[move] Unable to copy %s: %s',
+                                     futures[future], e)
+                    self.failed.append(self._target(futures[future]))
+                    statuses.add(getattr(e, 'status_code', 500))
+
+        if len(self.failed) > 0:
+            msg = 'Unable to move {} of {} files ({}).'.format(
+                len(self.failed), len(files), ', '.join(self.failed[:5]))
+            # Report errors shared by all failed copies (e.g. 413)
+            raise HTTPError(statuses.pop() if len(statuses) == 1 else 500,
+                            log_message=msg, reason=msg)
+
+    def _copy(self, path):
+        write_chunks(self.new_mgr, self._target(path),
+                     read_chunks(self.old_mgr, path,
+                                 chunk_size=self.chunk_size),
+                     max_bytes=self.max_bytes)
+
+    def _delete_sources(self, dirs, files):
+        # Only files that were copied are deleted, then directories left
+        # empty, children first
+        for path in files:
+            self.old_mgr.delete(path)
+        for path in dirs[::-1]:
+            if (self.old_mgr.dir_exists(path) and
+                    len(self.old_mgr.get(path, content=True)['content']) == 0):
+                self.old_mgr.delete(path)
+
+    def _rollback(self):
+        # Failed copies may be incomplete and directories are removed
+        # children first, once empty
+        for path in self.copied + self.failed + self.created_dirs[::-1]:
+            try:
+                if self.new_mgr.exists(path):
+                    self.new_mgr.delete(path)
+            except Exception as e:
+                self.log.warning('[move] Unable to roll back %s: %s',
+                                 path, e)
@@ -0,0 +1,178 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import logging
+import tempfile
+import threading
+import time
+from builtins import str
+
+from tornado.web import HTTPError
+
+str('Use str() once to force PyCharm to keep import')
+
+FIRST_CHUNK = 1
+LAST_CHUNK = -1
+
+
+class _Upload(object):
+    def __init__(self, spool_bytes):
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        self.size = 0
+        self.next_chunk = FIRST_CHUNK
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def close(self):
+        # Waits for chunks being written
+        with self.lock:
+            self.file.close()
+
+
+class ChunkedUploads(object):
+    """Staging area for files uploaded as numbered chunks
+
+    Chunks are appended to spooled temporary files, kept in memory up to
+    ``spool_bytes`` and written to disk beyond that. Chunks of different
+    uploads are written concurrently, those of an upload must come in
+    order. Uploads that don't receive a chunk for ``max_age`` seconds are
+    discarded by a background thread, started with the first upload, every
+    ``interval`` seconds.
+
+    :param spool_bytes: Size above which uploads are staged on disk
+    :type spool_bytes: int
+    :param max_age: Seconds after which an incomplete upload is discarded
+    :type max_age: float
+    :param interval: Seconds between checks for abandoned uploads
+    :type interval: float
+    """
+
+    def __init__(self, spool_bytes=16 * 1024 * 1024, max_age=3600,
+                 interval=60, logger=None):
+        self.spool_bytes = spool_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self._staged = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='dwcontents-uploads')
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def append(self, path, chunk, data):
+        """Add a chunk to an upload
+
+        :param chunk: Chunk number, starting at 1, -1 for the last chunk
+        :type chunk: int
+        :returns: Number of bytes received so far
+        :rtype: int
+        :raises HTTPError: If earlier chunks of the upload were discarded,
+            or chunks are missing or repeated
+        """
+        if self._thread is None:
+            self.start()
+        replaced = None
+        with self._lock:
+            staged = self._staged.get(path)
+            if chunk == FIRST_CHUNK or (staged is None and
+                                        chunk == LAST_CHUNK):
+                # New upload (or single chunk), replacing any earlier one
+                replaced = staged
+                staged = self._staged[path] = _Upload(self.spool_bytes)
+            elif staged is None:
+                raise _expired(path)
+            # Not abandoned while this chunk is written
+            staged.updated = time.time()
+
+        if replaced is not None:
+            replaced.close()
+
+        with staged.lock:
+            if staged.file.closed:
+                # Discarded or replaced while waiting
+                raise _expired(path)
+            if chunk not in (staged.next_chunk, LAST_CHUNK):
+                msg = 'Chunk {} of {} out of order, expected {}.'.format(
+                    chunk, path, staged.next_chunk)
+                raise HTTPError(400, log_message=msg, reason=msg)
+            staged.next_chunk += 1
+            staged.file.write(data)
+            staged.size += len(data)
+            staged.updated = time.time()
+            return staged.size
+
+    def finish(self, path):
+        """Remove a completed upload from the staging area
+
+        :returns: File containing the upload, positioned at its beginning,
+            to be closed by the caller
+        :rtype: tempfile.SpooledTemporaryFile
+        """
+        with self._lock:
+            staged = self._staged.pop(path)
+        with staged.lock:
+            staged.file.seek(0)
+            return staged.file
+
+    def discard(self, path):
+        with self._lock:
+            staged = self._staged.pop(path, None)
+        if staged is not None:
+            staged.close()
+
+    def cleanup(self):
+        """Discard uploads abandoned for more than max_age seconds"""
+        expired = time.time() - self.max_age
+        with self._lock:
+            abandoned = [(p, self._staged.pop(p))
+                         for p, s in list(self._staged.items())
+                         if s.updated < expired]
+        for path, staged in abandoned:
+            staged.close()
+            self.log.info('[uploads] Discarded abandoned upload of %s', path)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.cleanup()
+            except Exception as e:
+                self.log.warning('[uploads] Unable to discard abandoned '
+                                 'uploads: %s', e)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._staged)
+
+
+def _expired(path):
+    msg = 'Upload of {} expired or never started.'.format(path)
+    return HTTPError(400, log_message=msg, reason=msg)
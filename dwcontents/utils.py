@@ -18,8 +18,13 @@
 # data.world, Inc.(http://data.world/).
 from __future__ import unicode_literals, print_function
 
+import hashlib
+import logging
+import threading
 import time
 from builtins import str
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from itertools import groupby
 
 import nbformat
@@ -29,8 +34,12 @@ str('Use str() once to force PyCharm to keep import')
 
 
 def directory_path(path):
-    path = normalize_path(path)
-    return path if path == '' else '{}/'.format(path)
+    dir_path = _DIRS.get(path)
+    if dir_path is None:
+        dir_path = normalize_path(path)
+        dir_path = _memoize(_DIRS, path, dir_path if dir_path == ''
+                            else '{}/'.format(dir_path))
+    return dir_path
 
 
 def normalize_path(*parts):
@@ -45,9 +54,11 @@ def relative_path(path, parent):
 
 
 def split_parent(path):
-    path = normalize_path(path)
-    parent, _, name = path.rpartition('/')
-    return directory_path(parent), name
+    split = _PARENTS.get(path)
+    if split is None:
+        parent, _, name = normalize_path(path).rpartition('/')
+        split = _memoize(_PARENTS, path, (directory_path(parent), name))
+    return split
 
 
 def to_api_path(dw_path, root_dir=''):
@@ -56,20 +67,56 @@ def to_api_path(dw_path, root_dir=''):
 
 
 def to_dw_path(path, root_dir='', prefix=''):
-    path = normalize_path(path)
-    if path == prefix:
-        path = root_dir
-    else:
-        path = normalize_path(
-            root_dir, relative_path(path, prefix))
+    key = (path, root_dir, prefix)
+    parsed = _DW_PATHS.get(key)
+    if parsed is None:
+        path = normalize_path(path)
+        if path == prefix:
+            path = root_dir
+        else:
+            path = normalize_path(
+                root_dir, relative_path(path, prefix))
+        parsed = _memoize(_DW_PATHS, key, DwPath.parse(path))
+    return parsed
+
+
+def _memoize(cache, key, value):
+    if len(cache) >= PATH_CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
+    return value
+
 
-    path_parts = path.split('/', 2)
+class DwPath(namedtuple('DwPath', ['owner', 'dataset_id', 'file_path'])):
+    """Parsed data.world path (``owner/dataset_id/file_path``)
 
-    owner = path_parts[0] if path_parts[0] != '' else None
-    dataset_id = path_parts[1] if len(path_parts) > 1 else None
-    file_path = path_parts[2] if len(path_parts) > 2 else None
+    Unpacks like the ``(owner, dataset_id, file_path)`` tuples it
+    replaces. Use ``DwPath.parse`` to share parsed paths.
+    """
+    __slots__ = ()
 
-    return owner, dataset_id, file_path
+    @classmethod
+    def parse(cls, path):
+        parsed = _PATHS.get(path)
+        if parsed is None:
+            parts = normalize_path(path).split('/', 2)
+            parsed = _memoize(_PATHS, path, cls(
+                parts[0] if parts[0] != '' else None,
+                parts[1] if len(parts) > 1 else None,
+                parts[2] if len(parts) > 2 else None))
+        return parsed
+
+
+PATH_CACHE_SIZE = 4096
+_PATHS = {}
+_DW_PATHS = {}
+_PARENTS = {}
+_DIRS = {}
+
+
+def token_key(api_token):
+    """Key identifying an API token, without keeping the token itself"""
+    return hashlib.sha256(api_token.encode('utf-8')).hexdigest()
 
 
 def to_nb_json(content, version_specific=False):
@@ -95,43 +142,297 @@ def unique_justseen(iterable, key=None):
     return (next(v) for k, v in groups)
 
 
+def approx_size(obj):
+    """Rough estimate of the memory used by JSON-like data, in bytes"""
+    size = 0
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, dict):
+            size += 64 + 16 * len(current)
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple)):
+            size += 56 + 8 * len(current)
+            pending.extend(current)
+        elif isinstance(current, (str, bytes)):
+            size += 49 + len(current)
+        elif hasattr(current, '__iter__') and hasattr(current, '__len__'):
+            # Other containers (e.g. sets or catalogs)
+            size += 56 + 8 * len(current)
+            pending.extend(current)
+        else:
+            size += 24
+    return size
+
+
 class MWT(object):
-    """Memoize With Timeout"""
+    """Memoize With Timeout
+
+    Entries are scoped by the first argument of the memoized function
+    (i.e. ``self`` for methods). Scopes with a ``cache_quota`` attribute
+    are limited to about that many bytes of cached results, evicting their
+    oldest entries first. Scopes with a ``cache_timeout`` attribute keep
+    results for that many seconds instead of the decorator's timeout.
+
+    Results that timed out less than ``grace`` seconds ago (or the scope's
+    ``cache_grace``) are still returned, while a single background call
+    refreshes them.
+    """
     _caches = {}
     _timeouts = {}
+    _usage = {}
+    _refreshing = set()
+    _generation = [0]  # Bumped when all scopes are invalidated
+    _scope_generations = {}
+    _counters = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'refreshes': 0,
+                 'refresh_errors': 0}
+    _executor = None
+    _lock = threading.RLock()
 
-    def __init__(self, timeout=2):
+    def __init__(self, timeout=2, grace=0):
         self.timeout = timeout
+        self.grace = grace
+
+    @classmethod
+    def stats(cls):
+        """Number of hits, misses and stale hits, across all caches"""
+        with cls._lock:
+            return dict(cls._counters)
 
     def collect(self):
         """Clear cache of results which have timed out"""
-        for func in self._caches:
-            cache = {}
-            for key in self._caches[func]:
-                if ((time.time() - self._caches[func][key][1]) <
-                        self._timeouts[func]):
-                    cache[key] = self._caches[func][key]
-            self._caches[func] = cache
-
-    def invalidate(self):
-        for func in self._caches:
-            self._caches[func].clear()
+        with self._lock:
+            for func in self._caches:
+                for key, v in list(self._caches[func].items()):
+                    if (time.time() - v[1]) >= self._timeouts[func]:
+                        self._evict(func, key)
+
+    def invalidate(self, scope=None, name=None, predicate=None,
+                   older_than=None):
+        """Clear cached results, optionally only some of them
+
+        :param scope: Only clear results for this scope
+        :param name: Only clear results of the function with this name
+        :type name: str
+        :param predicate: Only clear results for which this returns True,
+            given the function's arguments (excluding the scope)
+        :type predicate: callable
+        :param older_than: Only clear results older than this many seconds
+        :type older_than: float
+        """
+        with self._lock:
+            # Background refreshes started before now must not be stored
+            if scope is None:
+                self._generation[0] += 1
+            else:
+                self._scope_generations[scope] = \
+                    self._scope_generations.get(scope, 0) + 1
+            if (scope is None and name is None and predicate is None and
+                    older_than is None):
+                for func in self._caches:
+                    self._caches[func].clear()
+                self._usage.clear()
+                return
+
+            now = time.time()
+            for func in self._caches:
+                if name is not None and func.__name__ != name:
+                    continue
+                for key, v in list(self._caches[func].items()):
+                    if ((scope is None or self._scope(key) is scope) and
+                            (predicate is None or predicate(key[0][1:])) and
+                            (older_than is None or
+                             now - v[1] > older_than)):
+                        self._evict(func, key)
 
     def __call__(self, f):
         self.cache = self._caches[f] = {}
         self._timeouts[f] = self.timeout
 
+        def limits(scope):
+            timeout = getattr(scope, 'cache_timeout', None)
+            grace = getattr(scope, 'cache_grace', None)
+            return (timeout if timeout is not None else self.timeout,
+                    grace if grace is not None else self.grace)
+
         def func(*args, **kwargs):
             kw = sorted(kwargs.items())
             key = (args, tuple(kw))
-            try:
-                v = self.cache[key]
-                if (time.time() - v[1]) > self.timeout:
-                    raise KeyError
-            except KeyError:
-                v = self.cache[key] = f(*args, **kwargs), time.time()
+            scope = args[0] if len(args) > 0 else None
+            timeout, grace = limits(scope)
+            v = self.cache.get(key)
+            if v is not None:
+                age = time.time() - v[1]
+                if age <= timeout:
+                    self._count('hits')
+                    return v[0]
+                if age <= timeout + grace:
+                    self._count('stale_hits')
+                    self._refresh(f, key, args, kwargs)
+                    return v[0]
+
+            self._count('misses')
+            v = f(*args, **kwargs), time.time()
+            self._store(f, key, v)
             return v[0]
 
+        def peek(*args, **kwargs):
+            """Cached result, or None, without ever calling the function"""
+            v = self.cache.get((args, tuple(sorted(kwargs.items()))))
+            if v is None:
+                return None
+            timeout, grace = limits(args[0] if len(args) > 0 else None)
+            return v[0] if time.time() - v[1] <= timeout + grace else None
+
         func.func_name = f.__name__
+        func.peek = peek
 
         return func
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _refresh(self, f, key, args, kwargs):
+        with self._lock:
+            if (f, key) in self._refreshing:
+                return
+            self._refreshing.add((f, key))
+            generation = self._generation_of(self._scope(key))
+            if MWT._executor is None:
+                MWT._executor = ThreadPoolExecutor(max_workers=4)
+
+        def refresh():
+            try:
+                v = f(*args, **kwargs), time.time()
+                with self._lock:
+                    if self._generation_of(self._scope(key)) == generation:
+                        self._store(f, key, v)
+                    self._counters['refreshes'] += 1
+            except Exception as e:
+                self._count('refresh_errors')
+                logging.getLogger('dwcontents').debug(
+                    '[MWT] Unable to refresh %s: %s', f.__name__, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard((f, key))
+
+        MWT._executor.submit(refresh)
+
+    def _store(self, f, key, v):
+        scope = self._scope(key)
+        quota = getattr(scope, 'cache_quota', None)
+        with self._lock:
+            self._evict(f, key)
+            if quota is None:
+                self.cache[key] = v
+                return
+
+            size = approx_size(v[0])
+            if size > quota:
+                return
+            self.cache[key] = v + (size,)
+            usage = self._usage[scope] = self._usage.get(scope, 0) + size
+            if usage > quota:
+                entries = sorted(
+                    ((cache_v[1], func, cache_key)
+                     for func, cache in self._caches.items()
+                     for cache_key, cache_v in cache.items()
+                     if self._scope(cache_key) is scope),
+                    key=lambda e: e[0])
+                for _, func, cache_key in entries:
+                    if self._usage.get(scope, 0) <= quota:
+                        break
+                    self._evict(func, cache_key)
+
+    def _evict(self, func, key):
+        v = self._caches[func].pop(key, None)
+        if v is not None and len(v) > 2:
+            scope = self._scope(key)
+            self._usage[scope] = self._usage.get(scope, 0) - v[2]
+            if self._usage[scope] <= 0:
+                del self._usage[scope]
+
+    def _generation_of(self, scope):
+        return self._generation[0], self._scope_generations.get(scope, 0)
+
+    @staticmethod
+    def _scope(key):
+        args = key[0]
+        return args[0] if len(args) > 0 else None
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache bounded by item count and total size
+
+    :param max_items: Maximum number of entries kept
+    :type max_items: int
+    :param max_bytes: Maximum total size of the entries kept
+    :type max_bytes: int
+    :param sizeof: Function returning the size of a cached value
+    :type sizeof: callable
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, sizeof=len):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                return default
+            self._entries[key] = value, size
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            self.pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False
+            self._entries[key] = value, size
+            self.total_bytes += size
+            self._evict()
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                return default
+            self.total_bytes -= size
+            return value
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _evict(self):
+        while self._entries and (
+                (self.max_items is not None and
+                 len(self._entries) > self.max_items) or
+                (self.max_bytes is not None and
+                 self.total_bytes > self.max_bytes)):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
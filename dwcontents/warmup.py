@@ -0,0 +1,89 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from builtins import str
+
+from dwcontents.tracing import span
+
+str('Use str() once to force PyCharm to keep import')
+
+
+class WarmUp(object):
+    """Fills caches in the background, ahead of the first requests
+
+    Fetches the user's identity, their list of datasets and the most
+    recently updated datasets.
+
+    :param api: API client
+    :type api: dwcontents.api.DwContentsApi
+    :param max_datasets: Number of recently updated datasets to fetch
+    :type max_datasets: int
+    :param on_dataset: Called with each dataset fetched
+    :type on_dataset: callable
+    """
+
+    def __init__(self, api, max_datasets=5, on_dataset=None, logger=None):
+        self.api = api
+        self.max_datasets = max_datasets
+        self.on_dataset = on_dataset
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self.datasets = 0
+        self.elapsed = None
+        self.done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run,
+                                            name='dwcontents-warm-up')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def run(self):
+        start = time.time()
+        listed = 0
+        try:
+            with span('warm_up') as warming:
+                self.api.get_me()
+                datasets = self.api.get_datasets()
+                listed = len(datasets)
+                recent = sorted(datasets, key=lambda d: d.get('updated', ''),
+                                reverse=True)[:self.max_datasets]
+                for d in recent:
+                    dataset = self.api.get_dataset(d['owner'], d['id'])
+                    if dataset is not None:
+                        self.datasets += 1
+                        if self.on_dataset is not None:
+                            self.on_dataset(dataset)
+                warming.set('datasets', self.datasets)
+        except Exception as e:
+            self.log.warning('[warm_up] Unable to complete: %s', e)
+        finally:
+            self.elapsed = time.time() - start
+            self.done.set()
+
+        self.log.info('[warm_up] Listed %s datasets and fetched %s of the '
+                      'most recent in %.2fs', listed, self.datasets,
+                      self.elapsed)
@@ -0,0 +1,166 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from __future__ import unicode_literals
+
+import json
+import logging
+import multiprocessing
+import threading
+from builtins import str
+from concurrent.futures import ProcessPoolExecutor
+
+from nbformat import validate, ValidationError
+from nbformat.sign import NotebookNotary
+from tornado.ioloop import IOLoop
+
+from dwcontents.tracing import span
+from dwcontents.utils import to_nb_json
+
+try:
+    from asyncio import _get_running_loop
+except ImportError:  # Python < 3.5.3
+    _get_running_loop = None
+
+str('Use str() once to force PyCharm to keep import')
+
+DEFAULT_THRESHOLD = 8 * 1024 * 1024
+
+
+def on_io_loop():
+    """Whether the current thread is running an IO loop"""
+    if _get_running_loop is not None:
+        return _get_running_loop() is not None
+    return IOLoop.current(instance=False) is not None
+
+
+def validation_message(nb):
+    """Message added to notebook models failing validation, if any"""
+    try:
+        validate(nb)
+    except ValidationError as e:
+        return 'Notebook validation failed: {}:\n{}'.format(
+            e.message, json.dumps(e.instance, indent=1,
+                                  default=lambda obj: '<UNKNOWN>'))
+    return None
+
+
+def decode_notebook(data, secret, algorithm):
+    """Parse, convert and validate a notebook and compute its signature
+
+    :returns: ``(notebook, validation message, signature)``
+    :rtype: tuple
+    """
+    nb = to_nb_json(json.loads(data.decode('utf-8')), version_specific=True)
+    signature = None
+    if secret is not None and nb.nbformat >= 3:
+        signature = NotebookNotary(
+            secret=secret, algorithm=algorithm).compute_signature(nb)
+    return nb, validation_message(nb), signature
+
+
+def encode_notebook(content, secret, algorithm):
+    """Serialize a notebook and compute its signature if it is trusted
+
+    :returns: ``(bytes, signature)``, signature is None if untrusted
+    :rtype: tuple
+    """
+    signature = None
+    if secret is not None:
+        nb = to_nb_json(content)
+        notary = NotebookNotary(secret=secret, algorithm=algorithm)
+        if nb.nbformat >= 3 and notary.check_cells(nb):
+            signature = notary.compute_signature(nb)
+    return json.dumps(content).encode('utf-8'), signature
+
+
+class NotebookWorkers(object):
+    """Process pool for CPU-bound work on large notebooks
+
+    Decoding, validating, signing and encoding large notebooks holds the
+    GIL for long enough to stall every other thread of the process.
+    Notebooks of at least ``threshold`` bytes are handled in worker
+    processes instead, when that work is done off the IO loop (e.g. by
+    ``ThreadedContentsHandler``). Callers wait for the results, so an IO
+    loop would be held up at least as long: notebooks are handled in the
+    calling thread there.
+
+    :param max_workers: Number of worker processes
+    :type max_workers: int
+    :param threshold: Size of the smallest notebooks handled by workers
+    :type threshold: int
+    """
+
+    def __init__(self, max_workers=2, threshold=DEFAULT_THRESHOLD,
+                 logger=None):
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.log = (logger
+                    if logger is not None else logging.getLogger('dwcontents'))
+        self.offloaded = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def handles(self, size):
+        """Whether a notebook of size bytes is handled by workers, when
+        called from the current thread"""
+        return (size is not None and size >= self.threshold and
+                not on_io_loop())
+
+    def decode(self, data, notary=None):
+        """Decode a notebook in a worker, see ``decode_notebook``"""
+        with span('workers.decode', bytes=len(data)):
+            return self._run(decode_notebook, data, *_signing_key(notary))
+
+    def encode(self, content, notary=None):
+        """Encode a notebook in a worker, see ``encode_notebook``"""
+        with span('workers.encode'):
+            return self._run(encode_notebook, content,
+                             *_signing_key(notary))
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _run(self, fn, *args):
+        self.offloaded += 1
+        return self._executor().submit(fn, *args).result()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self.log.debug('[workers] Starting %s notebook workers',
+                               self.max_workers)
+                try:
+                    # Forking a threaded server isn't safe
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'))
+                except (TypeError, AttributeError):  # Python < 3.7
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers)
+            return self._pool
+
+
+def _signing_key(notary):
+    # Signatures can only be checked and stored with a signature store
+    if notary is None or getattr(notary, 'store', None) is None:
+        return None, None
+    return notary.secret, notary.algorithm
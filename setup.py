@@ -67,10 +67,11 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
     install_requires=[
-        'backoff>=1.3.0,<2.0a',
+        'backoff>=1.5.0,<2.0a',
         'certifi>=2017.04.17',
         'datadotworld>=1.1.0,<2.0a',
         'flake8>=2.6.0,<4.0a',
+        'futures>=3.0.0,<4.0a; python_version<"3.0"',
         'ipython>=4.0,<=6.0a',
         'notebook>=4.0,<=6.0a',
         'requests>=2.0.0,<3.0a',
@@ -91,6 +92,12 @@ setup(
         'pandas': [
             'pandas<1.0a',
         ],
+        'streaming': [
+            'ijson>=3.1',
+        ],
+        'tracing': [
+            'opentelemetry-api>=1.0.0',
+        ],
     },
     entry_points={
         'console_scripts': [
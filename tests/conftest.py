@@ -20,12 +20,17 @@
 import copy
 import datetime
 import json
+import threading
 from collections import namedtuple
 from itertools import groupby
 
+from nbformat.sign import NotebookNotary, MemorySignatureStore
 from pytest import fixture
+from tornado.web import HTTPError
 
 from dwcontents.api import DwContentsApi
+from dwcontents.catalog import Catalog
+from dwcontents.contents import DwContents
 from dwcontents.utils import split_parent
 
 
@@ -41,6 +46,7 @@ class InMemDwContentsApi(DwContentsApi):
             'status': 'LOADED'
         }
         self.file_data = {}
+        self.lock = threading.RLock()
 
     def delete_subdirectory(self, owner, dataset_id, directory_name):
         directory_name = (directory_name
@@ -55,15 +61,26 @@ class InMemDwContentsApi(DwContentsApi):
         self.dataset['files'] = remaining
 
     def delete_file(self, owner, dataset_id, file_name):
-        self.dataset['files'] = [
-            f for f in self.dataset.get('files', [])
-            if f['name'] != file_name]
+        with self.lock:
+            self.dataset['files'] = [
+                f for f in self.dataset.get('files', [])
+                if f['name'] != file_name]
+
+    def delete_files(self, owner, dataset_id, file_names):
+        for file_name in file_names:
+            self.delete_file(owner, dataset_id, file_name)
 
     def get_dataset(self, owner, dataset_id):
         return self.dataset_nodummies
 
     def get_datasets(self):
-        return [self.dataset_nodummies]
+        return self.list_datasets()
+
+    def cached_datasets(self):
+        return self.list_datasets()
+
+    def list_datasets(self):
+        return Catalog([self.dataset_nodummies])
 
     def get_file(self, owner, dataset_id, file_name, format='json'):
         Response = namedtuple('Response', ['json', 'content'])
@@ -71,6 +88,19 @@ class InMemDwContentsApi(DwContentsApi):
             json=lambda: json.loads(self.file_data[file_name].decode('utf-8')),
             content=self.file_data[file_name]), format)
 
+    def download_file(self, owner, dataset_id, file_name):
+        if file_name not in self.file_data:
+            raise HTTPError(404, 'Not found')
+        return self.file_data[file_name]
+
+    def get_file_head(self, owner, dataset_id, file_name, max_bytes):
+        return self.file_data[file_name][:max_bytes]
+
+    def stream_file(self, owner, dataset_id, file_name, chunk_size=1024):
+        data = self.file_data[file_name]
+        return (data[i:i + chunk_size]
+                for i in range(0, len(data), chunk_size))
+
     def get_me(self):
         return {'id': 'testy-tester'}
 
@@ -78,16 +108,31 @@ class InMemDwContentsApi(DwContentsApi):
         return {'id': user}
 
     def upload_file(self, owner, dataset_id, file_name, data):
-        self.delete_file(owner, dataset_id, file_name)
-        self.dataset['files'] = (
-            self.dataset.get('files', []) +
-            [{'name': file_name,
-              'sizeInBytes': 10,
-              'created': datetime.datetime.now().isoformat(),
-              'updated': datetime.datetime.now().isoformat()}])
-        self.file_data[file_name] = data
+        self.put_file(owner, dataset_id, file_name, data)
+        return self.dataset
+
+    def upload_files(self, owner, dataset_id, files):
+        self.put_files(owner, dataset_id, files)
         return self.dataset
 
+    def put_files(self, owner, dataset_id, files, max_workers=1):
+        files = files.items() if isinstance(files, dict) else files
+        for file_name, data in files:
+            self.put_file(owner, dataset_id, file_name, data)
+
+    def put_file(self, owner, dataset_id, file_name, data):
+        if hasattr(data, 'read'):
+            data = data.read()
+        with self.lock:
+            self.delete_file(owner, dataset_id, file_name)
+            self.dataset['files'] = (
+                self.dataset.get('files', []) +
+                [{'name': file_name,
+                  'sizeInBytes': 10,
+                  'created': datetime.datetime.now().isoformat(),
+                  'updated': datetime.datetime.now().isoformat()}])
+            self.file_data[file_name] = data
+
     @property
     def dataset_nodummies(self):
         ds_nd = copy.copy(self.dataset)
@@ -109,3 +154,28 @@ class InMemDwContentsApi(DwContentsApi):
 @fixture(scope='class')
 def api_class(request):
     request.cls.api_class = InMemDwContentsApi
+
+
+@fixture()
+def api():
+    return InMemDwContentsApi()
+
+
+@fixture()
+def contents_config():
+    """Traits of the ``contents`` fixture, override in test modules"""
+    return {}
+
+
+@fixture()
+def contents(api, contents_config):
+    cm = DwContents(root_dir='testy-tester/jupyter', api=api,
+                    **contents_config)
+    cm.notary = NotebookNotary(secret=b'secret',
+                               store_factory=MemorySignatureStore)
+    yield cm
+    if cm.prefetcher is not None:
+        cm.prefetcher.shutdown()
+    if cm.workers is not None:
+        cm.workers.shutdown()
+    cm.uploads.stop()
@@ -0,0 +1,171 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import json
+import re
+import threading
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, has_length, contains_inanyorder
+
+from dwcontents import api as api_module
+from dwcontents.api import DwContentsApi
+from dwcontents.ratelimit import RateLimiter
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Just enough of data.world's API to upload files"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(('GET', self.path))
+            body = json.dumps({
+                'owner': 'o', 'id': 'd',
+                'files': [{'name': name, 'sizeInBytes': len(data)}
+                          for name, data in sorted(server.files.items())]
+            }).encode('utf-8')
+        self._respond(200, body)
+
+    def do_PUT(self):
+        data = self._read()
+        with self.server.lock:
+            self.server.requests.append(('PUT', self.path))
+            self.server.files[self.path.rsplit('/', 1)[1]] = data
+        self._respond(200, b'{}')
+
+    def do_POST(self):
+        boundary = self.headers['Content-Type'].split('boundary=')[1]
+        parts = self._read().split(
+            b'--' + boundary.encode('ascii'))[1:-1]
+        with self.server.lock:
+            self.server.requests.append(('POST', self.path))
+            for part in parts:
+                headers, data = part.split(b'\r\n\r\n', 1)
+                file_name = re.search(b'filename="([^"]*)"', headers)
+                self.server.files[file_name.group(1).decode('utf-8')] = \
+                    data[:-len(b'\r\n')]
+        self._respond(200, b'{}')
+
+    def log_message(self, *args):
+        pass
+
+    def _read(self):
+        return self.rfile.read(int(self.headers['Content-Length']))
+
+    def _respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.files = {}
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api(server):
+    return DwContentsApi(
+        'token', rate_limiter=RateLimiter(rate=1000.0, burst=1000),
+        base_url='http://127.0.0.1:{}/v0/'.format(server.server_address[1]))
+
+
+def methods(server):
+    return [method for method, _ in server.requests]
+
+
+def test_upload_files_batched(api, server, monkeypatch):
+    monkeypatch.setattr(api_module, 'UPLOAD_BATCH_SIZE', 4)
+    files = {'file{}.txt'.format(i): 'data {}'.format(i).encode('utf-8')
+             for i in range(10)}
+
+    dataset = api.upload_files('o', 'd', files)
+
+    assert_that(server.files, equal_to(files))
+    assert_that(methods(server),
+                contains_inanyorder('POST', 'POST', 'POST', 'GET'))
+    assert_that(methods(server)[-1], equal_to('GET'))
+    assert_that(server.requests[0][1],
+                equal_to('/v0/uploads/o/d/files'))
+    assert_that(dataset['files'], has_length(10))
+
+
+def test_upload_files_large_alone(api, server, monkeypatch):
+    monkeypatch.setattr(api_module, 'UPLOAD_BATCH_BYTES', 8)
+    files = [('small1.txt', b'abc'), ('big.bin', b'0123456789'),
+             ('small2.txt', b'def')]
+
+    api.upload_files('o', 'd', files)
+
+    assert_that(server.files, equal_to(dict(files)))
+    assert_that(sorted(server.requests[:-1]),
+                equal_to([('POST', '/v0/uploads/o/d/files'),
+                          ('PUT', '/v0/uploads/o/d/files/big.bin')]))
+    assert_that(server.requests[-1],
+                equal_to(('GET', '/v0/datasets/o/d')))
+
+
+def test_upload_files_single_request_each(api, server):
+    api.upload_files('o', 'd', {'only.txt': b'x'})
+
+    assert_that(server.requests,
+                equal_to([('PUT', '/v0/uploads/o/d/files/only.txt'),
+                          ('GET', '/v0/datasets/o/d')]))
+
+
+def test_upload_files_refreshes_after_failure(api, server, monkeypatch):
+    monkeypatch.setattr(api_module, 'UPLOAD_BATCH_SIZE', 1)
+    assert_that(api.get_dataset('o', 'd')['files'], has_length(0))
+    put_file = api.put_file
+
+    def failing_put_file(owner, dataset_id, file_name, data):
+        if file_name == 'bad.txt':
+            raise IOError('Boom')
+        put_file(owner, dataset_id, file_name, data)
+
+    api.put_file = failing_put_file
+    with pytest.raises(IOError):
+        api.upload_files('o', 'd', [('good.txt', b'x'), ('bad.txt', b'y')],
+                         max_workers=1)
+
+    assert_that([f['name'] for f in api.get_dataset('o', 'd')['files']],
+                equal_to(['good.txt']))
@@ -0,0 +1,147 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import io
+import json
+
+from doublex import assert_that
+from hamcrest import equal_to, has_length, contains_exactly, \
+    none
+from requests import Response
+from requests.adapters import BaseAdapter
+
+from conftest import InMemDwContentsApi
+from dwcontents.api import DwContentsApi
+from dwcontents.catalog import Catalog
+from dwcontents.contents import DwContents
+from dwcontents.models import DwMapper
+from dwcontents.ratelimit import RateLimiter
+
+
+def dataset(owner, dataset_id, created='2018-01-01', updated='2018-02-01'):
+    return {'owner': owner, 'id': dataset_id, 'accessLevel': 'READ',
+            'created': created, 'updated': updated}
+
+
+class PagedAdapter(BaseAdapter):
+    def __init__(self, scopes):
+        self.scopes = scopes
+        self.requests = 0
+        super(PagedAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        scope = request.path_url.split('?')[0].rsplit('/', 1)[-1]
+        pages = self.scopes.get(scope, [[]])
+        page_number = (int(request.path_url.split('next=')[1])
+                       if 'next=' in request.path_url else 0)
+        page = {'records': pages[page_number]}
+        if page_number + 1 < len(pages):
+            page['nextPageToken'] = str(page_number + 1)
+
+        resp = Response()
+        resp.status_code = 200
+        resp.raw = io.BytesIO(json.dumps(page).encode('utf-8'))
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_duplicates_are_kept_once():
+    catalog = Catalog([dataset('a', 'x'), dataset('b', 'y'),
+                       dataset('a', 'x')])
+    assert_that(catalog, has_length(2))
+    assert_that(catalog.add(dataset('b', 'y')), equal_to(False))
+    assert_that(catalog.owners(), equal_to(['a', 'b']))
+
+
+def test_indexed_by_owner_and_key():
+    catalog = Catalog([dataset('a', 'x'), dataset('b', 'x'),
+                       dataset('a', 'y')])
+    assert_that([d['id'] for d in catalog.account('a')],
+                equal_to(['x', 'y']))
+    assert_that(catalog.account('c'), equal_to([]))
+    assert_that(catalog.dataset('b', 'x'), equal_to(dataset('b', 'x')))
+    assert_that(catalog.dataset('b', 'y'), none())
+
+
+def test_account_dates_are_folded():
+    catalog = Catalog([
+        dataset('a', 'x', created='2018-01-02', updated='2018-01-03'),
+        dataset('a', 'y', created='2018-01-01', updated='2018-01-02'),
+        dataset('a', 'z', created='2018-01-03', updated='2018-01-05')])
+    assert_that(catalog.dates['a'], equal_to({
+        'created': '2018-01-01', 'last_modified': '2018-01-05'}))
+
+
+def test_accounts_match_account_listings():
+    datasets = [dataset('b', 'x', updated='2018-03-01'), dataset('a', 'y'),
+                dataset('b', 'z', created='2017-01-01')]
+    mapper = DwMapper()
+
+    accounts = mapper.map_accounts(Catalog(datasets))
+    assert_that(accounts, equal_to([
+        mapper.map_account('a', [datasets[1]]),
+        mapper.map_account('b', [datasets[0], datasets[2]])]))
+    assert_that(mapper.map_accounts(datasets), equal_to(accounts))
+
+
+def test_pages_are_streamed_into_catalog():
+    adapter = PagedAdapter({
+        'own': [[dataset('a', 'x'), dataset('a', 'y')],
+                [dataset('a', 'z')]],
+        'contributing': [[dataset('b', 'x')]],
+        'liked': [[dataset('a', 'x'), dataset('c', 'x')]]})
+    api = DwContentsApi('test-catalog-token', adapter=adapter,
+                        rate_limiter=RateLimiter(rate=1000, burst=1000))
+
+    catalog = api.list_datasets()
+    assert_that(adapter.requests, equal_to(4))
+    assert_that(catalog.owners(), equal_to(['a', 'b', 'c']))
+    assert_that([d['id'] for d in catalog.accounts['a']],
+                contains_exactly('x', 'y', 'z'))
+
+
+def test_listings_read_from_catalog():
+    api = InMemDwContentsApi()
+    cm = DwContents(api=api)
+    api.get_user = None  # Must not be needed
+    api.get_dataset = None
+
+    assert_that(cm.dir_exists('testy-tester'), equal_to(True))
+    assert_that(cm.dir_exists('testy-tester/jupyter'), equal_to(True))
+    account = cm.get('testy-tester', type='directory')
+    assert_that([d['name'] for d in account['content']],
+                equal_to(['jupyter']))
+
+
+def test_cold_checks_dont_list_datasets():
+    adapter = PagedAdapter({'own': [[dataset('a', 'x')]]})
+    api = DwContentsApi('test-cold-token', adapter=adapter,
+                        rate_limiter=RateLimiter(rate=1000, burst=1000))
+    cm = DwContents(api=api)
+
+    assert_that(api.cached_datasets(), none())
+    assert_that(cm.dir_exists('a'), equal_to(True))
+    assert_that(adapter.requests, equal_to(1))  # get_user
+
+    api.get_datasets()
+    assert_that(adapter.requests, equal_to(4))
+    assert_that(cm.dir_exists('a'), equal_to(True))
+    assert_that(adapter.requests, equal_to(4))
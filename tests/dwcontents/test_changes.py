@@ -0,0 +1,77 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from doublex import assert_that
+from hamcrest import equal_to, contains, empty
+
+from dwcontents.changes import ChangePoller
+from dwcontents.utils import MWT
+
+
+class StampedApi(object):
+    def __init__(self):
+        self.stamps = {('owner', 'a'): '1', ('owner', 'b'): '1'}
+        self.fetched = []
+        self.cache_timeout = 3600
+
+    def list_datasets(self):
+        return [{'owner': owner, 'id': dataset_id, 'updated': updated}
+                for (owner, dataset_id), updated in self.stamps.items()]
+
+    @MWT(timeout=0)
+    def get_dataset(self, owner, dataset_id):
+        self.fetched.append(dataset_id)
+        return {'owner': owner, 'id': dataset_id,
+                'updated': self.stamps.get((owner, dataset_id))}
+
+
+def test_scope_cache_timeout():
+    api = StampedApi()
+    api.get_dataset('owner', 'a')
+    api.get_dataset('owner', 'a')
+
+    assert_that(api.fetched, equal_to(['a']))
+
+
+def test_only_changed_datasets_invalidated():
+    api = StampedApi()
+    poller = ChangePoller(api)
+    assert_that(poller.poll(), empty())
+    api.get_dataset('owner', 'a')
+    api.get_dataset('owner', 'b')
+
+    api.stamps[('owner', 'a')] = '2'
+    assert_that(poller.poll(), contains(('owner', 'a')))
+    assert_that(api.get_dataset('owner', 'a')['updated'], equal_to('2'))
+    api.get_dataset('owner', 'b')
+
+    assert_that(api.fetched, equal_to(['a', 'b', 'a']))
+
+
+def test_listeners_notified_of_removals():
+    api = StampedApi()
+    notified = []
+    poller = ChangePoller(api, listeners=[notified.append])
+    poller.poll()
+    poller.poll()
+
+    del api.stamps[('owner', 'b')]
+    poller.poll()
+
+    assert_that(notified, equal_to([[('owner', 'b')]]))
+    assert_that(poller.changes, equal_to(1))
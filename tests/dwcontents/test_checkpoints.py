@@ -0,0 +1,117 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import os
+
+from doublex import assert_that
+from hamcrest import equal_to, has_length, contains_string
+from nbformat.v4 import new_notebook, new_code_cell
+from pytest import fixture
+
+from conftest import InMemDwContentsApi
+from dwcontents.checkpoints import DwCheckpoints
+
+
+@fixture()
+def contents(contents, tmpdir):
+    contents.checkpoints = DwCheckpoints(parent=contents,
+                                         root_dir=str(tmpdir))
+    return contents
+
+
+def text_model(content):
+    return {'type': 'file', 'format': 'text', 'content': content}
+
+
+def objects(checkpoints):
+    return [name for _, _, names in os.walk(
+        os.path.join(checkpoints.namespace_dir, 'objects'))
+            for name in names]
+
+
+def test_namespace(contents):
+    assert_that(contents.checkpoints.namespace_dir,
+                contains_string('testy-tester'))
+
+
+def test_checkpoint_reuses_saved_bytes(api, contents):
+    contents.save(text_model('hello'), 'a.txt')
+    api.get_file = None  # Must not download
+
+    contents.create_checkpoint('a.txt')
+    contents.save(text_model('changed'), 'a.txt')
+    api.get_file = InMemDwContentsApi.get_file.__get__(api)
+
+    contents.restore_checkpoint('checkpoint', 'a.txt')
+    assert_that(contents.get('a.txt')['content'], equal_to('hello'))
+
+
+def test_notebook_checkpoint(contents):
+    nb = new_notebook(cells=[new_code_cell('1 + 1')])
+    contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+    contents.create_checkpoint('nb.ipynb')
+
+    checkpoint = contents.checkpoints.get_notebook_checkpoint(
+        'checkpoint', 'nb.ipynb')
+    assert_that(checkpoint['content'].cells[0].source, equal_to('1 + 1'))
+
+
+def test_identical_content_is_stored_once(contents):
+    contents.save(text_model('same'), 'a.txt')
+    contents.save(text_model('same'), 'b.txt')
+    contents.create_checkpoint('a.txt')
+    contents.create_checkpoint('b.txt')
+
+    assert_that(objects(contents.checkpoints), has_length(1))
+    assert_that(contents.list_checkpoints('b.txt'), has_length(1))
+
+
+def test_max_bytes_evicts_oldest(contents):
+    contents.checkpoints.max_bytes = 10
+    contents.save(text_model('0123456789'), 'a.txt')
+    contents.save(text_model('abcdefghij'), 'b.txt')
+    contents.create_checkpoint('a.txt')
+    contents.create_checkpoint('b.txt')
+
+    assert_that(contents.list_checkpoints('a.txt'), has_length(0))
+    assert_that(contents.list_checkpoints('b.txt'), has_length(1))
+    assert_that(objects(contents.checkpoints), has_length(1))
+
+
+def test_max_age_discards_expired(contents):
+    contents.save(text_model('old'), 'a.txt')
+    contents.create_checkpoint('a.txt')
+    contents.checkpoints._get_index()['a.txt']['last_modified'] = 0
+
+    contents.save(text_model('new'), 'b.txt')
+    contents.create_checkpoint('b.txt')
+
+    assert_that(contents.list_checkpoints('a.txt'), has_length(0))
+
+
+def test_rename_and_delete(contents):
+    contents.save(text_model('x'), 'a.txt')
+    contents.create_checkpoint('a.txt')
+    contents.rename('a.txt', 'c.txt')
+
+    assert_that(contents.list_checkpoints('a.txt'), has_length(0))
+    assert_that(contents.list_checkpoints('c.txt'), has_length(1))
+
+    contents.delete('c.txt')
+    assert_that(contents.list_checkpoints('c.txt'), has_length(0))
+    assert_that(objects(contents.checkpoints), has_length(0))
@@ -0,0 +1,129 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import io
+
+import requests
+from doublex import assert_that
+from hamcrest import equal_to, less_than_or_equal_to, none, calling, raises, \
+    has_length, has_property
+from pytest import raises as pytest_raises
+from requests import Response
+from requests.adapters import BaseAdapter
+from tornado.web import HTTPError
+
+from dwcontents import api as api_module, deadline
+from dwcontents.api import BackoffAdapter, map_exceptions
+from dwcontents.deadline import Deadline, DeadlineExceeded
+from dwcontents.ratelimit import RateLimiter
+
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.timeouts = []
+        super(RecordingAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        self.timeouts.append(kwargs.get('timeout'))
+        resp = Response()
+        resp.status_code = self.status_code
+        resp.headers.update(self.headers)
+        resp.raw = io.BytesIO(b'')
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_no_deadline():
+    assert_that(deadline.remaining(), none())
+    assert_that(deadline.timeout((10, 60)), equal_to((10, 60)))
+
+
+def test_nested_deadline_keeps_earliest():
+    with Deadline(1):
+        with Deadline(100):
+            assert_that(deadline.remaining(), less_than_or_equal_to(1))
+        with Deadline(None):
+            assert_that(deadline.remaining(), less_than_or_equal_to(1))
+    assert_that(deadline.remaining(), none())
+
+
+def test_timeout_capped_by_deadline():
+    with Deadline(5):
+        connect, read = deadline.timeout((10, 60))
+        assert_that(connect, less_than_or_equal_to(5))
+        assert_that(read, less_than_or_equal_to(5))
+
+
+def test_expired_deadline():
+    with Deadline(0.001) as d:
+        d.expires -= 1
+        assert_that(calling(deadline.timeout).with_args(10),
+                    raises(DeadlineExceeded))
+
+
+def test_adapter_sets_timeouts():
+    transport = RecordingAdapter(200)
+    BackoffAdapter(transport).send(None)
+
+    assert_that(transport.timeouts, equal_to([api_module.TIMEOUT]))
+
+
+def test_backoff_stops_when_budget_spent(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(api_module, 'sleep', sleeps.append)
+    transport = RecordingAdapter(429, {'Retry-After': '30'})
+
+    with Deadline(5):
+        resp = BackoffAdapter(transport).send(None)
+
+    assert_that(resp.status_code, equal_to(429))
+    assert_that(transport.timeouts, has_length(1))
+    assert_that(sleeps, equal_to([]))
+
+
+def test_rate_limiter_gives_up_within_budget():
+    limiter = RateLimiter(rate=0.1, burst=1)
+    limiter.acquire()
+
+    assert_that(calling(limiter.acquire).with_args(timeout=1),
+                raises(DeadlineExceeded))
+    assert_that(limiter.stats()['requests'], equal_to(1))
+
+
+def test_map_exceptions():
+    def failing(e):
+        @map_exceptions
+        def fn():
+            raise e
+        return fn
+
+    with pytest_raises(HTTPError) as timed_out:
+        failing(DeadlineExceeded('slow'))()
+    assert_that(timed_out.value, has_property('status_code', 504))
+
+    with pytest_raises(HTTPError) as read_timeout:
+        failing(requests.ReadTimeout('slow'))()
+    assert_that(read_timeout.value, has_property('status_code', 504))
+
+    with pytest_raises(HTTPError) as unreachable:
+        failing(requests.ConnectionError('down'))()
+    assert_that(unreachable.value, has_property('status_code', 503))
@@ -0,0 +1,128 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import json
+
+from doublex import assert_that
+from hamcrest import equal_to, contains_string
+from jinja2 import DictLoader, Environment
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from conftest import InMemDwContentsApi
+from dwcontents.contents import DwContents
+from dwcontents.handlers import StreamingDownloadHandler, \
+    ThreadedContentsHandler
+from dwcontents.workers import NotebookWorkers
+
+
+class Handler(StreamingDownloadHandler):
+    def get_current_user(self):
+        return 'testy-tester'
+
+
+class ContentsHandler(ThreadedContentsHandler):
+    def get_current_user(self):
+        return 'testy-tester'
+
+
+class ChunkedApi(InMemDwContentsApi):
+    def __init__(self):
+        super(ChunkedApi, self).__init__()
+        self.chunk_sizes = []
+
+    def stream_file(self, owner, dataset_id, file_name, chunk_size=1024):
+        self.chunk_sizes.append(chunk_size)
+        return super(ChunkedApi, self).stream_file(
+            owner, dataset_id, file_name, chunk_size=chunk_size)
+
+
+class TestStreamingDownloads(AsyncHTTPTestCase):
+    def get_app(self):
+        self.api = ChunkedApi()
+        self.api.put_file('testy-tester', 'jupyter', 'data.csv',
+                          b'a,b\n' + b'1,2\n' * 1000)
+        self.api.put_file('testy-tester', 'jupyter', 'image.png',
+                          b'\x89PNG' + b'\x00' * 10)
+        self.api.dataset['files'][0]['sizeInBytes'] = 4004
+        self.api.dataset['files'][1]['sizeInBytes'] = 14
+        self.contents = contents = DwContents(
+            root_dir='testy-tester/jupyter', api=self.api,
+            lean_notebooks=True, lean_output_bytes=100)
+        return Application(
+            [(r'/file_download/(.*)', Handler),
+             (r'/api/contents/(.*)', ContentsHandler)],
+            contents_manager=contents, base_url='/',
+            allow_remote_access=True,
+            jinja2_env=Environment(loader=DictLoader({
+                'error.html': '{{ status_code }}'})))
+
+    def fetch(self, path, **kwargs):
+        # Downloads must come from the same site, like /files
+        return super(TestStreamingDownloads, self).fetch(
+            path, headers={'Referer': self.get_url('/')}, **kwargs)
+
+    def test_streams_raw_bytes(self):
+        resp = self.fetch('/file_download/data.csv')
+        assert_that(resp.code, equal_to(200))
+        assert_that(resp.body, equal_to(b'a,b\n' + b'1,2\n' * 1000))
+        assert_that(resp.headers['Content-Type'],
+                    equal_to('text/csv; charset=UTF-8'))
+        assert_that(resp.headers['Content-Length'], equal_to('4004'))
+        assert_that(len(self.api.chunk_sizes), equal_to(1))
+
+    def test_binary_attachment(self):
+        resp = self.fetch('/file_download/image.png?download=1')
+        assert_that(resp.body, equal_to(b'\x89PNG' + b'\x00' * 10))
+        assert_that(resp.headers['Content-Type'], equal_to('image/png'))
+        assert_that(resp.headers['Content-Disposition'],
+                    contains_string('image.png'))
+
+    def test_missing_file(self):
+        resp = self.fetch('/file_download/missing.csv')
+        assert_that(resp.code, equal_to(404))
+
+    def test_reassembled_notebook(self):
+        nb = new_notebook(cells=[new_code_cell('1 + 1', outputs=[new_output(
+            'display_data', data={'image/png': 'A' * 1000})])])
+        self.contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+
+        resp = self.fetch('/file_download/nb.ipynb')
+        assert_that(resp.code, equal_to(200))
+        restored = json.loads(resp.body.decode('utf-8'))
+        assert_that(restored['cells'][0]['outputs'][0]['data']['image/png'],
+                    equal_to('A' * 1000))
+        assert_that(resp.headers['Content-Length'],
+                    equal_to(str(len(resp.body))))
+
+    def test_contents_off_loop_in_workers(self):
+        self.contents.workers = NotebookWorkers(max_workers=1, threshold=0)
+        self.addCleanup(self.contents.workers.shutdown)
+        nb = new_notebook(cells=[new_code_cell('1 + 1')])
+        resp = self.fetch('/api/contents/nb.ipynb', method='PUT',
+                          body=json.dumps({'type': 'notebook',
+                                           'content': nb}))
+        assert_that(resp.code, equal_to(201))
+
+        resp = self.fetch('/api/contents/nb.ipynb')
+        assert_that(resp.code, equal_to(200))
+        model = json.loads(resp.body.decode('utf-8'))
+        assert_that(model['content']['cells'][0]['source'],
+                    equal_to('1 + 1'))
+        assert_that(self.contents.workers.offloaded, equal_to(2))
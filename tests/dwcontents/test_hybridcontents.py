@@ -30,11 +30,13 @@ from os.path import (
     join as osjoin,
 )
 from posixpath import join as pjoin
+from threading import Event
 from unittest import TestCase
 
 from IPython.utils.tempdir import TemporaryDirectory
 from decorator import contextmanager
 from notebook.services.contents.filemanager import FileContentsManager
+from notebook.services.contents.largefilemanager import LargeFileManager
 from notebook.services.contents.tests.test_manager import TestContentsManager
 from six import (
     iteritems,
@@ -42,7 +44,11 @@ from six import (
 )
 from tornado.web import HTTPError
 
-from dwcontents import HybridContents
+from conftest import InMemDwContentsApi
+from dwcontents import HybridContents, DwContents
+from dwcontents.hybridcontents import ManagerTrie, _apply_prefix, \
+    DUMMY_CREATED_DATE
+from dwcontents.transfer import CrossManagerMove
 
 
 @contextmanager
@@ -308,3 +314,279 @@ class MultiRootTestCase(TestCase):
     def tearDown(self):
         for dir_ in itervalues(self.temp_dirs):
             dir_.cleanup()
+
+
+class ManagerTrieTestCase(TestCase):
+    def setUp(self):
+        self.trie = ManagerTrie({'': 'root', 'a': 'a', 'a/b/c': 'abc'})
+
+    def test_resolve(self):
+        self.assertEqual(self.trie.resolve(''), ('', 'root', ''))
+        self.assertEqual(self.trie.resolve('/x/y'), ('', 'root', 'x/y'))
+        self.assertEqual(self.trie.resolve('a/x'), ('a', 'a', 'x'))
+        self.assertEqual(self.trie.resolve('a/b'), ('a', 'a', 'b'))
+        self.assertEqual(self.trie.resolve('a/b/c/d/'),
+                         ('a/b/c', 'abc', 'd'))
+
+    def test_resolve_without_root(self):
+        trie = ManagerTrie({'a/b': 'ab'})
+        self.assertEqual(trie.resolve('a/b/c'), ('a/b', 'ab', 'c'))
+        with assert_raises_http_error(self, 404):
+            trie.resolve('a/c')
+
+    def test_children(self):
+        self.assertEqual(self.trie.children(''), ['a'])
+        self.assertEqual(self.trie.children('a/b'), ['c'])
+        self.assertEqual(self.trie.children('a/b/c'), [])
+        self.assertEqual(self.trie.children('x'), [])
+
+    def test_apply_prefix(self):
+        model = {'type': 'directory', 'path': '', 'content': [
+            {'type': 'file', 'path': 'f.txt'},
+            {'type': 'directory', 'path': 'd', 'content': None}]}
+        _apply_prefix('a/b', model)
+        self.assertEqual(model['path'], 'a/b')
+        self.assertEqual([m['path'] for m in model['content']],
+                         ['a/b/f.txt', 'a/b/d'])
+
+
+class NestedMountTestCase(TestCase):
+    def setUp(self):
+        self.temp_dirs = [TemporaryDirectory(), TemporaryDirectory()]
+        self.root_dir, self.nested_dir = [d.name for d in self.temp_dirs]
+        self.contents_manager = HybridContents(managers={
+            '': FileContentsManager(root_dir=self.root_dir),
+            '/a/b/': FileContentsManager(root_dir=self.nested_dir),
+        })
+
+    def tearDown(self):
+        for dir_ in self.temp_dirs:
+            dir_.cleanup()
+
+    def test_nested_mount(self):
+        cm = self.contents_manager
+        model = cm.new_untitled(path='a/b', type='notebook')
+        self.assertEqual(model['path'], 'a/b/Untitled.ipynb')
+        self.assertTrue(exists(osjoin(self.nested_dir, 'Untitled.ipynb')))
+
+        self.assertTrue(cm.dir_exists('a'))
+        self.assertEqual([m['path'] for m in cm.get('')['content']], ['a'])
+        self.assertEqual([m['path'] for m in cm.get('a')['content']],
+                         ['a/b'])
+        self.assertEqual([m['path'] for m in cm.get('a/b')['content']],
+                         ['a/b/Untitled.ipynb'])
+
+    def test_mount_parent_in_root_manager(self):
+        cm = self.contents_manager
+        mkdir(osjoin(self.root_dir, 'a'))
+        cm.new_untitled(path='a', ext='.txt')
+
+        self.assertEqual(
+            sorted(m['path'] for m in cm.get('a')['content']),
+            ['a/b', 'a/untitled.txt'])
+
+    def test_cant_delete_mount_parent(self):
+        with assert_raises_http_error(self, 400):
+            self.contents_manager.delete('a')
+
+
+class SlowContentsManager(FileContentsManager):
+    def __init__(self, **kwargs):
+        super(SlowContentsManager, self).__init__(**kwargs)
+        self.release = Event()
+
+    def get(self, path, content=True, type=None, format=None):
+        self.release.wait(5)
+        return super(SlowContentsManager, self).get(
+            path, content=content, type=type, format=format)
+
+
+class FanOutTestCase(TestCase):
+    def setUp(self):
+        self.temp_dirs = [TemporaryDirectory() for _ in range(3)]
+        root_dir, local_dir, slow_dir = [d.name for d in self.temp_dirs]
+        self.slow_manager = SlowContentsManager(root_dir=slow_dir)
+        self.contents_manager = HybridContents(
+            managers={
+                '': FileContentsManager(root_dir=root_dir),
+                'local': FileContentsManager(root_dir=local_dir),
+                'slow': self.slow_manager,
+            },
+            manager_timeout=0.2
+        )
+
+    def tearDown(self):
+        self.slow_manager.release.set()
+        for dir_ in self.temp_dirs:
+            dir_.cleanup()
+
+    def test_mount_models_use_manager_root(self):
+        self.slow_manager.release.set()
+        cm = self.contents_manager
+        content = {m['path']: m for m in cm.get('')['content']}
+
+        local_root = cm.managers['local'].get('', content=False)
+        self.assertEqual(content['local']['last_modified'],
+                         local_root['last_modified'])
+        self.assertEqual(content['local']['created'], local_root['created'])
+        self.assertTrue(content['local']['writable'])
+
+    def test_slow_manager_degrades(self):
+        content = {m['path']: m
+                   for m in self.contents_manager.get('')['content']}
+
+        self.assertEqual(sorted(content), ['local', 'slow'])
+        self.assertEqual(content['slow']['last_modified'],
+                         DUMMY_CREATED_DATE)
+        self.assertNotEqual(content['local']['last_modified'],
+                            DUMMY_CREATED_DATE)
+
+    def test_root_manager_errors_propagate(self):
+        def failing_get(*args, **kwargs):
+            raise HTTPError(500, 'Boom')
+
+        self.slow_manager.release.set()
+        self.contents_manager.managers[''].get = failing_get
+        with assert_raises_http_error(self, 500):
+            self.contents_manager.get('')
+
+
+class CrossManagerMoveTestCase(TestCase):
+    def setUp(self):
+        self.temp_dirs = [TemporaryDirectory(), TemporaryDirectory()]
+        self.root_dir, self.other_dir = [d.name for d in self.temp_dirs]
+        self.contents_manager = HybridContents(
+            managers={
+                '': FileContentsManager(root_dir=self.root_dir),
+                'other': LargeFileManager(root_dir=self.other_dir),
+            },
+            move_chunk_size=4
+        )
+
+    def tearDown(self):
+        for dir_ in self.temp_dirs:
+            dir_.cleanup()
+
+    def save_text(self, path, text):
+        self.contents_manager.save(
+            {'type': 'file', 'format': 'text', 'content': text}, path)
+
+    def test_move_file(self):
+        cm = self.contents_manager
+        self.save_text('a.txt', 'hello world')
+        cm.rename('a.txt', 'other/b.txt')
+
+        self.assertFalse(cm.file_exists('a.txt'))
+        self.assertEqual(cm.get('other/b.txt')['content'], 'hello world')
+
+        cm.rename('other/b.txt', 'c.txt')
+        self.assertFalse(cm.file_exists('other/b.txt'))
+        self.assertEqual(cm.get('c.txt')['content'], 'hello world')
+
+    def test_move_directory(self):
+        cm = self.contents_manager
+        cm.new_untitled(path='', type='directory')
+        cm.save({'type': 'directory'}, 'Untitled Folder/sub')
+        self.save_text('Untitled Folder/x.txt', 'x')
+        self.save_text('Untitled Folder/sub/y.txt', 'y' * 10)
+        cm.new_untitled(path='Untitled Folder', type='notebook')
+
+        cm.rename('Untitled Folder', 'other/moved')
+
+        self.assertFalse(cm.dir_exists('Untitled Folder'))
+        self.assertEqual(cm.get('other/moved/x.txt')['content'], 'x')
+        self.assertEqual(cm.get('other/moved/sub/y.txt')['content'],
+                         'y' * 10)
+        self.assertEqual(cm.get('other/moved/Untitled.ipynb')['type'],
+                         'notebook')
+
+    def test_move_to_existing(self):
+        self.save_text('a.txt', 'a')
+        self.save_text('other/a.txt', 'b')
+        with assert_raises_http_error(self, 409):
+            self.contents_manager.rename('a.txt', 'other/a.txt')
+
+    def test_failed_move_rolls_back(self):
+        cm = self.contents_manager
+        cm.save({'type': 'directory'}, 'd')
+        self.save_text('d/x.txt', 'x')
+        self.save_text('d/y.txt', 'y')
+
+        other = cm.managers['other']
+        save = other.save
+
+        def failing_save(model, path):
+            if path.endswith('y.txt'):
+                raise HTTPError(500)
+            return save(model, path)
+
+        other.save = failing_save
+        with assert_raises_http_error(self, 500):
+            cm.rename('d', 'other/d')
+
+        self.assertFalse(cm.dir_exists('other/d'))
+        self.assertTrue(cm.file_exists('d/x.txt'))
+        self.assertTrue(cm.file_exists('d/y.txt'))
+
+    def test_move_to_and_from_data_world(self):
+        dw = DwContents(root_dir='testy-tester/jupyter',
+                        api=InMemDwContentsApi())
+        cm = HybridContents(managers={
+            '': FileContentsManager(root_dir=self.root_dir),
+            'dw': dw,
+        })
+        self.save_text('a.txt', 'hello')
+
+        cm.rename('a.txt', 'dw/a.txt')
+        self.assertFalse(cm.file_exists('a.txt'))
+        self.assertEqual(cm.get('dw/a.txt')['content'], 'hello')
+
+        cm.rename('dw/a.txt', 'b.txt')
+        self.assertFalse(cm.file_exists('dw/a.txt'))
+        self.assertEqual(cm.get('b.txt')['content'], 'hello')
+
+    def test_move_too_large(self):
+        cm = HybridContents(managers={
+            '': FileContentsManager(root_dir=self.root_dir),
+            'other': LargeFileManager(root_dir=self.other_dir),
+        }, move_chunk_size=4, move_max_unchunked_bytes=8)
+        cm.save({'type': 'file', 'format': 'text', 'content': 'x' * 10},
+                'other/a.txt')
+
+        with assert_raises_http_error(self, 413):
+            cm.rename('other/a.txt', 'a.txt')
+        self.assertTrue(cm.file_exists('other/a.txt'))
+        self.assertFalse(cm.file_exists('a.txt'))
+
+    def test_move_keeps_files_not_copied(self):
+        cm = self.contents_manager
+        cm.save({'type': 'directory'}, 'd')
+        self.save_text('d/x.txt', 'x')
+        move = CrossManagerMove(cm.managers[''], 'd', cm.managers['other'],
+                                'd')
+        walk = move._walk
+
+        def walk_then_add(root):
+            walked = walk(root)
+            self.save_text('d/late.txt', 'late')
+            return walked
+
+        move._walk = walk_then_add
+        move.execute()
+
+        self.assertEqual(
+            [m['path'] for m in cm.get('other/d')['content']],
+            ['other/d/x.txt'])
+        self.assertEqual(cm.get('d/late.txt')['content'], 'late')
+
+    def test_cant_move_dataset_from_data_world(self):
+        api = InMemDwContentsApi()
+        api.upload_file('testy-tester', 'jupyter', 'a.txt', b'hello')
+        cm = HybridContents(managers={
+            '': FileContentsManager(root_dir=self.root_dir),
+            'dw': DwContents(api=api),
+        })
+
+        with assert_raises_http_error(self, 400):
+            cm.rename('dw/testy-tester/jupyter', 'jupyter')
+        self.assertEqual(api.file_data['a.txt'], b'hello')
@@ -0,0 +1,110 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from doublex import assert_that
+from hamcrest import equal_to, none, calling, raises
+from pytest import fixture
+from tornado.web import HTTPError
+
+from conftest import InMemDwContentsApi
+from dwcontents.index import DatasetIndex
+
+
+class CountingApi(InMemDwContentsApi):
+    def __init__(self):
+        super(CountingApi, self).__init__()
+        self.dataset_requests = 0
+
+    def get_dataset(self, owner, dataset_id):
+        self.dataset_requests += 1
+        return super(CountingApi, self).get_dataset(owner, dataset_id)
+
+
+@fixture()
+def api():
+    return CountingApi()
+
+
+def text_model(content):
+    return {'type': 'file', 'format': 'text', 'content': content}
+
+
+def test_polling_after_save_stays_local(api, contents):
+    saved = contents.save(text_model('hello'), 'sub/a.txt')
+    api.dataset_requests = 0
+
+    for _ in range(5):
+        model = contents.get('sub/a.txt', content=False)
+        assert_that(model['last_modified'], equal_to(saved['last_modified']))
+    assert_that(contents.get('sub', content=False)['type'],
+                equal_to('directory'))
+
+    assert_that(api.dataset_requests, equal_to(0))
+
+
+def test_delete_updates_index(api, contents):
+    contents.save(text_model('hello'), 'a.txt')
+    contents.save(text_model('hello'), 'b.txt')
+    contents.delete('a.txt')
+
+    assert_that(calling(contents.get).with_args('a.txt', content=False),
+                raises(HTTPError))
+    assert_that(contents.get('b.txt', content=False)['name'],
+                equal_to('b.txt'))
+
+
+def test_rename_updates_index(contents):
+    contents.save(text_model('hello'), 'a.txt')
+    contents.rename('a.txt', 'c.txt')
+
+    assert_that(contents.get('c.txt', content=False)['name'],
+                equal_to('c.txt'))
+    assert_that(contents.file_exists('a.txt'), equal_to(False))
+
+
+def test_expired_snapshots():
+    index = DatasetIndex(ttl=10)
+    index.put({'owner': 'o', 'id': 'd', 'files': [{'name': 'x/y.csv'}]},
+              loaded=0)
+
+    assert_that(index.get('o', 'd'), none())
+
+    entry = index.put({'owner': 'o', 'id': 'd',
+                       'files': [{'name': 'x/y/z.csv'}]})
+    assert_that(entry.is_dir('x'), equal_to(True))
+    assert_that(entry.is_dir('x/y'), equal_to(True))
+    assert_that(entry.is_dir('x/y/z.csv'), equal_to(False))
+
+
+def test_untitled_names_from_one_snapshot(api, contents):
+    contents.save(text_model(''), 'sub/untitled.txt')
+    contents.save(text_model(''), 'sub/untitled1.txt')
+    contents.save(text_model(''), 'sub/folder/data.csv')
+    api.dataset_requests = 0
+
+    assert_that(contents.increment_filename('untitled.txt', 'sub'),
+                equal_to('untitled2.txt'))
+    assert_that(contents.increment_filename('untitled.txt', 'sub',
+                                            insert='-Copy'),
+                equal_to('untitled-Copy1.txt'))
+    assert_that(contents.increment_filename('folder', 'sub', insert=' '),
+                equal_to('folder 1'))
+    assert_that(api.dataset_requests, equal_to(0))
+
+    model = contents.new_untitled('sub', type='file', ext='.txt')
+    assert_that(model['name'], equal_to('untitled2.txt'))
@@ -0,0 +1,181 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import json
+
+from doublex import assert_that
+from hamcrest import equal_to, has_length, has_key, is_not, starts_with, \
+    contains_string
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+from pytest import fixture
+
+from conftest import InMemDwContentsApi
+from dwcontents.lean import externalize, restore, references, SIDECAR_DIR
+from dwcontents.transfer import read_chunks
+
+IMAGE = 'A' * 1000
+
+
+def notebook(source='1 + 1'):
+    return new_notebook(cells=[new_code_cell(source, outputs=[
+        new_output('display_data', data={'image/png': IMAGE,
+                                         'text/plain': 'small'})])])
+
+
+class RecordingApi(InMemDwContentsApi):
+    def __init__(self):
+        super(RecordingApi, self).__init__()
+        self.uploaded = []
+
+    def put_file(self, owner, dataset_id, file_name, data):
+        self.uploaded.append(file_name)
+        super(RecordingApi, self).put_file(owner, dataset_id, file_name,
+                                           data)
+
+
+@fixture()
+def api():
+    return RecordingApi()
+
+
+@fixture()
+def contents_config():
+    return {'lean_notebooks': True, 'lean_output_bytes': 100}
+
+
+def test_externalize_and_restore():
+    nb = notebook()
+    lean, sidecars = externalize(nb, 100)
+
+    assert_that(sidecars, has_length(1))
+    assert_that(list(sidecars)[0], starts_with(SIDECAR_DIR + '/'))
+    assert_that(lean['cells'][0]['outputs'][0]['data'],
+                equal_to({'image/png': '', 'text/plain': 'small'}))
+    assert_that(nb.cells[0].outputs[0].data['image/png'], equal_to(IMAGE))
+
+    restored = json.loads(json.dumps(lean))
+    assert_that(restore(restored, sidecars.get), equal_to(1))
+    assert_that(restored, equal_to(nb))
+
+
+def test_small_outputs_stay_inline():
+    nb = notebook()
+    lean, sidecars = externalize(nb, 10000)
+    assert_that(sidecars, has_length(0))
+    assert_that(lean, equal_to(nb))
+
+
+def test_unchanged_outputs_are_uploaded_once(api, contents):
+    contents.save({'type': 'notebook', 'content': notebook()}, 'nb.ipynb')
+    contents.save({'type': 'notebook', 'content': notebook('2 + 2')},
+                  'nb.ipynb')
+
+    assert_that([name for name in api.uploaded
+                 if name.startswith(SIDECAR_DIR)], has_length(1))
+    assert_that(len(api.file_data['nb.ipynb']), equal_to(
+        len(json.dumps(externalize(notebook('2 + 2'), 100)[0]))))
+
+
+def test_get_reassembles_notebook(api, contents):
+    nb = notebook()
+    nb.cells[0].metadata['trusted'] = True
+    contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+    contents._sidecars = type(contents._sidecars)()  # Must download
+
+    model = contents.get('nb.ipynb')
+    output = model['content'].cells[0].outputs[0]
+    assert_that(output.data['image/png'], equal_to(IMAGE))
+    assert_that(output.metadata, is_not(has_key('dwcontents')))
+    assert_that(model['content'].cells[0].metadata['trusted'],
+                equal_to(True))
+
+
+def test_restored_checkpoint_stays_trusted(api, contents):
+    nb = notebook()
+    nb.cells[0].metadata['trusted'] = True
+    contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+
+    lean = json.loads(api.file_data['nb.ipynb'].decode('utf-8'))
+    contents.save({'type': 'notebook', 'content': lean}, 'nb.ipynb')
+
+    model = contents.get('nb.ipynb')
+    assert_that(model['content'].cells[0].outputs[0].data['image/png'],
+                equal_to(IMAGE))
+
+
+def saved_sidecars(api):
+    return [f['name'] for f in api.dataset.get('files', [])
+            if f['name'].startswith(SIDECAR_DIR)]
+
+
+def test_sidecars_hidden(api, contents):
+    contents.save({'type': 'notebook', 'content': notebook()}, 'nb.ipynb')
+
+    assert_that([m['name'] for m in contents.get('')['content']],
+                equal_to(['nb.ipynb']))
+    assert_that(contents.is_hidden(saved_sidecars(api)[0]), equal_to(True))
+    assert_that(contents.is_hidden('nb.ipynb'), equal_to(False))
+
+
+def test_missing_sidecar_warns(api, contents):
+    contents.save({'type': 'notebook', 'content': notebook()}, 'nb.ipynb')
+    name = saved_sidecars(api)[0]
+    api.delete_file('testy-tester', 'jupyter', name)
+    del api.file_data[name]
+    contents._sidecars = type(contents._sidecars)()
+
+    model = contents.get('nb.ipynb')
+    assert_that(model['message'], contains_string(name))
+    output = model['content'].cells[0].outputs[0]
+    assert_that(output.data['image/png'], equal_to(''))
+    assert_that(output.data['text/plain'], equal_to('small'))
+
+
+def test_streams_reassembled_notebooks(api, contents):
+    contents.save({'type': 'notebook', 'content': notebook()}, 'nb.ipynb')
+
+    nb = json.loads(b''.join(read_chunks(contents, 'nb.ipynb',
+                                         chunk_size=100)).decode('utf-8'))
+    assert_that(references(nb), equal_to(set()))
+    assert_that(nb['cells'][0]['outputs'][0]['data']['image/png'],
+                equal_to(IMAGE))
+
+
+def test_unused_sidecars_pruned(api, contents):
+    contents.save({'type': 'notebook', 'content': notebook()}, 'nb.ipynb')
+    nb = notebook()
+    nb.cells[0].outputs[0].data['image/png'] = 'B' * 1000
+    contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+    contents.save({'type': 'notebook', 'content': nb}, 'other.ipynb')
+    assert_that(saved_sidecars(api), has_length(2))
+
+    # Recent outputs may belong to notebooks being saved
+    assert_that(contents.prune_sidecars(''), equal_to(0))
+    for f in api.dataset['files']:
+        f['updated'] = '2018-01-01T00:00:00.000Z'
+    # Outputs uploaded by this manager are kept while cached
+    assert_that(contents.prune_sidecars(''), equal_to(0))
+    contents._sidecars = type(contents._sidecars)()
+    assert_that(contents.prune_sidecars(''), equal_to(1))
+
+    # Deleting notebooks doesn't download all others
+    contents.delete_file('nb.ipynb')
+    contents.delete_file('other.ipynb')
+    assert_that(saved_sidecars(api), has_length(1))
+    assert_that(contents.prune_sidecars(''), equal_to(1))
+    assert_that(saved_sidecars(api), has_length(0))
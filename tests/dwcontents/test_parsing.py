@@ -0,0 +1,116 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import io
+import json
+import time
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, less_than, has_entries, is_not, has_key
+
+from dwcontents.parsing import strip_dataset, parse_dataset
+
+
+def dataset_json(file_count):
+    return json.dumps({
+        'owner': 'testy-tester',
+        'id': 'jupyter',
+        'title': 'Jupyter',
+        'tags': ['a', 'b'],
+        'license': {'name': 'Public Domain', 'url': None},
+        'updated': '2018-01-01T00:00:00.000Z',
+        'files': [{
+            'name': 'dir{}/file{}.csv'.format(i % 10, i),
+            'sizeInBytes': i * 1.5,
+            'created': '2018-01-01T00:00:00.000Z',
+            'updated': '2018-01-02T00:00:00.000Z',
+            'description': 'File number {}'.format(i) * 4,
+            'labels': ['raw data', 'documentation'],
+            'source': {
+                'id': 'source-{}'.format(i),
+                'syncStatus': 'OK',
+                'lastSyncStart': '2018-01-02T00:00:00.000Z',
+                'request': {'url': 'https://example.com/{}'.format(i),
+                            'headers': [{'name': 'Accept',
+                                         'value': 'text/csv'}]},
+            }
+        } for i in range(file_count)]
+    }).encode('utf-8')
+
+
+def test_strip_dataset():
+    dataset = strip_dataset(json.loads(dataset_json(1).decode('utf-8')))
+    assert_that(dataset, has_entries(owner='testy-tester',
+                                     tags=['a', 'b']))
+    assert_that(dataset['files'][0], equal_to({
+        'name': 'dir0/file0.csv',
+        'sizeInBytes': 0.0,
+        'created': '2018-01-01T00:00:00.000Z',
+        'updated': '2018-01-02T00:00:00.000Z',
+        'source': {'syncStatus': 'OK'}
+    }))
+
+
+def test_parse_dataset():
+    pytest.importorskip('ijson')
+    data = dataset_json(50)
+    dataset = parse_dataset(io.BytesIO(data))
+    assert_that(dataset,
+                equal_to(strip_dataset(json.loads(data.decode('utf-8')))))
+
+
+def test_parse_dataset_without_files():
+    pytest.importorskip('ijson')
+    dataset = parse_dataset(io.BytesIO(b'{"id": "empty", "files": []}'))
+    assert_that(dataset, equal_to({'id': 'empty', 'files': []}))
+
+    dataset = parse_dataset(io.BytesIO(
+        b'{"id": "x", "files": [{"name": "a", "source": null}]}'))
+    assert_that(dataset['files'][0], is_not(has_key('source')))
+
+
+def measure(func, tracemalloc):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def test_parse_large_dataset():
+    pytest.importorskip('ijson')
+    tracemalloc = pytest.importorskip('tracemalloc')
+    data = dataset_json(25000)
+    assert_that(len(data), is_not(less_than(10 * 1024 * 1024)))
+
+    loaded, loaded_peak, loaded_time = measure(
+        lambda: strip_dataset(json.loads(data.decode('utf-8'))),
+        tracemalloc)
+    parsed, parsed_peak, parsed_time = measure(
+        lambda: parse_dataset(io.BytesIO(data)), tracemalloc)
+
+    assert_that(parsed, equal_to(loaded))
+    assert_that(parsed_peak, less_than(loaded_peak / 2))
+    assert_that(parsed_time, less_than(loaded_time * 5))
@@ -0,0 +1,87 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from doublex import assert_that
+from hamcrest import equal_to, contains
+from nbformat.v4 import new_notebook, new_code_cell
+from pytest import fixture
+
+from dwcontents.contents import DwContents
+from dwcontents.prefetch import Prefetcher
+
+
+@fixture()
+def contents_config():
+    return {'prefetch': True}
+
+
+def text_model(content):
+    return {'type': 'file', 'format': 'text', 'content': content}
+
+
+def wait_for(prefetcher):
+    while prefetcher._pending:
+        for future in list(prefetcher._pending.values()):
+            future.result()
+
+
+def test_candidates_notebooks_first(api):
+    api.put_file('testy-tester', 'jupyter', 'a.txt', b'a')
+    api.put_file('testy-tester', 'jupyter', 'b.ipynb', b'{}')
+    api.put_file('testy-tester', 'jupyter', 'c.bin', b'c')
+    api.put_file('testy-tester', 'jupyter', 'sub/d.txt', b'd')
+    api.dataset['files'][0]['sizeInBytes'] = 2 * 1024 * 1024
+
+    prefetcher = Prefetcher(api)
+    candidates = prefetcher.candidates(
+        api.get_dataset('testy-tester', 'jupyter'))
+
+    assert_that([f['name'] for f in candidates], contains('b.ipynb'))
+
+
+def test_listing_prefetches_files(api, contents):
+    nb = new_notebook(cells=[new_code_cell('1 + 1')])
+    contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+    contents.save(text_model('hello'), 'a.txt')
+
+    contents.get('')
+    wait_for(contents.prefetcher)
+    api.download_file = None  # Must not download
+    api.get_file = None
+
+    assert_that(contents.get('nb.ipynb')['content'].cells[0].source,
+                equal_to('1 + 1'))
+    assert_that(contents.get('a.txt')['content'], equal_to('hello'))
+    stats = contents.prefetcher.stats()
+    assert_that(stats['hits'], equal_to(2))
+    assert_that(stats['hit_rate'], equal_to(1.0))
+
+
+def test_changed_file_is_downloaded_again(api, contents):
+    contents.save(text_model('old'), 'a.txt')
+    contents.get('')
+    wait_for(contents.prefetcher)
+
+    contents.save(text_model('new'), 'a.txt')
+
+    assert_that(contents.get('a.txt')['content'], equal_to('new'))
+    assert_that(contents.prefetcher.stats()['misses'], equal_to(1))
+
+
+def test_disabled_by_default(api):
+    assert_that(DwContents(api=api).prefetcher, equal_to(None))
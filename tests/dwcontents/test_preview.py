@@ -0,0 +1,119 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import base64
+
+from doublex import assert_that
+from hamcrest import equal_to, is_not, has_key
+from pytest import fixture, raises
+from tornado.web import HTTPError
+
+from conftest import InMemDwContentsApi
+from dwcontents.contents import PREVIEW_FORMAT
+
+
+@fixture()
+def api():
+    api = InMemDwContentsApi()
+    api.put_file('testy-tester', 'jupyter', 'big.csv',
+                 b'a,b\n1,2\n3,4\n5,6\n')
+    api.put_file('testy-tester', 'jupyter', 'big.bin', b'\x00' * 20)
+    return api
+
+
+@fixture()
+def contents_config():
+    return {'preview_bytes': 10}
+
+
+def test_small_files_in_full(contents):
+    model = contents.get('big.csv')
+
+    assert_that(model['content'], equal_to('a,b\n1,2\n3,4\n5,6\n'))
+    assert_that(model, is_not(has_key('truncated')))
+
+
+def test_preview_format_cuts_at_line(api, contents):
+    api.get_file = None  # Must not download everything
+
+    model = contents.get('big.csv', format=PREVIEW_FORMAT)
+
+    assert_that(model['content'], equal_to('a,b\n1,2\n'))
+    assert_that(model['format'], equal_to('text'))
+    assert_that(model['truncated'], equal_to(True))
+    assert_that(model['writable'], equal_to(False))
+
+
+def test_preview_cuts_at_character(api, contents):
+    api.put_file('testy-tester', 'jupyter', 'accents.txt',
+                 b'aaaaaaaaa\xc3\xa9\xc3\xa9')
+
+    model = contents.get('accents.txt', format=PREVIEW_FORMAT)
+
+    assert_that(model['content'], equal_to('aaaaaaaaa'))
+
+
+def test_preview_not_saved(api, contents):
+    model = contents.get('big.csv', format=PREVIEW_FORMAT)
+
+    with raises(HTTPError) as e:
+        contents.save(model, 'big.csv')
+    assert_that(e.value.status_code, equal_to(400))
+    assert_that(api.file_data['big.csv'], equal_to(b'a,b\n1,2\n3,4\n5,6\n'))
+
+
+def test_large_files_previewed(api, contents):
+    contents.preview_threshold = 5  # InMemDwContentsApi files are 10 bytes
+    api.get_file = None
+
+    model = contents.get('big.bin', type='file', format='base64')
+
+    assert_that(base64.b64decode(model['content']),
+                equal_to(b'\x00' * 10))
+    assert_that(model['format'], equal_to('base64'))
+    assert_that(model['truncated'], equal_to(True))
+
+
+def test_large_files_downloaded_in_full(api, contents):
+    contents.preview_threshold = 5
+
+    # As /files does
+    model = contents.get('big.bin', type='file')
+
+    assert_that(base64.b64decode(model['content']),
+                equal_to(b'\x00' * 20))
+    assert_that(model, is_not(has_key('truncated')))
+
+
+def test_large_files_renamed_in_full(api, contents):
+    contents.preview_threshold = 5
+
+    contents.rename_file('big.csv', 'moved.csv')
+
+    assert_that(api.file_data['moved.csv'],
+                equal_to(b'a,b\n1,2\n3,4\n5,6\n'))
+    assert_that(contents.file_exists('big.csv'), equal_to(False))
+
+
+def test_large_files_copied_in_full(api, contents):
+    contents.preview_threshold = 5
+
+    contents.copy('big.csv', 'copy.csv')
+
+    assert_that(api.file_data['copy.csv'],
+                equal_to(b'a,b\n1,2\n3,4\n5,6\n'))
@@ -0,0 +1,118 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import io
+import time
+
+from doublex import assert_that
+from hamcrest import equal_to, close_to, greater_than, same_instance
+from requests import Response
+from requests.adapters import BaseAdapter
+
+from dwcontents import api as api_module
+from dwcontents.api import BackoffAdapter, DwContentsApi
+from dwcontents.ratelimit import RateLimiter, RateLimitAdapter
+
+
+class ScriptedAdapter(BaseAdapter):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = 0
+        super(ScriptedAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        status_code, headers = self.responses.pop(0)
+        resp = Response()
+        resp.status_code = status_code
+        resp.raw = io.BytesIO(b'')
+        resp.headers.update(headers)
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_burst_then_paced():
+    limiter = RateLimiter(rate=100.0, burst=2)
+    waits = [limiter.acquire() for _ in range(4)]
+
+    assert_that(waits[:2], equal_to([0.0, 0.0]))
+    assert_that(waits[3], greater_than(0.0))
+    stats = limiter.stats()
+    assert_that(stats['requests'], equal_to(4))
+    assert_that(stats['delayed'], equal_to(2))
+    assert_that(stats['max_wait'], close_to(0.01, 0.005))
+
+
+def test_off_by_default():
+    limiter = RateLimiter()
+    limiter.update({'X-RateLimit-Remaining': '0',
+                    'X-RateLimit-Reset': '10'})
+    waits = [limiter.acquire() for _ in range(100)]
+
+    assert_that(sum(waits), equal_to(0.0))
+    assert_that(limiter.stats()['requests'], equal_to(100))
+
+
+def test_headers_slow_down_rate():
+    limiter = RateLimiter(rate=100.0, burst=10)
+    limiter.update({'X-RateLimit-Remaining': '5',
+                    'X-RateLimit-Reset': '10'})
+
+    assert_that(limiter.stats()['rate'], close_to(0.5, 0.01))
+    assert_that(limiter._tokens, close_to(5, 0.1))
+
+
+def test_pause():
+    limiter = RateLimiter(rate=1000.0, burst=10)
+    limiter.pause(0.05)
+    start = time.time()
+    limiter.acquire()
+
+    assert_that(time.time() - start, greater_than(0.04))
+
+
+def test_shared_by_key():
+    limiter = RateLimiter.shared('test_shared_by_key', rate=1.0)
+
+    assert_that(RateLimiter.shared('test_shared_by_key'),
+                same_instance(limiter))
+    assert_that(limiter.max_rate, equal_to(1.0))
+
+
+def test_clients_with_same_token_share_limiter():
+    client = DwContentsApi('test-shared-token')
+
+    assert_that(DwContentsApi('test-shared-token').rate_limiter,
+                same_instance(client.rate_limiter))
+
+
+def test_retry_after_waits_once(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(api_module, 'sleep', sleeps.append)
+    transport = ScriptedAdapter([(429, {'Retry-After': '0.01'}),
+                                 (200, {})])
+    limiter = RateLimiter(rate=1000.0, burst=10)
+    adapter = BackoffAdapter(RateLimitAdapter(transport, limiter))
+
+    resp = adapter.send(None)
+
+    assert_that(resp.status_code, equal_to(200))
+    assert_that(transport.sent, equal_to(2))
+    assert_that(sleeps, equal_to([0.01]))
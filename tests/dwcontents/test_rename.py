@@ -0,0 +1,220 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import io
+import json
+import time
+
+from doublex import assert_that
+from future.moves.urllib.parse import urlparse, parse_qs, unquote
+from hamcrest import equal_to, contains_inanyorder, has_length
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+from pytest import fixture, raises
+from requests import Response
+from requests.adapters import BaseAdapter
+from tornado.web import HTTPError
+
+from conftest import InMemDwContentsApi
+from dwcontents import deadline
+from dwcontents.api import DwContentsApi
+from dwcontents.contents import DwContents
+from dwcontents.lean import SIDECAR_DIR
+from dwcontents.ratelimit import RateLimiter
+from dwcontents.rename import plan_rename, BatchRename
+
+SOURCE = ('testy-tester', 'jupyter')
+
+
+@fixture()
+def api():
+    api = InMemDwContentsApi()
+    for i in range(20):
+        api.upload_file(SOURCE[0], SOURCE[1], 'a/{}.txt'.format(i), b'x')
+    api.upload_file(SOURCE[0], SOURCE[1], 'b.txt', b'x')
+    return api
+
+
+class DatasetAdapter(BaseAdapter):
+    """Serves a single dataset, as data.world's API would"""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.requests = []
+        super(DatasetAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        path, name = url.path, unquote(url.path.rsplit('/', 1)[1])
+        self.requests.append((request.method, path))
+        body = b''
+        status_code = 200
+        if request.method == 'GET' and path.startswith('/v0/datasets/'):
+            body = json.dumps({'files': [
+                {'name': name, 'sizeInBytes': len(data)}
+                for name, data in sorted(self.files.items())]})
+            body = body.encode('utf-8')
+        elif request.method == 'GET':
+            body = self.files[name]
+        elif request.method == 'PUT':
+            self.files[name] = request.body
+        elif request.method == 'DELETE':
+            names = parse_qs(url.query).get('name', [name])
+            if any(n not in self.files for n in names):
+                status_code = 404
+            for name in names:
+                self.files.pop(name, None)
+        resp = Response()
+        resp.status_code = status_code
+        resp.url = request.url
+        resp.request = request
+        resp.raw = io.BytesIO(body)
+        return resp
+
+    def close(self):
+        pass
+
+
+def names(api):
+    return [f['name'] for f in api.dataset['files']]
+
+
+def test_plan_rename(api):
+    moves = plan_rename(api.get_dataset(*SOURCE), 'a', 'c/d')
+    assert_that(moves, has_length(20))
+    assert_that(moves[0], equal_to(('a/0.txt', 'c/d/0.txt')))
+
+
+def test_plan_rename_conflict(api):
+    api.upload_file(SOURCE[0], SOURCE[1], 'c/3.txt', b'x')
+    with raises(HTTPError) as e:
+        plan_rename(api.get_dataset(*SOURCE), 'a', 'c')
+    assert_that(e.value.status_code, equal_to(409))
+
+
+def test_batch_rename(api):
+    progress = []
+    moves = plan_rename(api.get_dataset(*SOURCE), 'a', 'c')
+    BatchRename(api, SOURCE, SOURCE, moves, source_dir='a', max_workers=4,
+                progress=lambda *p: progress.append(p)).execute()
+
+    assert_that(names(api), contains_inanyorder(
+        'b.txt', *['c/{}.txt'.format(i) for i in range(20)]))
+    assert_that(progress, has_length(20))
+    assert_that(progress[-1][:2], equal_to((20, 20)))
+
+
+def test_batch_rename_partial_failure(api):
+    download_file = api.download_file
+
+    def failing_download(owner, dataset_id, file_name):
+        if file_name == 'a/7.txt':
+            raise IOError('Boom')
+        return download_file(owner, dataset_id, file_name)
+
+    api.download_file = failing_download
+    moves = plan_rename(api.get_dataset(*SOURCE), 'a', 'c')
+    with raises(HTTPError) as e:
+        BatchRename(api, SOURCE, SOURCE, moves, source_dir='a').execute()
+
+    assert_that(e.value.status_code, equal_to(500))
+    assert_that(e.value.reason, equal_to(
+        'Unable to move 1 of 20 files (a/7.txt).'))
+    assert_that(names(api), contains_inanyorder(
+        'b.txt', 'a/7.txt',
+        *['c/{}.txt'.format(i) for i in range(20) if i != 7]))
+
+
+def test_batch_rename_uploads_in_batches(api):
+    batches = []
+    put_files = api.put_files
+
+    def recording_put_files(owner, dataset_id, files, max_workers=1):
+        batches.append(len(files))
+        put_files(owner, dataset_id, files, max_workers)
+
+    api.put_files = recording_put_files
+    moves = plan_rename(api.get_dataset(*SOURCE), 'a', 'c')
+    BatchRename(api, SOURCE, SOURCE, moves, source_dir='a',
+                max_workers=2).execute()
+
+    assert_that(batches, equal_to([10, 10]))
+    assert_that(names(api), contains_inanyorder(
+        'b.txt', *['c/{}.txt'.format(i) for i in range(20)]))
+
+
+def test_rename_deletes_sources_after_deadline(api):
+    download_file = api.download_file
+    delete_files = api.delete_files
+
+    def slow_download(owner, dataset_id, file_name):
+        time.sleep(0.05)
+        return download_file(owner, dataset_id, file_name)
+
+    def checked_delete_files(owner, dataset_id, file_names):
+        deadline.check()
+        delete_files(owner, dataset_id, file_names)
+
+    api.download_file = slow_download
+    api.delete_files = checked_delete_files
+    contents = DwContents(root_dir='testy-tester/jupyter', api=api,
+                          compatibility_mode=True, rename_workers=2,
+                          request_timeout=0.2)
+    contents.rename_file('a', 'c')
+
+    assert_that(names(api), contains_inanyorder(
+        'b.txt', *['c/{}.txt'.format(i) for i in range(20)]))
+
+
+def test_batch_rename_deletes_in_bulk():
+    adapter = DatasetAdapter({'a/{}.txt'.format(i): b'x' for i in range(5)})
+    api = DwContentsApi('token', adapter=adapter,
+                        rate_limiter=RateLimiter(rate=1000.0, burst=1000))
+    moves = plan_rename(api.get_dataset(*SOURCE), 'a', 'c')
+    BatchRename(api, SOURCE, SOURCE, moves, source_dir='a').execute()
+
+    deletes = [r for r in adapter.requests if r[0] == 'DELETE']
+    assert_that(deletes, has_length(1))
+    assert_that(sorted(adapter.files),
+                equal_to(['c/{}.txt'.format(i) for i in range(5)]))
+    assert_that([f['name'] for f in api.get_dataset(*SOURCE)['files']],
+                equal_to(sorted(adapter.files)))
+
+
+def test_batch_rename_copies_sidecars_across_datasets():
+    api = InMemDwContentsApi()
+    cm = DwContents(root_dir='testy-tester/jupyter', api=api,
+                    lean_notebooks=True, lean_output_bytes=100)
+    nb = new_notebook(cells=[new_code_cell('1 + 1', outputs=[new_output(
+        'display_data', data={'image/png': 'A' * 1000})])])
+    cm.save({'type': 'notebook', 'content': nb}, 'a/nb.ipynb')
+    sidecar = [f['name'] for f in api.dataset['files']
+               if f['name'].startswith(SIDECAR_DIR)][0]
+
+    put = []
+    put_file = api.put_file
+
+    def recording_put_file(owner, dataset_id, file_name, data):
+        put.append((dataset_id, file_name))
+        put_file(owner, dataset_id, file_name, data)
+
+    api.put_file = recording_put_file
+    target = ('testy-tester', 'other')
+    BatchRename(api, SOURCE, target, [('a/nb.ipynb', 'b/nb.ipynb')]).execute()
+
+    assert_that(put, contains_inanyorder(('other', sidecar),
+                                         ('other', 'b/nb.ipynb')))
@@ -0,0 +1,92 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import os
+import threading
+import time
+
+from doublex import assert_that
+from hamcrest import equal_to, is_not, same_instance
+from pytest import raises
+
+from dwcontents.contents import DwContents
+from dwcontents.deadline import DeadlineExceeded
+from dwcontents.tenants import FairScheduler, TenantPool
+
+
+def queue_waiter(scheduler, tenant, granted):
+    def run():
+        scheduler.acquire(tenant)
+        granted.append(tenant)
+
+    waiting = sum(len(q) for q in scheduler._queues.values())
+    threading.Thread(target=run).start()
+    while sum(len(q) for q in scheduler._queues.values()) == waiting:
+        time.sleep(0.001)
+
+
+def test_fair_scheduler_takes_turns():
+    scheduler = FairScheduler(max_concurrency=1)
+    scheduler.acquire('a')
+
+    granted = []
+    for tenant in ['a', 'a', 'a', 'b']:
+        queue_waiter(scheduler, tenant, granted)
+
+    for i in range(1, 5):
+        scheduler.release(granted[-1] if granted else 'a')
+        while len(granted) < i:
+            time.sleep(0.001)
+
+    assert_that(granted, equal_to(['a', 'b', 'a', 'a']))
+
+
+def test_fair_scheduler_timeout():
+    scheduler = FairScheduler(max_concurrency=1)
+    scheduler.acquire('a')
+
+    with raises(DeadlineExceeded):
+        scheduler.acquire('b', timeout=0.05)
+    assert_that(scheduler._queues, equal_to({}))
+    assert_that(list(scheduler._turns), equal_to([]))
+
+    scheduler.release('a')
+    scheduler.acquire('b', timeout=0.05)
+    assert_that(scheduler.active, equal_to(1))
+
+
+def test_tenant_pool_clients():
+    pool = TenantPool(max_connections=4, cache_quota=1024)
+    client = pool.client('token-a')
+
+    assert_that(pool.client('token-a'), same_instance(client))
+    assert_that(pool.client('token-b'), is_not(same_instance(client)))
+    assert_that(client.cache_quota, equal_to(1024))
+    assert_that(client._session.headers['Authorization'],
+                equal_to('Bearer token-a'))
+
+
+def test_tenant_mode_keeps_environment(monkeypatch):
+    monkeypatch.setenv('DW_AUTH_TOKEN', 'original')
+    monkeypatch.setattr(TenantPool, '_instance', None)
+
+    cm = DwContents(dw_auth_token='tenant-token', tenant_mode=True)
+
+    assert_that(cm.api, same_instance(
+        TenantPool.instance().client('tenant-token')))
+    assert_that(os.environ['DW_AUTH_TOKEN'], equal_to('original'))
@@ -0,0 +1,106 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import io
+import json
+
+from doublex import assert_that
+from hamcrest import equal_to, same_instance, has_entries, contains, \
+    calling, raises, has_item, none
+
+from conftest import InMemDwContentsApi
+from dwcontents import tracing
+from dwcontents.contents import DwContents
+from dwcontents.tracing import JsonSink, span, traced
+
+
+def recorded(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_disabled_spans_do_nothing():
+    assert_that(tracing.enabled(), equal_to(False))
+    assert_that(span('anything', size=1), same_instance(tracing._NOOP))
+
+
+def test_nested_spans():
+    stream = io.StringIO()
+    sink = tracing.add_sink(JsonSink(stream=stream))
+    try:
+        with span('outer', files=2):
+            with span('inner') as inner:
+                inner.set('bytes', 10)
+    finally:
+        tracing.remove_sink(sink)
+
+    inner, outer = recorded(stream)
+    assert_that(outer, has_entries(name='outer', parent_id=none(),
+                                   attributes={'files': 2}))
+    assert_that(inner, has_entries(name='inner',
+                                   trace_id=outer['trace_id'],
+                                   parent_id=outer['span_id'],
+                                   attributes={'bytes': 10}))
+
+
+def test_traced_records_errors():
+    @traced('failing')
+    def failing():
+        raise ValueError('boom')
+
+    stream = io.StringIO()
+    sink = tracing.add_sink(JsonSink(stream=stream))
+    try:
+        assert_that(calling(failing), raises(ValueError))
+    finally:
+        tracing.remove_sink(sink)
+
+    assert_that(recorded(stream), contains(
+        has_entries(name='failing', error="ValueError('boom')")))
+
+
+def test_contents_operations_traced():
+    api = InMemDwContentsApi()
+    cm = DwContents(root_dir='testy-tester/jupyter', api=api)
+    cm.save({'type': 'file', 'format': 'text', 'content': 'x'}, 'a.txt')
+
+    stream = io.StringIO()
+    sink = tracing.add_sink(JsonSink(stream=stream))
+    try:
+        cm.get('')
+    finally:
+        tracing.remove_sink(sink)
+
+    names = [s['name'] for s in recorded(stream)]
+    assert_that(names, has_item('contents.get'))
+    assert_that(names, has_item('mapper.map_items'))
+
+
+def test_trace_file_opened_once(tmpdir):
+    path = str(tmpdir.join('trace.jsonl'))
+    sinks = [tracing.add_sink(JsonSink(path=path)) for _ in range(3)]
+    try:
+        assert_that(tmpdir.listdir(), equal_to([]))
+        with span('only'):
+            pass
+    finally:
+        tracing.remove_sink(sinks[0])
+
+    assert_that(sinks[1]._stream, none())
+    with io.open(path, encoding='utf-8') as f:
+        assert_that([json.loads(line)['name'] for line in f],
+                    equal_to(['only']))
@@ -0,0 +1,220 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import base64
+import io
+import threading
+import time
+
+from doublex import assert_that
+from hamcrest import equal_to, calling, raises, has_length, is_not
+from requests import Response, Request
+from requests.adapters import BaseAdapter
+from pytest import fixture
+from tornado.web import HTTPError
+
+from conftest import InMemDwContentsApi
+from dwcontents import api as api_module
+from dwcontents.api import BackoffAdapter
+from dwcontents.transfer import write_chunks
+from dwcontents.uploads import ChunkedUploads
+
+
+class RecordingApi(InMemDwContentsApi):
+    def __init__(self):
+        super(RecordingApi, self).__init__()
+        self.uploads = []
+
+    def upload_file(self, owner, dataset_id, file_name, data):
+        self.uploads.append((file_name, type(data)))
+        return super(RecordingApi, self).upload_file(
+            owner, dataset_id, file_name, data)
+
+
+@fixture()
+def api():
+    return RecordingApi()
+
+
+@fixture()
+def contents_config():
+    return {'upload_spool_bytes': 4}
+
+
+def chunk_model(data, chunk):
+    return {'type': 'file', 'format': 'base64', 'chunk': chunk,
+            'content': base64.b64encode(data).decode('ascii')}
+
+
+def test_chunks_are_uploaded_once(api, contents):
+    model = contents.save(chunk_model(b'abc', 1), 'big.bin')
+    assert_that(model['size'], equal_to(3))
+    contents.save(chunk_model(b'def', 2), 'big.bin')
+    contents.save(chunk_model(b'ghi', -1), 'big.bin')
+
+    assert_that(api.uploads, has_length(1))
+    assert_that(api.file_data['big.bin'], equal_to(b'abcdefghi'))
+    assert_that(api.uploads[0][1], is_not(equal_to(bytes)))
+    assert_that(len(contents.uploads), equal_to(0))
+
+
+def test_first_chunk_restarts_upload(api, contents):
+    contents.save(chunk_model(b'old', 1), 'big.bin')
+    contents.save(chunk_model(b'new', 1), 'big.bin')
+    contents.save(chunk_model(b'!', -1), 'big.bin')
+
+    assert_that(api.file_data['big.bin'], equal_to(b'new!'))
+
+
+def test_notebooks_cannot_be_chunked(contents):
+    assert_that(calling(contents.save).with_args(
+        {'type': 'notebook', 'content': {}, 'chunk': 1}, 'nb.ipynb'),
+        raises(HTTPError))
+
+
+def test_write_chunks_assembles_upload(api, contents):
+    write_chunks(contents, 'big.bin', iter([b'a', b'b', b'c']))
+    assert_that(api.uploads, has_length(1))
+    assert_that(api.file_data['big.bin'], equal_to(b'abc'))
+
+
+def test_staged_on_disk_beyond_spool_bytes():
+    uploads = ChunkedUploads(spool_bytes=4)
+    uploads.append('big.bin', 1, b'abc')
+    assert_that(uploads._staged['big.bin'].file._rolled, equal_to(False))
+    uploads.append('big.bin', 2, b'def')
+    assert_that(uploads._staged['big.bin'].file._rolled, equal_to(True))
+
+    staged = uploads.finish('big.bin')
+    assert_that(staged.read(), equal_to(b'abcdef'))
+    staged.close()
+
+
+def test_abandoned_uploads_are_discarded():
+    uploads = ChunkedUploads(max_age=60)
+    uploads.append('big.bin', 1, b'abc')
+    uploads._staged['big.bin'].updated -= 120
+
+    uploads.cleanup()
+    assert_that(len(uploads), equal_to(0))
+    assert_that(calling(uploads.append).with_args('big.bin', 2, b'def'),
+                raises(HTTPError))
+
+
+def test_abandoned_uploads_are_discarded_in_background():
+    uploads = ChunkedUploads(max_age=60, interval=0.01)
+    uploads.append('big.bin', 1, b'abc')
+    uploads._staged['big.bin'].updated -= 120
+
+    uploads.start()
+    try:
+        for _ in range(500):
+            if len(uploads) == 0:
+                break
+            time.sleep(0.01)
+    finally:
+        uploads.stop()
+    assert_that(len(uploads), equal_to(0))
+
+
+def test_uploads_are_written_concurrently():
+    uploads = ChunkedUploads()
+    uploads.append('one.bin', 1, b'a')
+    uploads.append('two.bin', 1, b'b')
+
+    # A slow write to one upload doesn't hold up the others
+    with uploads._staged['one.bin'].lock:
+        assert_that(uploads.append('two.bin', 2, b'c'), equal_to(2))
+        assert_that(len(uploads), equal_to(2))
+
+
+def test_chunk_of_discarded_upload_rejected():
+    uploads = ChunkedUploads()
+    uploads.append('big.bin', 1, b'abc')
+    staged = uploads._staged['big.bin']
+    written = []
+
+    def write_late():
+        try:
+            uploads.append('big.bin', 2, b'def')
+        except HTTPError as e:
+            written.append(e.status_code)
+
+    with staged.lock:
+        writer = threading.Thread(target=write_late)
+        writer.start()
+        time.sleep(0.05)
+        uploads._staged.pop('big.bin')
+        staged.file.close()
+    writer.join()
+    assert_that(written, equal_to([400]))
+
+
+def test_cleanup_started_by_first_upload():
+    uploads = ChunkedUploads()
+    assert_that(uploads._thread, equal_to(None))
+
+    uploads.append('big.bin', 1, b'abc')
+    assert_that(uploads._thread.is_alive(), equal_to(True))
+    uploads.stop()
+
+
+def test_chunks_out_of_order_rejected():
+    uploads = ChunkedUploads()
+    uploads.append('big.bin', 1, b'abc')
+    assert_that(calling(uploads.append).with_args('big.bin', 3, b'ghi'),
+                raises(HTTPError))
+
+    uploads.append('big.bin', 2, b'def')
+    assert_that(calling(uploads.append).with_args('big.bin', 2, b'def'),
+                raises(HTTPError))
+    uploads.append('big.bin', -1, b'ghi')
+    assert_that(uploads.finish('big.bin').read(), equal_to(b'abcdefghi'))
+
+
+def test_single_last_chunk():
+    uploads = ChunkedUploads()
+    uploads.append('small.bin', -1, b'abc')
+    assert_that(uploads.finish('small.bin').read(), equal_to(b'abc'))
+
+
+class ThrottledAdapter(BaseAdapter):
+    def __init__(self):
+        self.bodies = []
+        super(ThrottledAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        self.bodies.append(request.body.read())
+        resp = Response()
+        resp.status_code = 429 if len(self.bodies) == 1 else 200
+        resp.headers['Retry-After'] = '0'
+        resp.raw = io.BytesIO(b'')
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_file_bodies_are_rewound_on_retry(monkeypatch):
+    monkeypatch.setattr(api_module, 'sleep', lambda s: None)
+    transport = ThrottledAdapter()
+    request = Request('PUT', 'https://example.com/upload',
+                      data=io.BytesIO(b'abc')).prepare()
+
+    BackoffAdapter(transport).send(request)
+    assert_that(transport.bodies, equal_to([b'abc', b'abc']))
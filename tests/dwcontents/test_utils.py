@@ -17,11 +17,15 @@
 # This product includes software developed at
 # data.world, Inc.(http://data.world/).
 
+import threading
+import time
+
 from doublex import assert_that
-from hamcrest import equal_to
+from hamcrest import equal_to, same_instance
 
 from dwcontents.utils import to_dw_path, relative_path, split_parent, \
-    to_api_path, normalize_path, unique_justseen, directory_path
+    to_api_path, normalize_path, unique_justseen, directory_path, MWT, \
+    LRUCache, DwPath
 
 
 def test_directory_path():
@@ -78,7 +82,129 @@ def test_to_dw_path():
                 equal_to(('owner', 'dataset', 'file.ext')))
 
 
+def test_dw_path():
+    path = DwPath.parse('/owner/dataset/subdir/file.ext/')
+    owner, dataset_id, file_path = path
+
+    assert_that(file_path, equal_to('subdir/file.ext'))
+    assert_that(DwPath.parse(''), equal_to((None, None, None)))
+    assert_that(DwPath.parse('/owner/dataset/subdir/file.ext/'),
+                same_instance(path))
+    assert_that(to_dw_path('dataset/subdir/file.ext', root_dir='owner'),
+                same_instance(to_dw_path('dataset/subdir/file.ext',
+                                         root_dir='owner')))
+
+
 def test_unique_justseen():
     objs = [{'name': 'bbb'}, {'name': 'aaa'}, {'name': 'bbb'}]
     assert_that(list(unique_justseen(objs, lambda o: o['name'])),
                 equal_to([{'name': 'aaa'}, {'name': 'bbb'}]))
+
+
+class Tenant(object):
+    def __init__(self, cache_quota=None):
+        self.cache_quota = cache_quota
+        self.calls = 0
+
+    @MWT(timeout=60)
+    def fetch(self, size):
+        self.calls += 1
+        return 'x' * size
+
+
+def test_mwt_invalidate_scope():
+    a, b = Tenant(), Tenant()
+    a.fetch(1)
+    b.fetch(1)
+    MWT().invalidate(a)
+    a.fetch(1)
+    b.fetch(1)
+    assert_that((a.calls, b.calls), equal_to((2, 1)))
+
+
+def test_mwt_quota():
+    tenant = Tenant(cache_quota=400)
+    tenant.fetch(100)
+    tenant.fetch(101)
+    tenant.fetch(100)
+    assert_that(tenant.calls, equal_to(2))
+    tenant.fetch(200)  # Evicts oldest entry
+    tenant.fetch(101)
+    assert_that(tenant.calls, equal_to(3))
+    tenant.fetch(100)
+    assert_that(tenant.calls, equal_to(4))
+    tenant.fetch(1000)  # Never cached
+    tenant.fetch(1000)
+    assert_that(tenant.calls, equal_to(6))
+
+
+class Versioned(object):
+    def __init__(self, cache_timeout, cache_grace):
+        self.cache_timeout = cache_timeout
+        self.cache_grace = cache_grace
+        self.version = 0
+        self.gate = None
+
+    @MWT(timeout=60)
+    def fetch(self):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.version += 1
+        return self.version
+
+
+def wait_for_refresh():
+    while MWT._refreshing:
+        time.sleep(0.001)
+
+
+def test_mwt_stale_while_revalidate():
+    versioned = Versioned(cache_timeout=0, cache_grace=60)
+    stale_hits = MWT.stats()['stale_hits']
+
+    assert_that(versioned.fetch(), equal_to(1))
+    time.sleep(0.001)
+    assert_that(versioned.fetch(), equal_to(1))  # Refreshed in background
+    wait_for_refresh()
+    assert_that(versioned.fetch(), equal_to(2))
+    wait_for_refresh()
+
+    assert_that(MWT.stats()['stale_hits'] - stale_hits, equal_to(2))
+
+
+def test_mwt_invalidate_keeps_other_refreshes():
+    a = Versioned(cache_timeout=0, cache_grace=60)
+    b = Versioned(cache_timeout=0, cache_grace=60)
+    a.fetch()
+    b.fetch()
+    time.sleep(0.001)
+
+    a.gate = threading.Event()
+    a.fetch()
+    MWT().invalidate(b)
+    a.gate.set()
+    wait_for_refresh()
+
+    assert_that(a.version, equal_to(2))
+    assert_that(a.fetch(), equal_to(2))
+    wait_for_refresh()
+
+
+def test_mwt_max_staleness():
+    versioned = Versioned(cache_timeout=0, cache_grace=0)
+    versioned.fetch()
+    time.sleep(0.001)
+
+    assert_that(versioned.fetch(), equal_to(2))
+
+
+def test_lru_cache():
+    cache = LRUCache(max_items=2, max_bytes=5)
+    cache.put('a', 'aa')
+    cache.put('b', 'bb')
+    cache.get('a')
+    cache.put('c', 'c')
+    assert_that(cache.keys(), equal_to(['a', 'c']))
+    cache.put('d', 'ddddd')
+    assert_that(cache.keys(), equal_to(['d']))
+    assert_that(cache.put('e', 'eeeeee'), equal_to(False))
@@ -0,0 +1,71 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from doublex import assert_that
+from hamcrest import equal_to, is_not, none
+
+from conftest import InMemDwContentsApi
+from dwcontents.contents import DwContents
+from dwcontents.warmup import WarmUp
+
+
+class LibraryApi(object):
+    def __init__(self):
+        self.fetched = []
+
+    def get_me(self):
+        return {'id': 'me'}
+
+    def get_datasets(self):
+        return [{'owner': 'me', 'id': 'old', 'updated': '2018-01-01'},
+                {'owner': 'me', 'id': 'new', 'updated': '2018-03-01'},
+                {'owner': 'me', 'id': 'mid', 'updated': '2018-02-01'}]
+
+    def get_dataset(self, owner, dataset_id):
+        self.fetched.append(dataset_id)
+        return {'owner': owner, 'id': dataset_id}
+
+
+def test_most_recent_datasets():
+    api = LibraryApi()
+    seen = []
+    warmer = WarmUp(api, max_datasets=2, on_dataset=seen.append)
+    warmer.run()
+
+    assert_that(api.fetched, equal_to(['new', 'mid']))
+    assert_that(len(seen), equal_to(2))
+    assert_that(warmer.datasets, equal_to(2))
+    assert_that(warmer.elapsed, is_not(none()))
+
+
+def test_failures_are_contained():
+    api = LibraryApi()
+    api.get_datasets = None
+    warmer = WarmUp(api)
+    warmer.run()
+
+    assert_that(warmer.done.is_set(), equal_to(True))
+    assert_that(warmer.datasets, equal_to(0))
+
+
+def test_contents_warm_up_in_background():
+    api = InMemDwContentsApi()
+    cm = DwContents(root_dir='testy-tester/jupyter', api=api, warm_up=True)
+    cm.warmer.done.wait(5)
+
+    assert_that(cm.index.get('testy-tester', 'jupyter'), is_not(none()))
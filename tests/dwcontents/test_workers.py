@@ -0,0 +1,129 @@
+# dwcontents
+# Copyright 2018 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import json
+
+from doublex import assert_that
+from hamcrest import equal_to, none, is_not, has_key, contains_string
+from nbformat.sign import NotebookNotary, MemorySignatureStore
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+from pytest import fixture
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from dwcontents.utils import to_nb_json
+from dwcontents import workers as workers_module
+from dwcontents.workers import decode_notebook, encode_notebook, \
+    NotebookWorkers
+
+
+def notebook():
+    return new_notebook(cells=[new_code_cell('1 + 1', outputs=[
+        new_output('execute_result', data={'text/html': '<b>2</b>'},
+                   execution_count=1)])])
+
+
+@fixture()
+def notary():
+    return NotebookNotary(secret=b'secret',
+                          store_factory=MemorySignatureStore)
+
+
+@fixture()
+def contents_config():
+    return {'notebook_workers': 1, 'notebook_worker_threshold': 0}
+
+
+def test_encode_and_decode(notary):
+    nb = notebook()
+    nb.cells[0].metadata['trusted'] = True
+    data, signature = encode_notebook(nb, notary.secret, notary.algorithm)
+
+    signed = to_nb_json(nb)
+    notary.check_cells(signed)
+    assert_that(signature, equal_to(notary.compute_signature(signed)))
+
+    decoded, message, decoded_signature = decode_notebook(
+        data, notary.secret, notary.algorithm)
+    assert_that(decoded.cells[0].source, equal_to('1 + 1'))
+    assert_that(message, none())
+    assert_that(decoded_signature, equal_to(signature))
+
+
+def test_untrusted_notebooks_are_not_signed(notary):
+    _, signature = encode_notebook(notebook(), notary.secret,
+                                   notary.algorithm)
+    assert_that(signature, none())
+
+
+def test_invalid_notebook_message(notary):
+    nb = notebook()
+    nb.cells[0]['bogus'] = True
+    _, message, _ = decode_notebook(json.dumps(nb).encode('utf-8'),
+                                    notary.secret, notary.algorithm)
+    assert_that(message, contains_string('Notebook validation failed'))
+
+
+def test_contents_round_trip_in_workers(contents):
+    nb = notebook()
+    nb.cells[0].metadata['trusted'] = True
+    contents.save({'type': 'notebook', 'content': nb}, 'nb.ipynb')
+
+    model = contents.get('nb.ipynb')
+    assert_that(model['content'].cells[0].source, equal_to('1 + 1'))
+    assert_that(model['content'].cells[0].metadata['trusted'],
+                equal_to(True))
+    assert_that(model, is_not(has_key('message')))
+    assert_that(contents.workers.offloaded, equal_to(2))
+
+
+def test_contents_untrusted_in_workers(contents):
+    contents.save({'type': 'notebook', 'content': notebook()}, 'nb.ipynb')
+
+    model = contents.get('nb.ipynb')
+    assert_that(model['content'].cells[0].metadata['trusted'],
+                equal_to(False))
+
+
+def test_contents_on_io_loop_in_process(contents):
+    # As Jupyter's handlers do, which would otherwise wait for workers
+    @gen.coroutine
+    def handle():
+        yield gen.maybe_future(contents.save(
+            {'type': 'notebook', 'content': notebook()}, 'nb.ipynb'))
+        model = yield gen.maybe_future(contents.get('nb.ipynb'))
+        raise gen.Return(model)
+
+    loop = IOLoop()
+    try:
+        model = loop.run_sync(handle)
+    finally:
+        loop.close()
+    assert_that(model['content'].cells[0].source, equal_to('1 + 1'))
+    assert_that(contents.workers.offloaded, equal_to(0))
+
+
+def test_workers_without_mp_context(monkeypatch):
+    class OldProcessPoolExecutor(object):
+        def __init__(self, max_workers=None):
+            self.max_workers = max_workers
+
+    monkeypatch.setattr(workers_module, 'ProcessPoolExecutor',
+                        OldProcessPoolExecutor)
+    pool = NotebookWorkers(max_workers=3)._executor()
+    assert_that(pool.max_workers, equal_to(3))